@@ -0,0 +1,115 @@
+"""
+Concurrency benchmark: how many sessions one event loop sustains.
+
+Every provider is replaced by the batch runner's stubs (fixed latency, no
+network, no rate limits) and N single-turn flight conversations are run at
+once, either on one event loop through the native async nodes or on a
+thread pool through the sync ones. Wall time, throughput and the peak
+number of OS threads are reported for each run.
+
+    python -m graph.async_benchmark --sessions 100 500 2000 --stub-latency 0.5
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from graph.batch_runner import install_stub_providers, run_conversation, arun_conversation
+from graph.main_graph import create_workflow
+
+CITIES = ["Delhi", "Mumbai", "Chennai", "Kolkata", "Bangalore", "Hyderabad", "Pune", "Goa"]
+
+
+def _conversations(n: int) -> List[Dict[str, Any]]:
+    # Distinct routes and dates so the offer cache and coalescing don't hide the provider latency
+    today = datetime.date.today()
+    conversations = []
+    for i in range(n):
+        origin = CITIES[i % len(CITIES)]
+        destination = CITIES[(i // len(CITIES) + 1 + i) % len(CITIES)]
+        if destination == origin:
+            destination = CITIES[(i + 1) % len(CITIES)]
+        day = today + datetime.timedelta(days=1 + i % 300)
+        conversations.append({"id": i, "turns": [f"Flights from {origin} to {destination} on {day.isoformat()}"]})
+    return conversations
+
+
+class _ThreadSampler:
+    """Records the peak thread count while the block runs."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_async(graph, conversations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def main():
+        return await asyncio.gather(*(arun_conversation(graph, c) for c in conversations))
+    return asyncio.run(main())
+
+
+def run_threads(graph, conversations: List[Dict[str, Any]], workers: int) -> List[Dict[str, Any]]:
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda c: run_conversation(graph, c), conversations))
+
+
+def benchmark(sessions: int, mode: str, workers: int) -> Dict[str, Any]:
+    graph = create_workflow()
+    conversations = _conversations(sessions)
+    started = time.perf_counter()
+    # The nodes print their result tables; keep them out of the report
+    with _ThreadSampler() as sampler, contextlib.redirect_stdout(io.StringIO()):
+        if mode == "async":
+            results = run_async(graph, conversations)
+        else:
+            results = run_threads(graph, conversations, workers)
+    wall = time.perf_counter() - started
+    return {
+        "mode": mode if mode == "async" else f"threads({workers})",
+        "sessions": sessions,
+        "ok": sum(1 for r in results if r["ok"] and r["flight_results"]),
+        "wall_s": round(wall, 2),
+        "sessions_per_s": round(sessions / wall, 1),
+        "peak_threads": sampler.peak,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session benchmark against stub providers.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--stub-latency", type=float, default=0.5, help="seconds per stubbed provider call")
+    parser.add_argument("--threads", type=int, default=32, help="thread pool size for the sync comparison")
+    parser.add_argument("--skip-threads", action="store_true", help="only run the async mode")
+    args = parser.parse_args(argv)
+
+    install_stub_providers(args.stub_latency)
+    print(f"Stub latency {args.stub_latency}s per provider call (parser LLM, Amadeus, Gemini summary)\n")
+    print(f"{'mode':<12} {'sessions':>8} {'ok':>6} {'wall_s':>8} {'sess/s':>8} {'threads':>8}")
+    for n in args.sessions:
+        modes = ["async"] if args.skip_threads else ["async", "threads"]
+        for mode in modes:
+            r = benchmark(n, mode, args.threads)
+            print(f"{r['mode']:<12} {r['sessions']:>8} {r['ok']:>6} {r['wall_s']:>8} {r['sessions_per_s']:>8} {r['peak_threads']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Batch runner: drives conversations from a JSONL file through the workflow.
+
+Each input line is a conversation, either {"id": ..., "turns": ["...", ...]}
+or {"id": ..., "query": "..."}. Conversations run in parallel on a thread,
+process or asyncio pool with bounded concurrency; one result line per
+conversation is streamed to the output JSONL as soon as it finishes, and a
+throughput/latency report is printed at the end.
+
+    python -m graph.batch_runner queries.jsonl results.jsonl --workers 8 --executor thread
+    python -m graph.batch_runner queries.jsonl results.jsonl --stub-providers --stub-latency 0.5
+    python -m graph.batch_runner queries.jsonl results.jsonl --workers 1 --profile-memory mem.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from graph.main_graph import create_workflow, new_session_state
+from graph.session import sessions, shared_results
+from transport_agents.alloc_profiler import profiler, print_report
+from transport_agents.prefetch import prefetcher
+from transport_agents.price_watch import notification_messages, watchlist
+from transport_agents.refinement import refiner
+from transport_agents.tiered_cache import cache_metrics
+
+AGENT_NODES = ["flight_agent", "bus_agent", "train_agent"]
+MAX_CONTINUATIONS = 5
+TRIP_FIELDS = [
+    "origin", "origin_country", "destination", "destination_country", "departure_date",
+    "departure_date_end", "return_date", "return_date_end", "departure_time", "return_time", "max_price", "max_stops", "cabin", "airlines", "mode", "legs",
+]
+RESULT_FIELDS = ["flight_results", "train_results", "bus_results", "itinerary_results"]
+_session_ids = itertools.count()
+
+
+def read_conversations(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            turns = record.get("turns") or record.get("messages") or [record.get("query", "")]
+            yield {"id": record.get("id", line_no), "turns": [t for t in turns if t]}
+
+
+def _needs_continuation(state: Dict[str, Any]) -> bool:
+    return not state.get("needs_user_input", False) and state.get("next_agent") in AGENT_NODES
+
+
+def _start_turn(state: Dict[str, Any], text: str) -> Dict[str, Any]:
+    # Route-watch notifications queued since the last turn come first
+    notes = notification_messages(state.get("session_id") or "")
+    return {
+        **state,
+        "messages": list(state.get("messages") or []) + notes + [HumanMessage(content=text)],
+        "user_query": text,
+        "needs_user_input": False,
+        "next_agent": "query_parser",
+    }
+
+
+def _last_reply(state: Dict[str, Any]) -> str:
+    for msg in reversed(state.get("messages") or []):
+        if isinstance(msg, AIMessage):
+            return str(msg.content)
+    return ""
+
+
+def _result(conversation: Dict[str, Any], state: Dict[str, Any], replies: List[str],
+            turn_latencies: List[float], started: float, error: Optional[str]) -> Dict[str, Any]:
+    return {
+        "id": conversation["id"],
+        "ok": error is None,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "turn_latencies_ms": [round(t * 1000, 1) for t in turn_latencies],
+        "replies": replies,
+        "trip": {field: state.get(field, "") for field in TRIP_FIELDS},
+        **{field: state.get(field) or [] for field in RESULT_FIELDS},
+    }
+
+
+def run_conversation(graph, conversation: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run every turn of a conversation the way interactive_chat does; between
+    turns the session is kept packed in the session store.
+    """
+    session_id = next(_session_ids)
+    state = new_session_state(f"batch-{session_id}")
+    sessions.save(session_id, state)
+    replies, turn_latencies = [], []
+    started = time.perf_counter()
+    try:
+        for text in conversation["turns"]:
+            turn_started = time.perf_counter()
+            state = graph.invoke(_start_turn(sessions.load(session_id), text))
+            hops = 0
+            while _needs_continuation(state) and hops < MAX_CONTINUATIONS:
+                state = graph.invoke(state)
+                hops += 1
+            sessions.save(session_id, state)
+            turn_latencies.append(time.perf_counter() - turn_started)
+            replies.append(_last_reply(state))
+        return _result(conversation, state, replies, turn_latencies, started, None)
+    except Exception as e:
+        return _result(conversation, state, replies, turn_latencies, started, str(e))
+    finally:
+        sessions.drop(session_id)
+        watchlist.unsubscribe_session(state.get("session_id") or "")
+
+
+async def arun_conversation(graph, conversation: Dict[str, Any]) -> Dict[str, Any]:
+    session_id = next(_session_ids)
+    state = new_session_state(f"batch-{session_id}")
+    sessions.save(session_id, state)
+    replies, turn_latencies = [], []
+    started = time.perf_counter()
+    try:
+        for text in conversation["turns"]:
+            turn_started = time.perf_counter()
+            state = await graph.ainvoke(_start_turn(sessions.load(session_id), text))
+            hops = 0
+            while _needs_continuation(state) and hops < MAX_CONTINUATIONS:
+                state = await graph.ainvoke(state)
+                hops += 1
+            sessions.save(session_id, state)
+            turn_latencies.append(time.perf_counter() - turn_started)
+            replies.append(_last_reply(state))
+        return _result(conversation, state, replies, turn_latencies, started, None)
+    except Exception as e:
+        return _result(conversation, state, replies, turn_latencies, started, str(e))
+    finally:
+        sessions.drop(session_id)
+        watchlist.unsubscribe_session(state.get("session_id") or "")
+
+
+# Stub providers for capacity planning: canned LLM and Amadeus responses
+# with a fixed latency, no network and no rate limits
+
+_STUB_ROUTE_RE = re.compile(r"from\s+([a-z][a-z .]*?)\s+to\s+([a-z][a-z .]*?)(?:\s+on\s+|\s+by\s+|\s*$|[,.?!])", re.I)
+_STUB_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def install_stub_providers(latency: float):
+    from langchain_core.runnables import RunnableLambda
+    import transport_agents.API_helper as api_helper
+    import transport_agents.FlightAgent2 as flight_agent
+    import transport_agents.price_watch as price_watch
+    from transport_agents.model_router import router
+    from transport_agents.offers_table import OffersTable, _synthetic_response
+    from transport_agents.search_filters import NO_FILTERS
+    from transport_agents.provider_scheduler import scheduler
+
+    def stub_reply(prompt_value):
+        query = prompt_value.to_messages()[-1].content
+        lines = []
+        route = _STUB_ROUTE_RE.search(query)
+        if route:
+            lines += [f"ORIGIN: {route.group(1).strip().title()}", f"DESTINATION: {route.group(2).strip().title()}"]
+        date = _STUB_DATE_RE.search(query)
+        if date:
+            lines.append(f"DEPARTURE_DATE: {date.group(0)}")
+        return AIMessage(content="\n".join(lines) or "NO_CHANGES")
+
+    def stub_parse(prompt_value):
+        time.sleep(latency)
+        return stub_reply(prompt_value)
+
+    async def astub_parse(prompt_value):
+        await asyncio.sleep(latency)
+        return stub_reply(prompt_value)
+
+    def stub_fetch_offers(origin_code, destination_code, date, token, filters=NO_FILTERS):
+        time.sleep(latency)
+        return _stub_offers(origin_code, destination_code, date, filters)
+
+    async def astub_fetch_offers(origin_code, destination_code, date, token, filters=NO_FILTERS):
+        await asyncio.sleep(latency)
+        return _stub_offers(origin_code, destination_code, date, filters)
+
+    def stub_fetch_multi_city(legs, token, filters=NO_FILTERS):
+        time.sleep(latency)
+        return _stub_multi_city(legs, filters)
+
+    async def astub_fetch_multi_city(legs, token, filters=NO_FILTERS):
+        await asyncio.sleep(latency)
+        return _stub_multi_city(legs, filters)
+
+    def _stub_multi_city(legs, filters):
+        result = _synthetic_response(40)
+        api_helper.multi_city_cache.put(api_helper._multi_city_key(legs, filters), result)
+        return result
+
+    def _stub_offers(origin_code, destination_code, date, filters):
+        # The provider applies the filters; the stub does it locally
+        table = filters.apply(OffersTable.from_amadeus(_synthetic_response(40)))
+        result = table.to_response()
+        api_helper.offer_cache.put(api_helper._filtered_key((origin_code, destination_code, date), filters), result)
+        return result
+
+    async def astub_token():
+        return "stub-token"
+
+    class StubChunk:
+        def __init__(self, text):
+            self.text = text
+
+    class StubModel:
+        @staticmethod
+        def _chunks():
+            record = {"airline": "XX", "price": "100.00", "duration": "2h 00m",
+                      "departure_time": "08:00", "arrival_time": "10:00", "stops": "0"}
+            doc = json.dumps({"summary": "Stub summary.", "filtered_results": [record] * 5})
+            return [StubChunk(doc[i:i + 64]) for i in range(0, len(doc), 64)]
+
+        def generate_content(self, prompt, generation_config=None, stream=False):
+            time.sleep(latency)
+            return self._chunks()
+
+        async def generate_content_async(self, prompt, generation_config=None, stream=False):
+            await asyncio.sleep(latency)
+
+            async def stream_chunks():
+                for chunk in self._chunks():
+                    yield chunk
+            return stream_chunks()
+
+    def stub_train_llm(messages):
+        time.sleep(latency)
+        return AIMessage(content="Stub train answer.")
+
+    async def astub_train_llm(messages):
+        await asyncio.sleep(latency)
+        return AIMessage(content="Stub train answer.")
+
+    class StubChat(RunnableLambda):
+        def bind_tools(self, tools):
+            return RunnableLambda(stub_train_llm, afunc=astub_train_llm)
+
+    # Every model tier of every call site gets the same stub
+    chat = StubChat(stub_parse, afunc=astub_parse)
+    router.use_factories(chat=lambda name: chat, genai=lambda name: StubModel())
+    api_helper._fetch_flight_offers = stub_fetch_offers
+    api_helper._afetch_flight_offers = astub_fetch_offers
+    api_helper._fetch_multi_city_offers = stub_fetch_multi_city
+    api_helper._afetch_multi_city_offers = astub_fetch_multi_city
+    flight_agent.get_access_token = lambda: "stub-token"
+    api_helper.get_access_token = lambda: "stub-token"
+    flight_agent.aget_access_token = astub_token
+    price_watch.FETCHERS["flight"] = lambda query: stub_fetch_offers(*query, "stub-token")
+    for provider in ("amadeus", "irctc", "gemini"):
+        scheduler.set_limit(provider, 1e6, 1_000_000)
+
+
+_worker_graph = None
+
+
+def _init_worker(stub_latency: Optional[float]):
+    global _worker_graph
+    if stub_latency is not None:
+        install_stub_providers(stub_latency)
+    _worker_graph = create_workflow()
+
+
+def _run_in_worker(conversation: Dict[str, Any]) -> Dict[str, Any]:
+    return run_conversation(_worker_graph, conversation)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def build_report(results: List[Dict[str, Any]], wall_seconds: float, executor: str, workers: int) -> Dict[str, Any]:
+    latencies = [r["latency_ms"] for r in results]
+    turn_latencies = [t for r in results for t in r["turn_latencies_ms"]]
+    return {
+        "executor": executor,
+        "workers": workers,
+        "conversations": len(results),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "turns": len(turn_latencies),
+        "wall_seconds": round(wall_seconds, 2),
+        "conversations_per_sec": round(len(results) / wall_seconds, 2) if wall_seconds else 0.0,
+        "turns_per_sec": round(len(turn_latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        "conversation_latency_ms": {p: _percentile(latencies, q) for p, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))},
+        "turn_latency_ms": {p: _percentile(turn_latencies, q) for p, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))},
+        # In-process counters; not aggregated across process-pool workers
+        "prefetch": prefetcher.metrics(),
+        "refinement": refiner.metrics(),
+        "price_watch": watchlist.metrics(),
+        "shared_results": shared_results.stats(),
+        "caches": cache_metrics(),
+    }
+
+
+def run_batch(input_path: str, output_path: str, workers: int = 4, executor: str = "thread",
+              stub_latency: Optional[float] = None) -> Dict[str, Any]:
+    """Run every conversation in input_path and stream results to output_path."""
+    conversations = read_conversations(input_path)
+    summaries = []
+    started = time.perf_counter()
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        def emit(result):
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            summaries.append({k: result[k] for k in ("ok", "latency_ms", "turn_latencies_ms")})
+            status = "ok" if result["ok"] else f"error: {result['error']}"
+            print(f"[{len(summaries)}] conversation {result['id']}: {result['latency_ms']:.0f} ms, {status}")
+
+        if executor == "async":
+            if stub_latency is not None:
+                install_stub_providers(stub_latency)
+            graph = create_workflow()
+
+            async def main():
+                semaphore = asyncio.Semaphore(workers)
+                pending = set()
+
+                async def bounded(conversation):
+                    async with semaphore:
+                        return await arun_conversation(graph, conversation)
+
+                for conversation in conversations:
+                    pending.add(asyncio.create_task(bounded(conversation)))
+                    if len(pending) >= workers * 2:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            emit(task.result())
+                for task in asyncio.as_completed(pending):
+                    emit(await task)
+
+            asyncio.run(main())
+        else:
+            pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+            with pool_cls(max_workers=workers, initializer=_init_worker, initargs=(stub_latency,)) as pool:
+                pending = set()
+                for conversation in conversations:
+                    pending.add(pool.submit(_run_in_worker, conversation))
+                    # Bounded in-flight window so huge input files are never fully queued
+                    if len(pending) >= workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            emit(future.result())
+                for future in wait(pending).done:
+                    emit(future.result())
+
+    return build_report(summaries, time.perf_counter() - started, executor, workers)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run travel-assistant conversations from a JSONL file.")
+    parser.add_argument("input", help="JSONL file, one conversation per line")
+    parser.add_argument("output", help="JSONL file to stream results to")
+    parser.add_argument("--workers", type=int, default=4, help="maximum concurrent conversations")
+    parser.add_argument("--executor", choices=["thread", "process", "async"], default="thread")
+    parser.add_argument("--stub-providers", action="store_true", help="replace LLM and Amadeus calls with local stubs")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="seconds per stubbed provider call")
+    parser.add_argument("--report", help="also write the report as JSON to this path")
+    parser.add_argument("--profile-memory", metavar="PATH",
+                        help="profile allocations per node and provider call (thread/async executors) "
+                             "and write the ranked report here")
+    args = parser.parse_args(argv)
+    if args.profile_memory:
+        profiler.enable()
+
+    report = run_batch(args.input, args.output, args.workers, args.executor,
+                       args.stub_latency if args.stub_providers else None)
+
+    print("\n" + "=" * 50)
+    print("BATCH REPORT:")
+    print("=" * 50)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.profile_memory:
+        print_report(profiler.write_report(args.profile_memory))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
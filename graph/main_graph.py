@@ -1,10 +1,19 @@
 from langgraph.graph import StateGraph,END
 from typing import TypedDict, Annotated, List, Literal, Dict, Any
 from graph.state import State
-from query_parser_agent.queryparser import query_parser
-from transport_agents.FlightAgent2 import flight_search_node
-from transport_agents.train_agent import train_search_node
+from query_parser_agent.queryparser import query_parser, aquery_parser
+from transport_agents.FlightAgent2 import flight_search_node, aflight_search_node
+from transport_agents.train_agent import train_search_node, atrain_search_node
+from transport_agents.bus_agent import bus_search_node, abus_search_node
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
+import uuid
+from transport_agents.alloc_profiler import profiler
+from transport_agents.refinement import refine_node, arefine_node, refiner
+from transport_agents.price_watch import watch_node, awatch_node, wants_watch, notification_messages
+from graph.session import sessions
+
+CHAT_SESSION = "interactive"
 
 
 # Mock flight agent for testing
@@ -20,18 +29,6 @@ from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, System
     #     "needs_user_input": False
     # }
 
-def bus_search_node(state: State) -> Dict[str, Any]:
-    """Mock bus agent for testing"""
-    messages = state.get("messages", [])
-    response_msg = f"Bus search initiated for {state.get('origin')} to {state.get('destination')} on {state.get('departure_date')}"
-    
-    return {
-        **state,
-        "messages": messages + [AIMessage(content=response_msg)],
-        "next_agent": "end",
-        "needs_user_input": False
-    }
-
 # def train_search_node(state: State) -> Dict[str, Any]:
 #     """Mock train agent for testing"""
 #     messages = state.get("messages", [])
@@ -48,14 +45,45 @@ def create_workflow():
     """Create and configure the workflow graph"""
     workflow = StateGraph(State)
     
-    # Add nodes
-    workflow.add_node("query_parser", query_parser)
-    workflow.add_node("flight_agent", flight_search_node)
-    workflow.add_node("bus_agent", bus_search_node)
-    workflow.add_node("train_agent", train_search_node)
+    # Add nodes; invoke() runs the sync implementations, ainvoke() the
+    # native async ones, so async callers never park a thread on I/O.
+    # Both are measured per node when memory profiling is enabled.
+    nodes = {
+        "query_parser": (query_parser, aquery_parser),
+        "flight_agent": (flight_search_node, aflight_search_node),
+        "bus_agent": (bus_search_node, abus_search_node),
+        "train_agent": (train_search_node, atrain_search_node),
+        "refiner": (refine_node, arefine_node),
+        "price_watch": (watch_node, awatch_node),
+    }
+    for name, (func, afunc) in nodes.items():
+        workflow.add_node(name, RunnableLambda(profiler.wrap("node", name, func),
+                                               afunc=profiler.wrap("node", name, afunc), name=name))
     
-    # Set entry point
-    workflow.set_entry_point("query_parser")
+    # Resume at the pending agent: a new user message sets next_agent to
+    # "query_parser", while continuation turns go straight to the stored
+    # agent without paying for another parse of the same message. Follow-ups
+    # that only filter or re-sort the last results skip the parser too, as
+    # do requests to watch (or stop watching) the current route
+    def entry_router(state: State) -> Literal["query_parser", "flight_agent", "bus_agent", "train_agent", "refiner",
+                                              "price_watch"]:
+        next_agent = state.get("next_agent")
+        if not state.get("needs_user_input", False) and next_agent in ["flight_agent", "bus_agent", "train_agent"]:
+            return next_agent
+        if wants_watch(state):
+            return "price_watch"
+        if refiner.wants(state):
+            return "refiner"
+        return "query_parser"
+    
+    workflow.set_conditional_entry_point(entry_router, {
+        "refiner": "refiner",
+        "price_watch": "price_watch",
+        "query_parser": "query_parser",
+        "flight_agent": "flight_agent",
+        "bus_agent": "bus_agent",
+        "train_agent": "train_agent"
+    })
     
     def router(state: State) -> Literal["query_parser", "flight_agent", "bus_agent", "train_agent", "__end__"]:
         next_agent = state.get("next_agent")
@@ -68,7 +96,7 @@ def create_workflow():
         return "query_parser"
     
     # Add conditional edges for all nodes
-    for node in ["query_parser", "flight_agent", "bus_agent", "train_agent"]:
+    for node in ["query_parser", "flight_agent", "bus_agent", "train_agent", "refiner", "price_watch"]:
         workflow.add_conditional_edges(node, router, {
             "query_parser": "query_parser",
             "flight_agent": "flight_agent",
@@ -79,6 +107,33 @@ def create_workflow():
     
     return workflow.compile()
 
+def new_session_state(session_id: str = "") -> Dict[str, Any]:
+    """Empty state for a new conversation; session_id keys its route watches"""
+    return {
+        "session_id": session_id or uuid.uuid4().hex,
+        "messages": [],
+        "user_query": "",
+        "origin": "",
+        "origin_country": "",
+        "destination": "",
+        "destination_country": "",
+        "departure_date": "",
+        "departure_date_end": "",
+        "return_date": "",
+        "return_date_end": "",
+        "departure_time": "",
+        "return_time": "",
+        "max_price": "",
+        "max_stops": "",
+        "cabin": "",
+        "airlines": "",
+        "mode": "",
+        "legs": [],
+        "refine_source": None,
+        "next_agent": "query_parser",
+        "needs_user_input": True
+    }
+
 def print_travel_state(state: Dict[str, Any]):
     """Print current travel information in a formatted way"""
     print("\n" + "="*50)
@@ -96,7 +151,14 @@ def print_travel_state(state: Dict[str, Any]):
     print(f"Return Date: {state.get('return_date', 'Not set')}")
     print(f"Departure Time: {state.get('departure_time', 'Not set')}")
     print(f"Return Time: {state.get('return_time', 'Not set')}")
+    filters = ", ".join(f"{name}: {state[field]}" for field, name in
+                        [("max_price", "max price"), ("max_stops", "max stops"), ("cabin", "cabin"), ("airlines", "airlines")]
+                        if state.get(field))
+    if filters:
+        print(f"Filters: {filters}")
     print(f"Mode: {state.get('mode', 'Not set')}")
+    if state.get('legs'):
+        print("Legs: " + "; ".join(f"{l['origin']} → {l['destination']} on {l['departure_date']}" for l in state['legs']))
     print("="*50 + "\n")
 
 def interactive_chat():
@@ -106,32 +168,22 @@ def interactive_chat():
     print("Type 'quit', 'exit', or 'bye' to end the session.")
     print("Type 'reset' to start over with a new trip.")
     print("Type 'status' to see current travel information.")
+    print("After a search, say 'watch this route' to hear when its fares change.")
     print("-" * 60)
     
     # Create workflow
     graph = create_workflow()
     
     # Initialize state
-    current_state = {
-        "messages": [],
-        "user_query": "",
-        "origin": "",
-        "origin_country": "",
-        "destination": "",
-        "destination_country": "",
-        "departure_date": "",
-        "return_date": "",
-        "departure_time": "",
-        "return_time": "",
-        "mode": "",
-        "next_agent": "query_parser",
-        "needs_user_input": True
-    }
+    current_state = new_session_state(CHAT_SESSION)
     
     while True:
         try:
-            # Get user input
+            # Keep the session packed while waiting for the user
+            sessions.save(CHAT_SESSION, current_state)
+            current_state = None
             user_input = input("\nYou: ").strip()
+            current_state = sessions.load(CHAT_SESSION)
             
             # Handle special commands
             if user_input.lower() in ['quit', 'exit', 'bye']:
@@ -139,21 +191,7 @@ def interactive_chat():
                 break
             
             elif user_input.lower() == 'reset':
-                current_state = {
-                    "messages": [],
-                    "user_query": "",
-                    "origin": "",
-                    "origin_country": "",
-                    "destination": "",
-                    "destination_country": "",
-                    "departure_date": "",
-                    "return_date": "",
-                    "departure_time": "",
-                    "return_time": "",
-                    "mode": "",
-                    "next_agent": "query_parser",
-                    "needs_user_input": True
-                }
+                current_state = new_session_state(CHAT_SESSION)
                 print("\nTrip information reset! Please tell me about your new travel plans.")
                 continue
             
@@ -165,6 +203,11 @@ def interactive_chat():
                 print("Please enter your travel query or type 'help' for commands.")
                 continue
             
+            # Route-watch notifications queued since the last turn come first
+            for note in notification_messages(CHAT_SESSION):
+                print(f"Assistant: {note.content}")
+                current_state["messages"].append(note)
+            
             # Add user message to state
             current_state["messages"].append(HumanMessage(content=user_input))
             current_state["user_query"] = user_input
@@ -221,23 +264,11 @@ def interactive_chat():
                 print_travel_state(current_state)
                 
                 # Ask if they want to start a new search
-                restart = input("\nWould you like to plan another trip? (y/n): ").strip().lower()
-                if restart in ['y', 'yes']:
-                    current_state = {
-                        "messages": [],
-                        "user_query": "",
-                        "origin": "",
-                        "origin_country": "",
-                        "destination": "",
-                        "destination_country": "",
-                        "departure_date": "",
-                        "return_date": "",
-                        "departure_time": "",
-                        "return_time": "",
-                        "mode": "",
-                        "next_agent": "query_parser",
-                        "needs_user_input": True
-                    }
+                restart = input("\nPlan another trip (y), refine these results (r) or quit (n)? ").strip().lower()
+                if restart in ['r', 'refine']:
+                    print("\nTell me how to narrow them down, e.g. 'only non-stop' or 'something earlier'.")
+                elif restart in ['y', 'yes']:
+                    current_state = new_session_state(CHAT_SESSION)
                     print("\nReady for your next trip! Tell me about your travel plans.")
                 else:
                     print("\nThank you for using the Travel Assistant! Have a great trip!")
@@ -0,0 +1,259 @@
+"""
+Compact at-rest representation of conversation sessions.
+
+The graph works on plain State dicts. Between turns sessions are kept
+packed instead: trip fields in a slots record with interned strings and
+an enum mode, result lists, multi-city legs and the refine source as
+references into a shared content-addressed table (sessions that saw the
+same results share one copy), and the message history zlib-compressed.
+interactive_chat and the batch runner keep their sessions in `sessions`
+while they wait for the next user message:
+
+    state = sessions.load(session_id) or new_session_state()
+    state = graph.invoke(...)
+    sessions.save(session_id, state)
+"""
+import hashlib
+import json
+import sys
+import threading
+import weakref
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+from graph.state import TransportMode
+
+TRIP_FIELDS = (
+    "origin", "origin_country", "destination", "destination_country",
+    "departure_date", "departure_date_end", "return_date", "return_date_end",
+    "departure_time", "return_time", "max_price", "max_stops", "cabin", "airlines",
+)
+RESULT_FIELDS = ("flight_results", "train_results", "bus_results", "itinerary_results")
+# Large per-session values kept compressed in the shared table, with their empty value
+SHARED_FIELDS = {**{f: [] for f in RESULT_FIELDS}, "legs": [], "refine_source": None}
+_PACKED_KEYS = frozenset(TRIP_FIELDS + tuple(SHARED_FIELDS) + ("mode", "messages", "next_agent", "needs_user_input", "user_query"))
+_MODES = {m.value: m for m in TransportMode}
+
+
+def _intern(value: Optional[str]) -> str:
+    return sys.intern(value) if value else ""
+
+
+@dataclass(slots=True)
+class TripRecord:
+    origin: str = ""
+    origin_country: str = ""
+    destination: str = ""
+    destination_country: str = ""
+    departure_date: str = ""
+    departure_date_end: str = ""
+    return_date: str = ""
+    return_date_end: str = ""
+    departure_time: str = ""
+    return_time: str = ""
+    max_price: str = ""
+    max_stops: str = ""
+    cabin: str = ""
+    airlines: str = ""
+    mode: Optional[TransportMode] = None
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "TripRecord":
+        mode = state.get("mode")
+        if not isinstance(mode, TransportMode):
+            mode = _MODES.get(str(mode or "").strip().lower())
+        return cls(*(_intern(state.get(f) or "") for f in TRIP_FIELDS), mode=mode)
+
+    def to_state(self) -> Dict[str, Any]:
+        state = {f: getattr(self, f) for f in TRIP_FIELDS}
+        state["mode"] = self.mode.value if self.mode else ""
+        return state
+
+
+class _SharedResults:
+    """Content-addressed, reference-counted store of compressed result lists."""
+
+    def __init__(self):
+        self._entries: Dict[bytes, List] = {}
+        self._lock = threading.Lock()
+
+    def add(self, rows: Any) -> bytes:
+        payload = json.dumps(rows, separators=(",", ":"), sort_keys=True, default=str).encode()
+        key = hashlib.blake2b(payload, digest_size=16).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [zlib.compress(payload), 1]
+            else:
+                entry[1] += 1
+        return key
+
+    def get(self, key: bytes) -> Any:
+        with self._lock:
+            blob = self._entries[key][0]
+        return json.loads(zlib.decompress(blob))
+
+    def release(self, keys: Tuple[bytes, ...]):
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "references": sum(e[1] for e in self._entries.values()),
+                "bytes": sum(len(e[0]) for e in self._entries.values()),
+            }
+
+
+shared_results = _SharedResults()
+
+
+class CompactSession:
+    """A State dict packed for idle storage; `unpack` restores an equivalent dict."""
+
+    __slots__ = ("trip", "next_agent", "needs_user_input", "user_query", "results", "history", "extra", "__weakref__")
+
+    @classmethod
+    def pack(cls, state: Dict[str, Any]) -> "CompactSession":
+        session = cls()
+        session.trip = TripRecord.from_state(state)
+        session.next_agent = _intern(state.get("next_agent") or "")
+        session.needs_user_input = bool(state.get("needs_user_input", False))
+        session.user_query = state.get("user_query") or ""
+
+        results = tuple(
+            (field, shared_results.add(value))
+            for field in SHARED_FIELDS if (value := state.get(field))
+        )
+        session.results = results or None
+        if results:
+            # Shared entries are released when the packed session is dropped
+            weakref.finalize(session, shared_results.release, tuple(key for _, key in results))
+
+        messages = state.get("messages") or []
+        session.history = zlib.compress(json.dumps(messages_to_dict(messages), separators=(",", ":")).encode()) \
+            if messages else None
+
+        extra = {k: v for k, v in state.items() if k not in _PACKED_KEYS}
+        mode = state.get("mode")
+        if mode and not isinstance(mode, TransportMode) and session.trip.mode is None:
+            # Keep modes outside the enum verbatim
+            extra["mode"] = mode
+        session.extra = extra or None
+        return session
+
+    def unpack(self) -> Dict[str, Any]:
+        state = self.trip.to_state()
+        state["messages"] = messages_from_dict(json.loads(zlib.decompress(self.history))) if self.history else []
+        state["user_query"] = self.user_query
+        state["next_agent"] = self.next_agent
+        state["needs_user_input"] = self.needs_user_input
+        state.update({field: list(empty) if isinstance(empty, list) else empty for field, empty in SHARED_FIELDS.items()})
+        for field, key in self.results or ():
+            state[field] = shared_results.get(key)
+        if self.extra:
+            state.update(self.extra)
+        return state
+
+
+class SessionStore:
+    """Packed sessions by id."""
+
+    def __init__(self):
+        self._sessions: Dict[Any, CompactSession] = {}
+        self._lock = threading.Lock()
+
+    def save(self, session_id, state: Dict[str, Any]):
+        packed = CompactSession.pack(state)
+        with self._lock:
+            self._sessions[session_id] = packed
+
+    def load(self, session_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            packed = self._sessions.get(session_id)
+        return packed.unpack() if packed is not None else None
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+sessions = SessionStore()
+
+
+def _sample_state(i: int) -> Dict[str, Any]:
+    """A finished three-turn flight conversation, as the graph leaves it."""
+    from langchain_core.messages import AIMessage, HumanMessage
+    cities = [("Pune", "India"), ("Delhi", "India"), ("Paris", "France"), ("London", "United Kingdom"),
+              ("Mumbai", "India"), ("Dubai", "United Arab Emirates")]
+    (origin, origin_country), (destination, destination_country) = cities[i % 6], cities[(i // 6 + 1 + i) % 6]
+    date = f"2026-11-{1 + i % 28:02d}"
+    route = (i % 6, (i // 6 + 1 + i) % 6, i % 28)
+    rows = [{"airline": ["AI", "6E", "UK", "EK"][(r + route[0]) % 4], "price": f"{100 + 7 * r + route[2]}.00",
+             "duration": f"{2 + r % 5}h {r * 7 % 60}m", "departure_time": f"{6 + r:02d}:00",
+             "arrival_time": f"{9 + r:02d}:30", "stops": str(r % 2)} for r in range(10)]
+    messages = [
+        HumanMessage(content=f"I want to fly from {origin.lower()} to {destination.lower()}"),
+        AIMessage(content="I need more information. Please provide your departure date (YYYY-MM-DD format)."),
+        HumanMessage(content=f"on {date}, cheapest please"),
+        AIMessage(content=f"Great! Here's your travel information:\n✈️ From: {origin} → {destination}\n📅 Date: {date}\n"
+                          f"🚗 Mode: Flight\n\nProceeding to find options..."),
+        AIMessage(content=f" Found 10 flights from {origin} to {destination} on {date}. "
+                          "Check the console for detailed flight information."),
+    ]
+    return {
+        "messages": messages, "user_query": f"on {date}, cheapest please",
+        # Built per session the way the parser returns them, so equal strings are distinct objects
+        "origin": "".join(origin), "origin_country": "".join(origin_country),
+        "destination": "".join(destination), "destination_country": "".join(destination_country),
+        "departure_date": date, "departure_date_end": "", "return_date": "", "return_date_end": "",
+        "departure_time": "", "return_time": "", "mode": "flight",
+        "next_agent": "end", "needs_user_input": False,
+        "flight_results": json.loads(json.dumps(rows)),
+    }
+
+
+if __name__ == "__main__":
+    # Bytes per idle session: the dicts the graph returns vs packed sessions
+    import gc
+    import time
+    import tracemalloc
+
+    n = 10_000
+    for label, build in [("dict state", lambda i: _sample_state(i)),
+                         ("compact", lambda i: CompactSession.pack(_sample_state(i)))]:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        sessions = [build(i) for i in range(n)]
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        print(f"{label:<10} {n} sessions: {held / n:,.0f} bytes/session, built in {elapsed:.2f}s")
+        if label == "compact":
+            print(f"shared results: {shared_results.stats()}")
+            started = time.perf_counter()
+            restored = [s.unpack() for s in sessions[:1000]]
+            print(f"unpack: {(time.perf_counter() - started) * 1000:.0f} us/session")
+            original = _sample_state(7)
+            assert restored[7]["flight_results"] == original["flight_results"]
+            assert [m.content for m in restored[7]["messages"]] == [m.content for m in original["messages"]]
+            assert restored[7]["origin"] == original["origin"] and restored[7]["mode"] == "flight"
+        del sessions
+    gc.collect()
+    print(f"after release: {shared_results.stats()}")
@@ -9,6 +9,7 @@ class TransportMode(Enum):
 
 class State(MessagesState):
     # Input
+    session_id: str
     next_agent: str
     user_query: Optional[str]
     origin: Optional[str]
@@ -16,15 +17,27 @@ class State(MessagesState):
     destination: Optional[str]
     destination_country: Optional[str]
     departure_date: Optional[str]
+    departure_date_end: Optional[str]
     return_date: Optional[str]
+    return_date_end: Optional[str]
     departure_time: Optional[str]
     return_time: Optional[str]
+    # Flight constraints pushed into the provider request (see search_filters)
+    max_price: Optional[str]
+    max_stops: Optional[str]
+    cabin: Optional[str]
+    airlines: Optional[str]
     mode: Optional[TransportMode]
+    # Multi-city trips: ordered [{"origin", "destination", "departure_date"}, ...]
+    legs: Optional[List[Dict]]
 
     # Output / processing
     train_results: Optional[List[Dict]]
     bus_results: Optional[List[Dict]]
     flight_results: Optional[List[Dict]]
+    itinerary_results: Optional[List[Dict]]
+    # Where the last search's full results are cached, for local refinement
+    refine_source: Optional[Dict]
     booking_options: list
     selected_option: dict
     booking_confirmed: bool
@@ -1,4 +1,5 @@
 import os
+import re
 import json
 import datetime
 import time
@@ -9,26 +10,79 @@ from langchain.chat_models import init_chat_model
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage, SystemMessage
 from langgraph.graph import StateGraph, END
 from graph.state import State
+from transport_agents.provider_scheduler import scheduler
+from transport_agents.model_router import router
+from transport_agents.date_resolver import parse_iso_date
+from transport_agents.prefetch import prefetcher
 
-# Initialize LLM consistently
-llm = init_chat_model("google_genai:gemini-2.0-flash")
+# LLM output field name -> state key
+FIELD_MAPPING = {
+    "origin": "origin",
+    "origin_country": "origin_country",
+    "destination": "destination", 
+    "destination_country": "destination_country",
+    "departure_date": "departure_date",
+    "departure_date_end": "departure_date_end",
+    "return_date": "return_date",
+    "return_date_end": "return_date_end",
+    "departure_time": "departure_time",
+    "return_time": "return_time",
+    "max_price": "max_price",
+    "max_stops": "max_stops",
+    "cabin": "cabin",
+    "airlines": "airlines",
+    "mode": "mode",
+    "legs": "legs"
+}
+DATE_FIELDS = ["departure_date", "departure_date_end", "return_date", "return_date_end"]
+# Search constraints that must be whole numbers
+NUMBER_FIELDS = ["max_price", "max_stops"]
+FILTER_LABELS = [("max_price", "max {}"), ("max_stops", "max {} stops"), ("cabin", "{}"), ("airlines", "airlines {}")]
+# One multi-city leg as written in the LEGS field: "Delhi > Paris on 2025-05-01"
+LEG_RE = re.compile(r"^(.+?)\s*(?:>|->|→)\s*(.+?)\s+on\s+(\S+)$")
 
-def create_query_parser_chain():
-    """Creates the query parser chain"""
+def parse_legs(value: str) -> Optional[List[Dict[str, str]]]:
+    """Legs from a LEGS value ([] for NONE), or None if it is malformed."""
+    if value.strip().upper() == "NONE":
+        return []
+    legs = []
+    for part in value.split(";"):
+        if not part.strip():
+            continue
+        match = LEG_RE.match(part.strip())
+        if not match or parse_iso_date(match.group(3)) is None:
+            return None
+        legs.append({"origin": match.group(1), "destination": match.group(2), "departure_date": match.group(3)})
+    return legs
+
+def format_legs(legs: List[Dict[str, str]]) -> str:
+    return "; ".join(f"{l['origin']} > {l['destination']} on {l['departure_date']}" for l in legs or [])
+
+def create_query_parser_chain(model_name: Optional[str] = None):
+    """Creates the query parser chain on the given model tier (cheapest by default)"""
     
     parser_prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a travel assistant that extracts travel information from user queries.
 
+Today's date: {today}
+
 Current travel information state:
 - Origin: {origin}
 - Origin Country: {origin_country}
 - Destination: {destination}  
 - Destination Country: {destination_country}
 - Departure Date: {departure_date}
+- Departure Date End: {departure_date_end}
 - Return Date: {return_date}
+- Return Date End: {return_date_end}
 - Departure Time: {departure_time}
 - Return Time: {return_time}
+- Max Price: {max_price}
+- Max Stops: {max_stops}
+- Cabin: {cabin}
+- Airlines: {airlines}
 - Mode: {mode}
+- Legs: {legs}
 
 INSTRUCTIONS:
 1. Extract NEW travel information from the user's query
@@ -38,6 +92,17 @@ INSTRUCTIONS:
 5. NEVER use placeholder values like [city name] or [YYYY-MM-DD]
 6. If the user query contains actual information, extract it
 7. If the user query is asking for information or is unclear, respond with NO_CHANGES
+8. If the user is flexible about dates (e.g. "cheapest day next month", "any day between the 3rd and the 10th"),
+   put the first possible day in DEPARTURE_DATE and the last possible day in DEPARTURE_DATE_END
+   (likewise RETURN_DATE / RETURN_DATE_END for a flexible return)
+9. If the user describes a multi-city trip (several flights visiting cities in order, e.g. Delhi → Paris → Rome → Delhi),
+   list every leg in LEGS as "origin > destination on YYYY-MM-DD" separated by semicolons, and set ORIGIN,
+   DESTINATION and DEPARTURE_DATE from the first leg. Repeat the full LEGS list whenever any leg changes.
+   If the user drops the multi-city plan, respond with LEGS: NONE
+10. Capture flight preferences: a price limit in MAX_PRICE (number only), "non-stop"/"direct" as MAX_STOPS: 0
+   ("at most one stop" is 1), the cabin in CABIN, preferred airlines as 2-letter IATA codes in AIRLINES.
+   A departure time window goes in DEPARTURE_TIME as HH:MM-HH:MM (morning 05:00-12:00, afternoon 12:00-17:00,
+   evening 17:00-21:00, "before 10am" 00:00-10:00, "after 6pm" 18:00-23:59)
 
 RESPONSE FORMAT:
 Return ONLY the fields that need updating in this exact format:
@@ -46,10 +111,17 @@ ORIGIN_COUNTRY: [actual country name from user input]
 DESTINATION: [actual city name from user input]
 DESTINATION_COUNTRY: [actual country name from user input]
 DEPARTURE_DATE: [actual date in YYYY-MM-DD format]
+DEPARTURE_DATE_END: [last acceptable departure date in YYYY-MM-DD format, only for flexible dates]
 RETURN_DATE: [actual date in YYYY-MM-DD format]
-DEPARTURE_TIME: [actual time in HH:MM format]
+RETURN_DATE_END: [last acceptable return date in YYYY-MM-DD format, only for flexible dates]
+DEPARTURE_TIME: [actual time in HH:MM format, or a window as HH:MM-HH:MM]
 RETURN_TIME: [actual time in HH:MM format]
+MAX_PRICE: [highest acceptable total price, number only]
+MAX_STOPS: [0 for non-stop, 1 or 2]
+CABIN: [economy/premium economy/business/first]
+AIRLINES: [comma-separated 2-letter airline codes]
 MODE: [flight/bus/train]
+LEGS: [origin > destination on YYYY-MM-DD; ... only for multi-city trips]
 
 If no new concrete information is found in the user's input, respond with: NO_CHANGES
 
@@ -63,6 +135,30 @@ DESTINATION_COUNTRY: France
 DEPARTURE_DATE: 2024-12-25
 MODE: flight
 
+User: "What's the cheapest day to fly from Delhi to Dubai in March 2025?"
+Response:
+ORIGIN: Delhi
+ORIGIN_COUNTRY: India
+DESTINATION: Dubai
+DESTINATION_COUNTRY: United Arab Emirates
+DEPARTURE_DATE: 2025-03-01
+DEPARTURE_DATE_END: 2025-03-31
+MODE: flight
+
+User: "Delhi to Paris on May 1st, then Rome on the 5th and back to Delhi on the 10th, 2025"
+Response:
+ORIGIN: Delhi
+DESTINATION: Paris
+DEPARTURE_DATE: 2025-05-01
+MODE: flight
+LEGS: Delhi > Paris on 2025-05-01; Paris > Rome on 2025-05-05; Rome > Delhi on 2025-05-10
+
+User: "Only non-stop morning flights under 300 please"
+Response:
+DEPARTURE_TIME: 05:00-12:00
+MAX_PRICE: 300
+MAX_STOPS: 0
+
 User: "Actually make that a train"
 Response:
 MODE: train
@@ -74,7 +170,7 @@ NO_CHANGES
         ("human", "{query}")
     ])
     
-    return parser_prompt | llm
+    return parser_prompt | router.chat_model(model_name or router.tiers("query_parser")[0])
 
 def query_parser(state: State) -> Dict[str, Any]:
     """
@@ -87,207 +183,301 @@ def query_parser(state: State) -> Dict[str, Any]:
         Updated state with new travel information and next agent decision
     """
     try:
-        messages = state.get("messages", [])
-        if messages is None:
-            messages = []
-        
-        # Extract the latest user message content
-        query = ""
-        for msg in reversed(messages):
-            if isinstance(msg, HumanMessage) and hasattr(msg, 'content'):
-                query = msg.content
-                break
-            elif hasattr(msg, 'content') and isinstance(msg.content, str):
-                query = msg.content
-                break
-        
-        if not query:
-            response_msg = "I didn't receive a query. Please tell me about your travel plans."
-            return {
-                **state,  # Preserve all existing state
-                "messages": messages + [AIMessage(content=response_msg)],
-                "next_agent": "query_parser",
-                "needs_user_input": True  # Add flag to indicate we need user input
-            }
-        
-        # Check if this is a system-generated message asking for more info
-        # If so, we should wait for user input rather than processing it
-        if "I need more information" in query or "Please provide" in query:
-            return {
-                **state,
-                "needs_user_input": True,
-                "next_agent": "wait_for_input"  # Use a special state that stops processing
-            }
+        early, query, messages, current_state = _prepare_parse(state)
+        if early is not None:
+            return early
         
-        # Get current state values with defaults
-        current_state = {
-            "origin": state.get("origin", ""),
-            "origin_country": state.get("origin_country", ""),
-            "destination": state.get("destination", ""),
-            "destination_country": state.get("destination_country", ""),
-            "departure_date": state.get("departure_date", ""),
-            "return_date": state.get("return_date", ""),
-            "departure_time": state.get("departure_time", ""),
-            "return_time": state.get("return_time", ""),
-            "mode": state.get("mode", "")
+        # Create and invoke the parsing chain on the cheapest model tier,
+        # escalating when the output does not validate
+        inputs = {
+            "query": query,
+            "today": datetime.date.today().isoformat(),
+            **current_state
         }
+        def parse_with(model_name):
+            scheduler.acquire("gemini")
+            return create_query_parser_chain(model_name).invoke(inputs)
+        response = router.call("query_parser", parse_with, _parse_problem)
+        return _apply_parse(state, messages, query, current_state, response)
+        
+    except Exception as e:
+        return _parser_error(state, e)
 
+async def aquery_parser(state: State) -> Dict[str, Any]:
+    """Async query_parser: the LLM call is awaited instead of blocking a thread."""
+    try:
+        early, query, messages, current_state = _prepare_parse(state)
+        if early is not None:
+            return early
         
-        # Create and invoke the parsing chain
-        chain = create_query_parser_chain()
-        response = chain.invoke({
+        inputs = {
             "query": query,
+            "today": datetime.date.today().isoformat(),
             **current_state
-        })
+        }
+        async def parse_with(model_name):
+            await scheduler.aacquire("gemini")
+            return await create_query_parser_chain(model_name).ainvoke(inputs)
+        response = await router.acall("query_parser", parse_with, _parse_problem)
+        return _apply_parse(state, messages, query, current_state, response)
         
-        # Extract response content safely
-        if hasattr(response, 'content'):
-            response_content = response.content
-            # Handle case where content might be a list or other types
-            if isinstance(response_content, str):
-                response_text = response_content.strip()
-            elif isinstance(response_content, list):
-                response_text = str(response_content).strip()
-            else:
-                response_text = str(response_content).strip()
+    except Exception as e:
+        return _parser_error(state, e)
+
+def _prepare_parse(state: State):
+    """Latest query and current trip fields; the first item is a ready result when no LLM call is needed."""
+    messages = state.get("messages", [])
+    if messages is None:
+        messages = []
+    
+    # Extract the latest user message content
+    query = ""
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage) and hasattr(msg, 'content'):
+            query = msg.content
+            break
+        elif hasattr(msg, 'content') and isinstance(msg.content, str):
+            query = msg.content
+            break
+    
+    if not query:
+        response_msg = "I didn't receive a query. Please tell me about your travel plans."
+        return {
+            **state,  # Preserve all existing state
+            "messages": messages + [AIMessage(content=response_msg)],
+            "next_agent": "query_parser",
+            "needs_user_input": True  # Add flag to indicate we need user input
+        }, query, messages, None
+    
+    # Check if this is a system-generated message asking for more info
+    # If so, we should wait for user input rather than processing it
+    if "I need more information" in query or "Please provide" in query:
+        return {
+            **state,
+            "needs_user_input": True,
+            "next_agent": "wait_for_input"  # Use a special state that stops processing
+        }, query, messages, None
+    
+    # Get current state values with defaults
+    current_state = {
+        "origin": state.get("origin", ""),
+        "origin_country": state.get("origin_country", ""),
+        "destination": state.get("destination", ""),
+        "destination_country": state.get("destination_country", ""),
+        "departure_date": state.get("departure_date", ""),
+        "departure_date_end": state.get("departure_date_end", ""),
+        "return_date": state.get("return_date", ""),
+        "return_date_end": state.get("return_date_end", ""),
+        "departure_time": state.get("departure_time", ""),
+        "return_time": state.get("return_time", ""),
+        "max_price": state.get("max_price", ""),
+        "max_stops": state.get("max_stops", ""),
+        "cabin": state.get("cabin", ""),
+        "airlines": state.get("airlines", ""),
+        "mode": state.get("mode", ""),
+        "legs": format_legs(state.get("legs"))
+    }
+    return None, query, messages, current_state
+
+def _response_text(response) -> str:
+    # Extract response content safely
+    if hasattr(response, 'content'):
+        response_content = response.content
+        # Handle case where content might be a list or other types
+        if isinstance(response_content, str):
+            return response_content.strip()
+        elif isinstance(response_content, list):
+            return str(response_content).strip()
         else:
-            response_text = str(response).strip()
-        
-        # Parse LLM response and update state
-        updated_fields = {}
+            return str(response_content).strip()
+    return str(response).strip()
+
+def _parse_problem(response) -> Optional[str]:
+    """Why a parser response should go to a stronger model, or None if it is usable."""
+    response_text = _response_text(response)
+    if response_text == "NO_CHANGES":
+        return None
+    fields = {}
+    for line in response_text.split('\n'):
+        if ':' in line:
+            field, value = line.split(':', 1)
+            fields[field.strip().lower()] = value.strip()
+    known = [f for f in fields if f in FIELD_MAPPING]
+    if not known:
+        return "no recognized fields"
+    for field in known:
+        value = fields[field]
+        if value.startswith('['):
+            return f"placeholder in {field.upper()}"
+        if field in DATE_FIELDS and value and parse_iso_date(value) is None:
+            return f"malformed {field.upper()} '{value}'"
+        if field in NUMBER_FIELDS and value and not value.lstrip("$€£₹").replace(".", "", 1).isdigit():
+            return f"malformed {field.upper()} '{value}'"
+        if field == "legs" and parse_legs(value) is None:
+            return f"malformed LEGS '{value}'"
+    return None
+
+def _apply_parse(state: State, messages: list, query: str, current_state: Dict[str, str], response) -> Dict[str, Any]:
+    """Merge the LLM's field updates into the state and pick the next agent."""
+    response_text = _response_text(response)
+    
+    # Parse LLM response and update state
+    updated_fields = {}
+    
+    if response_text != "NO_CHANGES":
+        lines = [line.strip() for line in response_text.split('\n') if line.strip()]
         
-        if response_text != "NO_CHANGES":
-            lines = [line.strip() for line in response_text.split('\n') if line.strip()]
-            
-            for line in lines:
-                if ':' in line:
-                    field, value = line.split(':', 1)
-                    field_key = field.strip().lower()
-                    field_value = value.strip()
-                    
-                    # Remove any placeholder brackets like [city name] or template text
-                    if (field_value.startswith('[') and field_value.endswith(']')) or \
-                       field_value in ['[city name]', '[YYYY-MM-DD]', '[HH:MM]', '[actual city name from user input]', 
-                                     '[actual date in YYYY-MM-DD format]', '[actual time in HH:MM format]']:
-                        
-                        continue
-                    
-                    # Map field names and validate
-                    field_mapping = {
-                        "origin": "origin",
-                        "origin_country": "origin_country",
-                        "destination": "destination", 
-                        "destination_country": "destination_country",
-                        "departure_date": "departure_date",
-                        "return_date": "return_date",
-                        "departure_time": "departure_time",
-                        "return_time": "return_time",
-                        "mode": "mode"
-                    }
+        for line in lines:
+            if ':' in line:
+                field, value = line.split(':', 1)
+                field_key = field.strip().lower()
+                field_value = value.strip()
+                
+                # Remove any placeholder brackets like [city name] or template text
+                if (field_value.startswith('[') and field_value.endswith(']')) or \
+                   field_value in ['[city name]', '[YYYY-MM-DD]', '[HH:MM]', '[actual city name from user input]', 
+                                 '[actual date in YYYY-MM-DD format]', '[actual time in HH:MM format]']:
                     
-                    if field_key in field_mapping and field_value:
-                        updated_fields[field_mapping[field_key]] = field_value
-        
-        
-        # Merge updated fields with current state
-        final_state = {**current_state, **updated_fields}
+                    continue
+                
+                # Map field names and validate
+                if field_key in FIELD_MAPPING and field_value:
+                    updated_fields[FIELD_MAPPING[field_key]] = field_value
+    
+    
+    # Merge updated fields with current state
+    final_state = {**current_state, **updated_fields}
+
+    # Multi-city: the first leg is the trip's origin and departure; a
+    # single leg is just a one-way trip. A new LEGS list sets the trip
+    # fields, while an edit to the trip fields alone rewrites the first
+    # leg, so neither side silently undoes the other
+    legs = parse_legs(final_state.get("legs", "")) or []
+    if legs and "legs" in updated_fields:
+        first = legs[0]
+        final_state.update(origin=first["origin"], destination=first["destination"],
+                           departure_date=first["departure_date"])
+        if not final_state.get("mode"):
+            final_state["mode"] = "flight"
+    elif legs:
+        edits = {f: updated_fields[f] for f in ("origin", "destination", "departure_date") if f in updated_fields}
+        legs[0] = {**legs[0], **edits}
+        # A first leg moved past the next one no longer makes a multi-city plan
+        if len(legs) > 1 and legs[0]["departure_date"] > legs[1]["departure_date"]:
+            print("DEBUG: First leg now departs after the second, dropping the multi-city legs")
+            legs = []
+    final_state.pop("legs", None)
+    if len(legs) < 2:
+        legs = []
 
-        # Heuristic: infer travel mode if missing
-        inferred_mode = final_state.get("mode", "").strip().lower()
-        if not inferred_mode:
-            ql = (query or "").lower()
-            if any(k in ql for k in ["fly", "flight", "airline", "plane", "airplane"]):
+    # Heuristic: infer travel mode if missing
+    inferred_mode = final_state.get("mode", "").strip().lower()
+    if not inferred_mode:
+        ql = (query or "").lower()
+        if any(k in ql for k in ["fly", "flight", "airline", "plane", "airplane"]):
+            inferred_mode = "flight"
+        elif any(k in ql for k in ["train", "rail", "railway", "bullet train"]):
+            inferred_mode = "train"
+        elif any(k in ql for k in ["bus", "coach"]):
+            inferred_mode = "bus"
+        else:
+            origin_country = (final_state.get("origin_country") or "").strip().lower()
+            destination_country = (final_state.get("destination_country") or "").strip().lower()
+            if origin_country and destination_country and origin_country != destination_country:
                 inferred_mode = "flight"
-            elif any(k in ql for k in ["train", "rail", "railway", "bullet train"]):
+            elif origin_country and destination_country and origin_country == destination_country:
                 inferred_mode = "train"
-            elif any(k in ql for k in ["bus", "coach"]):
-                inferred_mode = "bus"
             else:
-                origin_country = (final_state.get("origin_country") or "").strip().lower()
-                destination_country = (final_state.get("destination_country") or "").strip().lower()
-                if origin_country and destination_country and origin_country != destination_country:
-                    inferred_mode = "flight"
-                elif origin_country and destination_country and origin_country == destination_country:
-                    inferred_mode = "train"
-                else:
-                    inferred_mode = "flight"
+                inferred_mode = "flight"
 
-            final_state["mode"] = inferred_mode
-        
+        final_state["mode"] = inferred_mode
+    
+    
+    # Validate required fields - only check non-empty values
+    required_fields = ["origin", "destination", "departure_date", "mode"]
+    missing_fields = []
+    
+    for field in required_fields:
+        value = final_state.get(field, "").strip()
+        if not value or value.startswith('['):  # Also check for placeholder values
+            missing_fields.append(field)
+    
+    # Determine response and next agent
+    if missing_fields:
+        field_prompts = {
+            "origin": "departure city",
+            "destination": "arrival city", 
+            "departure_date": "departure date (YYYY-MM-DD format)",
+            "mode": "travel mode (flight, bus, or train)"
+        }
         
-        # Validate required fields - only check non-empty values
-        required_fields = ["origin", "destination", "departure_date", "mode"]
-        missing_fields = []
+        missing_prompts: List[str] = [field_prompts.get(field, field) for field in missing_fields]
+        missing_list: str = ", ".join(missing_prompts)
         
-        for field in required_fields:
-            value = final_state.get(field, "").strip()
-            if not value or value.startswith('['):  # Also check for placeholder values
-                missing_fields.append(field)
+        response_msg = f"I need more information. Please provide your {missing_list}."
+        next_agent = "wait_for_input"  # Stop processing and wait for user input
+        needs_input = True
+        # Warm the offer cache for the likely answers while the user types
+        prefetcher.maybe_prefetch(final_state)
         
-        # Determine response and next agent
-        if missing_fields:
-            field_prompts = {
-                "origin": "departure city",
-                "destination": "arrival city", 
-                "departure_date": "departure date (YYYY-MM-DD format)",
-                "mode": "travel mode (flight, bus, or train)"
-            }
-            
-            missing_prompts: List[str] = [field_prompts.get(field, field) for field in missing_fields]
-            missing_list: str = ", ".join(missing_prompts)
-            
-            response_msg = f"I need more information. Please provide your {missing_list}."
-            next_agent = "wait_for_input"  # Stop processing and wait for user input
-            needs_input = True
-            
-        else:
-            # All required info collected
-            summary = f"""Great! Here's your travel information:
+    else:
+        # All required info collected
+        summary = f"""Great! Here's your travel information:
 ✈️ From: {final_state['origin']} → {final_state['destination']}
 📅 Date: {final_state['departure_date']}
 🚗 Mode: {final_state['mode'].title()}"""
-            
-            if final_state.get('return_date'):
-                summary += f"\n🔄 Return: {final_state['return_date']}"
-            if final_state.get('departure_time'):
-                summary += f"\n⏰ Departure: {final_state['departure_time']}"
-                
-            response_msg = summary + "\n\nProceeding to find options..."
-            
-            # Route to appropriate booking agent
-            mode = final_state.get("mode", "flight").lower()
-            if "bus" in mode:
-                next_agent = "bus_agent"
-            elif "train" in mode:
-                next_agent = "train_agent"
-            else:
-                next_agent = "flight_agent"
-            
-            needs_input = False
+        if legs:
+            route = " → ".join([legs[0]["origin"]] + [l["destination"] for l in legs])
+            summary += f"\n🗺️ Multi-city: {route} ({', '.join(l['departure_date'] for l in legs)})"
         
-        # Add response message to state
-        new_messages = messages + [AIMessage(content=response_msg)]
+        if final_state.get('departure_date_end'):
+            summary += f" to {final_state['departure_date_end']} (flexible)"
+        if final_state.get('return_date'):
+            summary += f"\n🔄 Return: {final_state['return_date']}"
+        if final_state.get('departure_time'):
+            summary += f"\n⏰ Departure: {final_state['departure_time']}"
+        filters = ["non-stop" if field == "max_stops" and final_state[field] == "0" else label.format(final_state[field])
+                   for field, label in FILTER_LABELS if final_state.get(field)]
+        if filters:
+            summary += f"\n🔎 Filters: {', '.join(filters)}"
+            
+        response_msg = summary + "\n\nProceeding to find options..."
         
-        # Return complete updated state
-        result = {
-            **state,  # Preserve any other state fields
-            "messages": new_messages,
-            "next_agent": next_agent,
-            "needs_user_input": needs_input,
-            "user_query": query,
-            **final_state  # Include all travel information (current + updated)
-        }
-        return result
+        # Route to appropriate booking agent
+        mode = final_state.get("mode", "flight").lower()
+        if "bus" in mode:
+            next_agent = "bus_agent"
+        elif "train" in mode:
+            next_agent = "train_agent"
+        else:
+            next_agent = "flight_agent"
         
-    except Exception as e:
-        # Ensure messages is defined for error case
-        messages = state.get("messages", []) or []
-        error_msg = f"Sorry, I encountered an error processing your request: {str(e)}"
-        print(f"DEBUG: Error in query_parser: {str(e)}")
-        return {
-            **state,  # Preserve existing state
-            "messages": messages + [AIMessage(content=error_msg)],
-            "next_agent": "query_parser",
-            "needs_user_input": True
-        }
+        needs_input = False
+    
+    # Add response message to state
+    new_messages = messages + [AIMessage(content=response_msg)]
+    
+    # Return complete updated state
+    result = {
+        **state,  # Preserve any other state fields
+        "messages": new_messages,
+        "next_agent": next_agent,
+        "needs_user_input": needs_input,
+        "user_query": query,
+        **final_state,  # Include all travel information (current + updated)
+        "legs": legs
+    }
+    return result
+
+def _parser_error(state: State, e: Exception) -> Dict[str, Any]:
+    # Ensure messages is defined for error case
+    messages = state.get("messages", []) or []
+    error_msg = f"Sorry, I encountered an error processing your request: {str(e)}"
+    print(f"DEBUG: Error in query_parser: {str(e)}")
+    return {
+        **state,  # Preserve existing state
+        "messages": messages + [AIMessage(content=error_msg)],
+        "next_agent": "query_parser",
+        "needs_user_input": True
+    }
 
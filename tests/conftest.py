@@ -0,0 +1,6 @@
+import os
+import sys
+
+# LLM_helper configures the Gemini client at import time
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
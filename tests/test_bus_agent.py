@@ -0,0 +1,76 @@
+import os
+import zipfile
+
+import pytest
+
+from transport_agents import bus_agent
+from transport_agents.bus_agent import BusTimetable, install_feed
+
+GTFS_FIXTURE = os.path.join(os.path.dirname(__file__), "gtfs")
+MONDAY, SATURDAY = "2026-10-19", "2026-10-24"
+
+
+@pytest.fixture(scope="module")
+def timetable():
+    return BusTimetable.from_gtfs(GTFS_FIXTURE)
+
+
+def test_loads_feed(timetable):
+    assert timetable.n_stops == 4
+    # Consecutive stop_times within each trip
+    assert timetable.n_connections == 8
+
+
+def test_earliest_arrival_transfers_between_routes(timetable):
+    journey = timetable.earliest_arrival(timetable.find_stops("central station"), timetable.find_stops("harbour"),
+                                         7 * 3600 + 30 * 60, weekday=0)
+    trip = timetable.describe(journey)
+    assert [leg["trip_id"] for leg in trip["legs"]] == ["t1", "t2"]
+    # The rider stays on t1 through Clock Tower and changes at Market
+    assert [(leg["from"], leg["to"]) for leg in trip["legs"]] == [("Central Station", "Market"), ("Market", "Harbour")]
+    assert (trip["departure_time"], trip["arrival_time"], trip["transfers"]) == ("08:00", "09:10", 1)
+    assert trip["operator"] == "1 + 2"
+
+
+def test_search_lists_successive_departures(timetable):
+    results = timetable.search("Central Station", "Harbour", MONDAY, "07:00")
+    assert [(r["departure_time"], r["arrival_time"], r["transfers"]) for r in results] == [
+        ("08:00", "09:10", 1), ("09:00", "10:15", 1), ("10:00", "10:40", 0)]
+
+
+def test_calendar_filters_weekday_services(timetable):
+    # Only the weekend express runs on Saturday
+    results = timetable.search("Central", "Harbour", SATURDAY)
+    assert [(r["operator"], r["departure_time"], r["arrival_time"]) for r in results] == [("3X", "07:00", "07:50")]
+    assert timetable.search("Central", "Harbour", MONDAY, "10:01") == []
+
+
+def test_unknown_stop(timetable):
+    with pytest.raises(ValueError):
+        timetable.search("Nowhere", "Harbour", MONDAY)
+
+
+def test_bus_node_uses_installed_feed(tmp_path, monkeypatch):
+    gtfs_dir = str(tmp_path / "gtfs")
+    assert install_feed(GTFS_FIXTURE, gtfs_dir) == sorted(bus_agent.GTFS_FILES)
+    monkeypatch.setattr(bus_agent, "GTFS_DIR", gtfs_dir)
+    monkeypatch.setattr(bus_agent, "_timetable", None)
+    state = bus_agent.bus_search_node({"origin": "Central Station", "destination": "Market",
+                                       "departure_date": MONDAY, "messages": []})
+    assert [b["departure_time"] for b in state["bus_results"]] == ["08:00", "09:00"]
+    assert "Found 2 bus connections" in state["messages"][-1].content
+
+
+def test_install_rejects_incomplete_feed(tmp_path):
+    (tmp_path / "stops.txt").write_text("stop_id,stop_name\n")
+    with pytest.raises(ValueError):
+        install_feed(str(tmp_path), str(tmp_path / "out"))
+
+
+def test_install_from_zip_with_top_level_folder(tmp_path):
+    feed = tmp_path / "feed.zip"
+    with zipfile.ZipFile(feed, "w") as archive:
+        for name in bus_agent.GTFS_FILES:
+            archive.write(os.path.join(GTFS_FIXTURE, name), f"operator-feed/{name}")
+    install_feed(str(feed), str(tmp_path / "gtfs"))
+    assert BusTimetable.from_gtfs(str(tmp_path / "gtfs")).n_connections == 8
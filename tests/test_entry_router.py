@@ -0,0 +1,67 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from graph.main_graph import create_workflow, new_session_state
+from transport_agents.model_router import router
+
+TRAVEL_DAY = (date.today() + timedelta(days=7)).isoformat()
+
+
+@pytest.fixture
+def parser_calls():
+    """Stub chat models that count query-parser invocations."""
+    calls = []
+
+    def reply(prompt_value):
+        messages = prompt_value.to_messages()
+        if "extracts travel information" in messages[0].content:
+            calls.append(messages[-1].content)
+        return AIMessage(content=f"ORIGIN: Delhi\nDESTINATION: Jaipur\nDEPARTURE_DATE: {TRAVEL_DAY}\nMODE: bus")
+
+    async def areply(prompt_value):
+        return reply(prompt_value)
+
+    original = router.chat_factory
+    router.use_factories(chat=lambda name: RunnableLambda(reply, afunc=areply))
+    yield calls
+    router.use_factories(chat=original)
+
+
+def _new_turn(text):
+    return {**new_session_state(), "messages": [HumanMessage(content=text)]}
+
+
+def test_continuation_hops_skip_the_parser(parser_calls):
+    graph = create_workflow()
+    state = graph.invoke(_new_turn("Bus from Delhi to Jaipur next week"))
+    assert len(parser_calls) == 1
+    assert state["mode"] == "bus"
+
+    # What interactive_chat's continuation loop re-invokes with
+    for _ in range(3):
+        state = graph.invoke({**state, "next_agent": "bus_agent", "needs_user_input": False})
+    assert len(parser_calls) == 1
+    assert state["next_agent"] == "end"
+
+
+def test_async_continuation_hops_skip_the_parser(parser_calls):
+    graph = create_workflow()
+
+    async def run():
+        state = await graph.ainvoke(_new_turn("Bus from Delhi to Jaipur next week"))
+        return await graph.ainvoke({**state, "next_agent": "bus_agent", "needs_user_input": False})
+
+    asyncio.run(run())
+    assert len(parser_calls) == 1
+
+
+def test_new_message_is_parsed(parser_calls):
+    graph = create_workflow()
+    state = graph.invoke(_new_turn("Bus from Delhi to Jaipur next week"))
+    graph.invoke({**state, "messages": state["messages"] + [HumanMessage(content="make it the day after")],
+                  "next_agent": "query_parser"})
+    assert len(parser_calls) == 2
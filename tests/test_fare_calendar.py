@@ -0,0 +1,43 @@
+import asyncio
+from datetime import date, timedelta
+
+from transport_agents import fare_calendar
+from transport_agents.FlightAgent2 import _apply_calendar
+
+PRICES = {0: "320.00", 1: "180.00", 2: "250.00"}
+
+
+def _day(offset):
+    return (date.today() + timedelta(days=10 + offset)).isoformat()
+
+
+def _response(origin, destination, day, token):
+    offset = (date.fromisoformat(day) - date.fromisoformat(_day(0))).days
+    price = PRICES.get(offset) if origin == "DEL" else "90.00"
+    # Nothing is written to the offer cache, as with OFFER_CACHE_TTL=0 or an eviction
+    return {"data": [{"price": {"total": price}}] if price else []}
+
+
+def test_calendar_is_built_from_the_responses(monkeypatch):
+    monkeypatch.setattr(fare_calendar, "search_flights", _response)
+    calendar = fare_calendar.search_fare_calendar("DEL", "BOM", _day(0), _day(3), "token")
+    assert calendar.cheapest_day() == (_day(1), 180.0)
+    assert calendar.summary().splitlines()[3].endswith("-")
+
+
+def test_async_calendar_with_return_range(monkeypatch):
+    async def aresponse(*args):
+        return _response(*args)
+
+    monkeypatch.setattr(fare_calendar, "asearch_flights", aresponse)
+    calendar = asyncio.run(fare_calendar.asearch_fare_calendar(
+        "DEL", "BOM", _day(0), _day(2), "token", return_start=_day(1), return_end=_day(2)))
+    assert calendar.cheapest_pair() == (_day(1), _day(1), 270.0)
+
+
+def test_chosen_day_clears_the_ranges(monkeypatch):
+    monkeypatch.setattr(fare_calendar, "search_flights", _response)
+    calendar = fare_calendar.search_fare_calendar("DEL", "BOM", _day(0), _day(2), "token")
+    state = _apply_calendar({"departure_date": _day(0), "departure_date_end": _day(2), "return_date_end": ""}, calendar)
+    assert state["departure_date"] == _day(1)
+    assert state["departure_date_end"] == "" and state["return_date_end"] == ""
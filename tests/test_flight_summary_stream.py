@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+
+from transport_agents import LLM_helper
+from transport_agents.model_router import router
+from transport_agents.provider_scheduler import scheduler
+
+
+def _row(airline, price):
+    return {"airline": airline, "price": price, "duration": "2h 00m", "departure_time": "08:00",
+            "arrival_time": "10:00", "stops": "0"}
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Streams `doc` in chunks; `fail_after` chunks raise, `cut` truncates the document."""
+
+    def __init__(self, doc, fail_after=None, cut=None):
+        self.text = json.dumps(doc)[:cut]
+        self.fail_after = fail_after
+
+    def _chunks(self):
+        for i in range(0, len(self.text), 40):
+            if self.fail_after is not None and i // 40 >= self.fail_after:
+                raise ConnectionError("stream reset")
+            yield Chunk(self.text[i:i + 40])
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        return self._chunks() if stream else Response(self.text)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        if not stream:
+            return Response(self.text)
+
+        async def chunks():
+            for chunk in self._chunks():
+                yield chunk
+        return chunks()
+
+
+@pytest.fixture
+def models(monkeypatch):
+    # No Gemini rate limit against fake models
+    monkeypatch.delitem(scheduler._providers, "gemini", raising=False)
+    weak, strong = router.tiers("flight_summary")[:2]
+    current = {}
+    original = router.genai_factory
+    router.use_factories(genai=lambda name: current[{weak: "weak", strong: "strong"}[name]])
+    yield current
+    router.use_factories(genai=original)
+
+
+WEAK = {"summary": "weak", "filtered_results": [_row("AA", "100"), _row("BB", "110"), _row("CC", "120")]}
+STRONG = {"summary": "strong", "filtered_results": [_row("DD", "90"), _row("EE", "95")]}
+
+
+def _summarize(raw, is_async):
+    shown = []
+    if is_async:
+        output = asyncio.run(LLM_helper.afilter_and_extract_flights("cheapest", raw, on_record=shown.append))
+    else:
+        output = LLM_helper.filter_and_extract_flights("cheapest", raw, on_record=shown.append)
+    return output, shown
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test_escalation_replaces_the_streamed_rows(models, capsys, is_async):
+    # The weak tier streams two rows, then its JSON is cut off
+    models.update(weak=FakeModel(WEAK, cut=len(json.dumps(WEAK)) - 60), strong=FakeModel(STRONG))
+    output, shown = _summarize({"data": [{"id": f"esc-{is_async}"}]}, is_async)
+
+    assert output["filtered_results"] == STRONG["filtered_results"]
+    assert [r["airline"] for r in shown] == ["AA", "BB", "DD", "EE"]
+    # What is on screen ends with what is stored, after a notice
+    assert shown[-2:] == output["filtered_results"]
+    assert "rows above are replaced" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test_broken_stream_falls_back_to_a_full_response(models, capsys, is_async):
+    models.update(weak=FakeModel(WEAK, fail_after=4), strong=FakeModel(STRONG))
+    output, shown = _summarize({"data": [{"id": f"fallback-{is_async}"}]}, is_async)
+
+    out = capsys.readouterr().out
+    assert "stream reset" in out and "retrying without streaming" in out
+    assert output["summary"] == "weak"
+    assert shown[-3:] == WEAK["filtered_results"]
+
+
+def test_flight_agent_re_renders_rows_that_do_not_match_state(capsys):
+    from transport_agents.FlightAgent2 import _flight_response
+    from transport_agents.offers_table import OffersTable
+
+    state = {"origin": "DEL", "destination": "BOM", "departure_date": "2026-11-01", "messages": []}
+    table = OffersTable.from_amadeus({"data": []})
+    final = STRONG["filtered_results"]
+
+    _flight_response(state, [], table, {"summary": "s", "filtered_results": final}, list(final))
+    assert "DD" not in capsys.readouterr().out
+
+    result = _flight_response(state, [], table, {"summary": "s", "filtered_results": final},
+                              WEAK["filtered_results"][:2])
+    assert "DD" in capsys.readouterr().out
+    assert result["flight_results"] == final
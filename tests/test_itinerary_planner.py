@@ -0,0 +1,98 @@
+from datetime import datetime
+
+from transport_agents.itinerary_planner import (Leg, legs_from_flight_offers, legs_from_train_results, plan_itineraries,
+                                               plan_journeys)
+from transport_agents.train_enrichment import _parse_schedule, train_results_cache, train_rows
+
+
+def _leg(mode, origin, destination, dep, arr, price):
+    day = datetime(2026, 11, 1)
+    return Leg(mode, origin, destination, day.replace(hour=dep), day.replace(hour=arr), price)
+
+
+def test_unknown_price_does_not_win_on_price():
+    legs = [
+        _leg("flight", "A", "C", 8, 10, 200.0),
+        _leg("bus", "A", "B", 6, 9, None),
+        _leg("bus", "B", "C", 10, 14, None),
+    ]
+    journeys = plan_journeys(legs, "A", "C", aliases={})
+    # The priced flight comes first; the unpriced bus journey is kept but not ranked as cheaper
+    assert [j["modes"] for j in journeys] == [["flight"], ["bus", "bus"]]
+    assert journeys[0]["price"] == 200.0
+    assert journeys[1]["price"] is None
+
+
+def test_known_cheaper_ground_journey_still_on_the_front():
+    legs = [_leg("flight", "A", "C", 8, 10, 200.0), _leg("train", "A", "C", 7, 15, 40.0)]
+    journeys = plan_journeys(legs, "A", "C", aliases={})
+    assert [j["price"] for j in journeys] == [40.0, 200.0]
+
+
+def test_train_rows_use_enriched_fares():
+    rows = [{"train_name": "T", "source": "NDLS", "destination": "BCT", "date": "2026-11-01",
+             "departure_time": "16:30", "arrival_time": "08:30", "fares": {"3A": 2400.0, "SL": 800.0}},
+            {"train_name": "U", "source": "NDLS", "destination": "BCT", "date": "2026-11-01",
+             "departure_time": "18:00", "arrival_time": "10:00", "fares": None},
+            {"train_name": "V", "source": "NDLS", "destination": "BCT", "date": "2026-11-01",
+             "departure_time": "19:00", "fares": {"SL": 700.0}}]
+    legs = legs_from_train_results(rows, "2026-11-01")
+    # V has no arrival time and BCT no known city to estimate from
+    assert [(l.label, l.price) for l in legs] == [("T", 800.0), ("U", None)]
+    assert legs[0].arrival.day == 2
+
+
+def _live_station_row(departure, **enriched):
+    """A train_results row as train_agent builds it from a live-station listing."""
+    row = train_rows([{"trainName": "Howrah Rajdhani", "trainNumber": 12301, "departureTime": departure,
+                       "runDays": {"sun": True}}], "HWH", "NDLS", "2026-11-01")[0]
+    row.update(enriched)
+    return row
+
+
+def _flight(departure, arrival, price):
+    return {"data": [{"price": {"total": price}, "itineraries": [{"segments": [
+        {"carrierCode": "AI", "departure": {"iataCode": "DEL", "at": departure},
+         "arrival": {"iataCode": "BOM", "at": arrival}}]}]}]}
+
+
+def test_train_to_the_airport_then_fly():
+    schedule = {"arrival_time": "10:00", "days": 1, "km": 1447.0}
+    row = _live_station_row("16:50", fares={"3A": 2900.0}, schedule=schedule)
+    legs = legs_from_train_results([row], "2026-11-01") + legs_from_flight_offers(
+        _flight("2026-11-02T13:00", "2026-11-02T15:10", "120.00"))
+    journeys = plan_journeys(legs, "Kolkata", "Mumbai")
+    assert [j["modes"] for j in journeys] == [["train", "flight"]]
+    assert journeys[0]["legs"][0]["arrival_time"] == "2026-11-02T10:00"
+    assert journeys[0]["price"] == 3020.0
+
+
+def test_unenriched_train_arrival_is_estimated_from_distance():
+    row = _live_station_row("16:50")
+    (leg,) = legs_from_train_results([row], "2026-11-01")
+    assert leg.label == "Howrah Rajdhani (est. arrival)"
+    assert 20 < (leg.arrival - leg.departure).total_seconds() / 3600 < 36
+
+    # Too tight for the estimate, connects with a later flight
+    early = legs_from_flight_offers(_flight("2026-11-02T13:00", "2026-11-02T15:10", "120.00"))
+    late = legs_from_flight_offers(_flight("2026-11-03T09:00", "2026-11-03T11:10", "110.00"))
+    assert plan_journeys([leg] + early, "Kolkata", "Mumbai") == []
+    journeys = plan_journeys([leg] + early + late, "Kolkata", "Mumbai")
+    assert [j["legs"][-1]["departure_time"] for j in journeys] == ["2026-11-03T09:00"]
+
+
+def test_schedule_arrival_from_irctc_route():
+    payload = {"data": {"route": [
+        {"station_code": "HWH", "sta": "", "std": "16:50", "day": 1, "distance_from_source": 0},
+        {"station_code": "DHN", "sta": "20:55", "std": "21:00", "day": 1, "distance_from_source": 259},
+        {"station_code": "NDLS", "sta": "10:00", "std": "", "day": 2, "distance_from_source": 1447}]}}
+    assert _parse_schedule(payload, "HWH", "NDLS") == {"arrival_time": "10:00", "days": 1, "km": 1447.0}
+    assert _parse_schedule(payload, "NDLS", "HWH") is None
+
+
+def test_flight_search_connects_with_a_cached_train_search():
+    row = _live_station_row("16:50", schedule={"arrival_time": "10:00", "days": 1, "km": 1447.0})
+    train_results_cache.put(("HWH", "NDLS", "2026-11-01"), [row])
+    flights = _flight("2026-11-02T13:00", "2026-11-02T15:10", "120.00")
+    state = {"origin": "Kolkata", "destination": "Mumbai", "departure_date": "2026-11-01"}
+    assert [j["modes"] for j in plan_itineraries(state, flights)] == [["train", "flight"]]
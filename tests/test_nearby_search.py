@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from transport_agents import API_helper
+
+
+@pytest.fixture
+def no_routes(monkeypatch):
+    monkeypatch.setattr(API_helper, "_nearby_routes", lambda origin, destination, radius: [])
+
+
+def test_no_airport_pairs_is_an_error_result(no_routes):
+    result = API_helper.search_flights("Delhi", "New Delhi", "2026-11-01", "token", nearby_radius_km=100)
+    assert result["error"] == "IATA_LOOKUP_ERROR"
+    assert result["data"] == []
+
+
+def test_no_airport_pairs_is_an_error_result_async(no_routes):
+    result = asyncio.run(API_helper.asearch_flights("Delhi", "New Delhi", "2026-11-01", "token",
+                                                    nearby_radius_km=100))
+    assert result["error"] == "IATA_LOOKUP_ERROR"
+
+
+def test_same_airport_without_coordinates_has_no_pairs(monkeypatch):
+    monkeypatch.setattr(API_helper, "_nearby_airports", lambda place, radius: [("DEL", 0.0)])
+    assert API_helper._nearby_routes("Delhi", "New Delhi", 100) == []
+    result = API_helper.search_flights("Delhi", "New Delhi", "2026-11-01", "token", nearby_radius_km=100)
+    assert "No airport pairs" in result["message"]
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from graph.batch_runner import _start_turn
+from graph.main_graph import create_workflow, new_session_state
+from transport_agents import price_watch
+from transport_agents.price_watch import parse_watch, watchlist
+
+TRAVEL_DAY = (date.today() + timedelta(days=20)).isoformat()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("watch this route", ("watch", None)),
+    ("notify me when the fare drops below 250", ("watch", 250.0)),
+    ("track prices under 5,000 rupees", ("watch", 5000.0)),
+    ("stop watching", ("unwatch", None)),
+    ("cancel the alerts", ("unwatch", None)),
+    ("let me know the cheapest flight", None),
+    ("watch flights from Delhi to Goa", None),
+    ("only non-stop please", None),
+    ("stop the alerts", ("unwatch", None)),
+    ("don't notify me anymore", ("unwatch", None)),
+    ("non-stop flights only, alert me if it drops below 200", ("watch", 200.0)),
+    ("1 stop is fine, notify me when fares drop under 300", ("watch", 300.0)),
+    ("notify me of flights to Paris on December 5", None),
+    ("track flights to Goa next Friday", None),
+])
+def test_parse_watch(text, expected):
+    assert parse_watch(text) == expected
+
+
+@pytest.fixture
+def fares(monkeypatch):
+    """Stub flight provider whose cheapest fare is set by the test."""
+    current = {"price": 300.0}
+    monkeypatch.setitem(price_watch.FETCHERS, "flight", lambda query: {
+        "data": [{"price": {"total": f"{current['price'] + i * 10:.2f}", "currency": "EUR"}} for i in range(3)]})
+    monkeypatch.setattr(watchlist, "start", lambda: None)
+    yield current
+    watchlist.unsubscribe_session("watch-test")
+
+
+def _turn(graph, state, text):
+    return graph.invoke({**_start_turn(state, text), "session_id": "watch-test"})
+
+
+def test_watch_request_subscribes_and_notifies_next_turn(fares):
+    graph = create_workflow()
+    state = {**new_session_state("watch-test"), "origin": "Delhi", "destination": "Mumbai",
+             "departure_date": TRAVEL_DAY, "mode": "flight"}
+
+    state = _turn(graph, state, "notify me when the fare drops below 250")
+    assert "Watching flights from Delhi to Mumbai" in state["messages"][-1].content
+    assert watchlist.metrics()["subscriptions"] >= 1
+
+    watchlist.poll_once()
+    fares["price"] = 240.0
+    assert watchlist.poll_once() == 1
+
+    # The next turn starts with the queued notification
+    turn = _start_turn(state, "stop watching")
+    assert "cheapest fare is now 240.00 EUR (was 300.00 EUR)" in turn["messages"][-2].content
+    assert isinstance(turn["messages"][-1], HumanMessage)
+
+    state = graph.invoke(turn)
+    assert state["messages"][-1].content == " Stopped watching 1 route."
+    assert not any(s.session_id == "watch-test" for s in watchlist._subs.values())
+
+
+def test_watch_without_a_trip_asks_for_the_route(fares):
+    state = _turn(create_workflow(), new_session_state("watch-test"), "watch this route")
+    assert "route and date first" in state["messages"][-1].content
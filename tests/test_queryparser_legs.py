@@ -0,0 +1,35 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from query_parser_agent.queryparser import _apply_parse, _prepare_parse
+
+LEGS = [
+    {"origin": "Delhi", "destination": "Paris", "departure_date": "2026-11-01"},
+    {"origin": "Paris", "destination": "Rome", "departure_date": "2026-11-05"},
+    {"origin": "Rome", "destination": "Delhi", "departure_date": "2026-11-10"},
+]
+
+
+def _parse(reply, query="actually start from Mumbai"):
+    state = {"messages": [HumanMessage(content=query)], "origin": "Delhi", "destination": "Paris",
+             "departure_date": "2026-11-01", "mode": "flight", "legs": [dict(l) for l in LEGS]}
+    _, query, messages, current = _prepare_parse(state)
+    return _apply_parse(state, messages, query, current, AIMessage(content=reply))
+
+
+def test_origin_edit_is_kept_and_moves_the_first_leg():
+    result = _parse("ORIGIN: Mumbai")
+    assert result["origin"] == "Mumbai"
+    assert result["legs"][0]["origin"] == "Mumbai"
+    assert result["legs"][1:] == LEGS[1:]
+
+
+def test_new_legs_set_the_trip_fields():
+    result = _parse("LEGS: Pune > Paris on 2026-11-02; Paris > Rome on 2026-11-05", "start in Pune on the 2nd")
+    assert (result["origin"], result["departure_date"]) == ("Pune", "2026-11-02")
+    assert len(result["legs"]) == 2
+
+
+def test_first_leg_moved_past_the_second_drops_the_legs():
+    result = _parse("DEPARTURE_DATE: 2026-11-07", "leave on the 7th instead")
+    assert result["departure_date"] == "2026-11-07"
+    assert result["legs"] == []
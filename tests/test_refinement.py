@@ -0,0 +1,70 @@
+import pytest
+
+from langchain_core.messages import HumanMessage
+
+from transport_agents.refinement import RefinementEngine, parse_refinement, trip_signature
+
+
+@pytest.mark.parametrize("text, stops", [
+    ("max 1 stop", 1),
+    ("up to 2 stops", 2),
+    ("at most one stop", 1),
+    ("only non-stop please", 0),
+])
+def test_stop_limits_are_not_prices(text, stops):
+    refinement = parse_refinement(text)
+    assert refinement.max_stops == stops
+    assert refinement.max_price is None
+
+
+@pytest.mark.parametrize("text", ["within 5 hours", "under 3 hours", "under 90 min", "up to 4h"])
+def test_durations_are_not_prices(text):
+    refinement = parse_refinement(text)
+    assert refinement is None or refinement.max_price is None
+
+
+@pytest.mark.parametrize("text, price", [
+    ("cheaper than 500", 500),
+    ("under $300", 300),
+    ("max 1,200 rupees", 1200),
+    ("budget of 450", 450),
+    ("under 400 usd with max 1 stop", 400),
+])
+def test_prices(text, price):
+    assert parse_refinement(text).max_price == price
+
+
+def test_bare_number_without_price_context_is_ignored():
+    assert parse_refinement("under 500") is None
+
+
+def test_new_search_goes_to_parser():
+    assert parse_refinement("from Delhi to Goa tomorrow") is None
+
+
+@pytest.mark.parametrize("text", [
+    "cheapest flight to Goa",
+    "any non-stop to Mumbai?",
+    "make it a bus, the earliest",
+    "can I take a direct train",
+    "Is it cheaper than 300 on May 5?",
+    "Book the cheapest one",
+    "what is the baggage allowance on the cheapest one?",
+])
+def test_changed_search_or_other_intent_is_not_a_refinement(text):
+    assert parse_refinement(text) is None
+
+
+@pytest.mark.parametrize("text", ["something earlier", "only non-stop please", "show the fastest",
+                                  "up to two stops", "cheapest ones from the list", "in the morning only"])
+def test_pure_refinements_stay_local(text):
+    assert parse_refinement(text) is not None
+
+
+@pytest.mark.parametrize("text, wanted", [("cheapest flight to Goa", False), ("Book the cheapest one", False),
+                                          ("something earlier", True)])
+def test_entry_router_only_refines_pure_refinements(text, wanted):
+    state = {"origin": "DEL", "destination": "BOM", "departure_date": "2026-10-20", "mode": "flight",
+             "messages": [HumanMessage(content=text)]}
+    state["refine_source"] = {"mode": "flight", "key": [], "trip": trip_signature(state), "fields": {}}
+    assert RefinementEngine().wants(state) is wanted
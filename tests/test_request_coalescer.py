@@ -0,0 +1,132 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from transport_agents.request_coalescer import SingleFlight, coalescer_stats
+
+KEY = ("DEL", "BOM", "2026-11-01")
+
+
+class StubProvider:
+    """Local HTTP provider that holds every request until released."""
+
+    def __init__(self):
+        self.hits = []
+        self.gate = threading.Event()
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                provider.hits.append(self.path)
+                provider.gate.wait(10)
+                status = 500 if "fail" in self.path else 200
+                body = json.dumps({"data": [{"id": "1", "path": self.path}]}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/flight-offers?from=DEL&to=BOM"
+
+
+@pytest.fixture
+def provider():
+    stub = StubProvider()
+    yield stub
+    stub.gate.set()
+    stub.server.shutdown()
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+async def afetch(url):
+    return await asyncio.to_thread(fetch, url)
+
+
+def _release_when_joined(flight, provider, callers):
+    """Open the provider once every caller has joined the in-flight request."""
+    def wait():
+        deadline = time.monotonic() + 10
+        while (flight.requests < callers or not provider.hits) and time.monotonic() < deadline:
+            time.sleep(0.005)
+        provider.gate.set()
+    threading.Thread(target=wait, daemon=True).start()
+
+
+def test_sync_callers_share_one_request(provider):
+    flight = SingleFlight("test-sync")
+    _release_when_joined(flight, provider, 20)
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(lambda _: flight.do(KEY, fetch, provider.url), range(20)))
+    assert len(provider.hits) == 1
+    assert all(r == results[0] for r in results)
+    assert flight.stats() == {"requests": 20, "executed": 1, "coalesced": 19, "fan_in": 20.0}
+
+
+@pytest.mark.parametrize("fn", [fetch, afetch], ids=["blocking", "coroutine"])
+def test_async_callers_share_one_request(provider, fn):
+    flight = SingleFlight(f"test-async-{fn.__name__}")
+    _release_when_joined(flight, provider, 20)
+
+    async def callers():
+        return await asyncio.gather(*(flight.ado(KEY, fn, provider.url) for _ in range(20)))
+
+    results = asyncio.run(callers())
+    assert len(provider.hits) == 1
+    assert all(r == results[0] for r in results)
+    assert flight.stats()["executed"] == 1 and flight.stats()["fan_in"] == 20.0
+
+
+def test_sync_and_async_callers_share_one_request(provider):
+    flight = SingleFlight("test-mixed")
+    _release_when_joined(flight, provider, 40)
+
+    async def callers():
+        return await asyncio.gather(*(flight.ado(KEY, fetch, provider.url) for _ in range(20)))
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        sync_futures = [pool.submit(flight.do, KEY, fetch, provider.url) for _ in range(20)]
+        async_results = asyncio.run(callers())
+        sync_results = [f.result() for f in sync_futures]
+    assert len(provider.hits) == 1
+    assert all(r == sync_results[0] for r in sync_results + async_results)
+    assert coalescer_stats()["test-mixed"] == {"requests": 40, "executed": 1, "coalesced": 39, "fan_in": 40.0}
+
+
+def test_errors_are_shared_and_not_kept(provider):
+    flight = SingleFlight("test-errors")
+    url = provider.url + "&fail=1"
+    _release_when_joined(flight, provider, 10)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        futures = [pool.submit(flight.do, KEY, fetch, url) for _ in range(10)]
+    assert all(isinstance(f.exception(), urllib.error.HTTPError) for f in futures)
+    assert len(provider.hits) == 1
+
+    # Nothing is cached once the call completes: the next caller goes out again
+    flight.do(KEY, fetch, provider.url)
+    assert len(provider.hits) == 2 and flight.stats()["executed"] == 2
+
+
+def test_different_keys_are_not_coalesced(provider):
+    flight = SingleFlight("test-keys")
+    provider.gate.set()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(lambda day: flight.do(KEY[:2] + (day,), fetch, provider.url),
+                      ["2026-11-01", "2026-11-02", "2026-11-03"]))
+    assert len(provider.hits) == 3 and flight.stats()["coalesced"] == 0
@@ -0,0 +1,43 @@
+from graph.main_graph import new_session_state
+from graph.session import CompactSession, SessionStore, _sample_state, shared_results
+
+
+def _state(i=7):
+    return {
+        **_sample_state(i),
+        "legs": [{"origin": "Delhi", "destination": "Paris", "departure_date": "2026-11-01"},
+                 {"origin": "Paris", "destination": "Rome", "departure_date": "2026-11-05"}],
+        "refine_source": {"mode": "flight", "key": ["DEL", "CDG", "2026-11-01"],
+                          "trip": ["Delhi", "Paris", "2026-11-01", "", "flight"], "fields": {"max_stops": "0"}},
+    }
+
+
+def test_round_trip_keeps_legs_and_refine_source_out_of_extra():
+    state = _state()
+    packed = CompactSession.pack(state)
+    assert packed.extra is None
+    restored = packed.unpack()
+    assert restored["legs"] == state["legs"]
+    assert restored["refine_source"] == state["refine_source"]
+    assert restored["flight_results"] == state["flight_results"]
+    assert [m.content for m in restored["messages"]] == [m.content for m in state["messages"]]
+
+
+def test_equal_values_are_shared_and_released():
+    before = shared_results.stats()
+    first, second = CompactSession.pack(_state()), CompactSession.pack(_state())
+    stats = shared_results.stats()
+    # flight_results, legs and refine_source: three entries, each referenced twice
+    assert stats["entries"] - before["entries"] == 3
+    assert stats["references"] - before["references"] == 6
+    del first, second
+    assert shared_results.stats() == before
+
+
+def test_store_restores_empty_fields():
+    store = SessionStore()
+    store.save("s", new_session_state())
+    state = store.load("s")
+    assert state["legs"] == [] and state["refine_source"] is None and state["flight_results"] == []
+    store.drop("s")
+    assert store.load("s") is None and len(store) == 0
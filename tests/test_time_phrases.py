@@ -0,0 +1,36 @@
+import pytest
+
+from transport_agents.refinement import parse_refinement
+from transport_agents.summary_cache import normalize_intent
+from transport_agents.time_phrases import clock, meridiem_clock, mentions_date, minute_of, minutes, time_window
+
+
+def test_clock_round_trip():
+    assert minutes("08:05") == 485
+    assert minutes("24:00") == 1439
+    assert minutes("25:00") is None
+    assert clock(485) == "08:05"
+    assert minute_of("2025-03-01T08:05:00") == 485
+    assert meridiem_clock("6", None, "PM") == "18:00"
+
+
+@pytest.mark.parametrize("text, window", [
+    ("morning flights", ("05:00", "12:00")),
+    ("after 6pm", ("18:00", None)),
+    ("in the morning before 9:30", ("05:00", "09:30")),
+    ("anything", (None, None)),
+])
+def test_time_window(text, window):
+    assert time_window(text) == window
+
+
+def test_refinement_and_summary_key_read_the_same_window():
+    refinement = parse_refinement("only after 6pm")
+    assert (refinement.depart_after, refinement.depart_before) == ("18:00", None)
+    assert normalize_intent("only after 6pm") == "18:00-24:00"
+
+
+@pytest.mark.parametrize("text, named", [("on May 5", True), ("next Friday", True), ("12/10", True),
+                                         ("2026-10-20", True), ("something earlier", False)])
+def test_mentions_date(text, named):
+    assert mentions_date(text) is named
@@ -0,0 +1,14 @@
+from transport_agents.train_enrichment import _parse_seats
+
+PAYLOAD = {"data": [
+    {"date": "4-11-2026", "current_status": "AVAILABLE-0040", "total_fare": 1450},
+    {"date": "5-11-2026", "current_status": "WL 12", "total_fare": 1450},
+]}
+
+
+def test_seats_for_the_travel_day():
+    assert _parse_seats(PAYLOAD, "2026-11-05")["status"] == "WL 12"
+
+
+def test_other_days_are_not_reported_as_the_travel_day():
+    assert _parse_seats(PAYLOAD, "2026-11-07") is None
@@ -1,7 +1,19 @@
-import os, requests, time, re
+import os, requests, time, re, heapq, asyncio, dataclasses
+import aiohttp
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 from dotenv import load_dotenv, find_dotenv
 import pandas as pd
+from transport_agents.date_resolver import parse_iso_date
+from transport_agents.request_coalescer import SingleFlight
+from transport_agents.provider_scheduler import scheduler
+from transport_agents.airport_index import airport_index, transfer_minutes
+from transport_agents.offers_table import _duration_minutes
+from transport_agents.offer_stream import COMPRESSED_HEADERS, parse_offers, aparse_offers
+from transport_agents.alloc_profiler import profiler
+from transport_agents.tiered_cache import TieredCache
+from transport_agents.search_filters import SearchFilters, NO_FILTERS, payload_stats
 
 try:
     env_path = find_dotenv()
@@ -15,6 +27,27 @@ API_SECRET = os.getenv("AMADEUS_API_SECRET")
 ACCESS_TOKEN = None
 TOKEN_EXPIRY = 0
 
+# Successful flight-offer responses, keyed by (origin, destination, date);
+# shared across workers when CACHE_BACKEND is set
+OFFER_CACHE_TTL = int(os.getenv("OFFER_CACHE_TTL", "900"))
+offer_cache = TieredCache("offers", ttl=OFFER_CACHE_TTL)
+# Multi-city responses, keyed by every leg's origin, destination and date
+multi_city_cache = TieredCache("multi-city", ttl=OFFER_CACHE_TTL)
+
+# Identical concurrent searches share one in-flight Amadeus call
+_flight_requests = SingleFlight("amadeus")
+
+# Amadeus accepts at most this many originDestinations per request
+MAX_MULTI_CITY_LEGS = 6
+# Offers requested per search; a response this long may be truncated
+OFFER_LIMIT = 40
+
+# Nearby-airport mode: at most this many airports per side are searched
+MAX_NEARBY_AIRPORTS = int(os.getenv("MAX_NEARBY_AIRPORTS", "3"))
+
+# One aiohttp session per event loop for the async search path
+_aiohttp_sessions = {}
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 AIRPORTS_FILE = os.path.join(BASE_DIR, "Airports1.csv")
 
@@ -55,46 +88,53 @@ except Exception as e:
     _airports_df = pd.DataFrame(columns=["City", "IATA_Code"])
 
 def validate_date(date_str: str) -> tuple[bool, str]:
-    try:
-        flight_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        today = date.today()
-        
-        if flight_date < today:
-            days_diff = (today - flight_date).days
-            return False, f"Date {date_str} is {days_diff} days in the past"
-        
-        max_days_ahead = 330
-        if (flight_date - today).days > max_days_ahead:
-            return False, f"Date {date_str} is too far in the future"
-            
-        return True, ""
-        
-    except ValueError as e:
+    flight_date = parse_iso_date(date_str)
+    if flight_date is None:
         return False, f"Invalid date format '{date_str}'"
-
-def get_access_token():
-    global ACCESS_TOKEN, TOKEN_EXPIRY
+    
+    today = date.today()
+    
+    if flight_date < today:
+        days_diff = (today - flight_date).days
+        return False, f"Date {date_str} is {days_diff} days in the past"
+    
+    max_days_ahead = 330
+    if (flight_date - today).days > max_days_ahead:
+        return False, f"Date {date_str} is too far in the future"
         
-    if ACCESS_TOKEN and time.time() < TOKEN_EXPIRY:
-        return ACCESS_TOKEN
- 
+    return True, ""
+
+def _token_request():
     url = "https://test.api.amadeus.com/v1/security/oauth2/token"
     data = {
         "grant_type": "client_credentials",
         "client_id": API_KEY,
         "client_secret": API_SECRET
     }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    headers = {"Content-Type": "application/x-www-form-urlencoded", **COMPRESSED_HEADERS}
+
+    if not API_KEY or not API_SECRET:
+        missing = []
+        if not API_KEY:
+            missing.append("AMADEUS_API_KEY")
+        if not API_SECRET:
+            missing.append("AMADEUS_API_SECRET")
+        raise Exception(f"Missing environment variables: {', '.join(missing)}. Ensure they are set in your .env or environment.")
+    return url, data, headers
+
+def _store_token(data: dict) -> str:
+    global ACCESS_TOKEN, TOKEN_EXPIRY
+    ACCESS_TOKEN = data["access_token"]
+    TOKEN_EXPIRY = time.time() + int(data["expires_in"]) - 20
+    return ACCESS_TOKEN
+
+def get_access_token():
+    if ACCESS_TOKEN and time.time() < TOKEN_EXPIRY:
+        return ACCESS_TOKEN
         
     try:
-        if not API_KEY or not API_SECRET:
-            missing = []
-            if not API_KEY:
-                missing.append("AMADEUS_API_KEY")
-            if not API_SECRET:
-                missing.append("AMADEUS_API_SECRET")
-            raise Exception(f"Missing environment variables: {', '.join(missing)}. Ensure they are set in your .env or environment.")
-
+        url, data, headers = _token_request()
+        scheduler.acquire("amadeus")
         response = requests.post(url, data=data, headers=headers, timeout=10)
         if response.status_code != 200:
             try:
@@ -103,15 +143,46 @@ def get_access_token():
                 err_body = {"raw": response.text}
             raise Exception(f"Failed to generate access token: {response.status_code} - {err_body}")
         
-        data = response.json()
-        ACCESS_TOKEN = data["access_token"]
-        TOKEN_EXPIRY = time.time() + int(data["expires_in"]) - 20
-        
-        return ACCESS_TOKEN
+        return _store_token(response.json())
         
     except requests.exceptions.RequestException as e:
         raise Exception(f"Network error while getting access token: {e}")
 
+def _aiohttp_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _aiohttp_sessions.get(loop)
+    if session is None or session.closed:
+        for other in [l for l in _aiohttp_sessions if l.is_closed()]:
+            _aiohttp_sessions.pop(other, None)
+        session = aiohttp.ClientSession()
+        _aiohttp_sessions[loop] = session
+    return session
+
+async def close_sessions():
+    """Close the aiohttp session of the running loop."""
+    session = _aiohttp_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+async def aget_access_token():
+    if ACCESS_TOKEN and time.time() < TOKEN_EXPIRY:
+        return ACCESS_TOKEN
+
+    try:
+        url, data, headers = _token_request()
+        await scheduler.aacquire("amadeus")
+        session = _aiohttp_session()
+        async with session.post(url, data=data, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to generate access token: {response.status} - {await response.text()}")
+            return _store_token(await response.json(content_type=None))
+
+    except aiohttp.ClientError as e:
+        raise Exception(f"Network error while getting access token: {e}")
+
+# Memoized: the pandas scan costs milliseconds per call and would otherwise
+# block the event loop on every async search
+@lru_cache(maxsize=4096)
 def _get_iata_from_city(city: str) -> str:
     if not city:
         raise ValueError("City name is required")
@@ -132,55 +203,298 @@ def _get_iata_from_city(city: str) -> str:
     available_cities = _airports_df["City"].str.title().tolist()[:15]
     raise ValueError(f"No IATA code found for city: '{city}'")
 
+def resolve_iata_codes(places) -> dict:
+    """
+    IATA code for every place of a trip in one pass. Codes pass through,
+    exact city matches are looked up together in a single scan of the
+    airports table, and only the remaining names go through the per-city
+    fallback. The ValueError names every place that could not be resolved.
+    """
+    codes, pending = {}, {}
+    for place in places:
+        if _is_iata_code(place):
+            codes[place] = place
+        else:
+            pending.setdefault((place or "").strip().lower(), []).append(place)
+    
+    exact = _airports_df[_airports_df["City"].isin(list(pending))].drop_duplicates("City")
+    for city, code in zip(exact["City"], exact["IATA_Code"]):
+        for place in pending.pop(city):
+            codes[place] = code
+    
+    missing = []
+    for originals in pending.values():
+        try:
+            code = _get_iata_from_city(originals[0])
+        except ValueError:
+            missing.append(originals[0])
+            continue
+        for place in originals:
+            codes[place] = code
+    if missing:
+        raise ValueError(f"No IATA code found for: {', '.join(repr(m) for m in missing)}")
+    return codes
+
 def _is_iata_code(value: str) -> bool:
     return bool(re.fullmatch(r"[A-Z]{3}", value or ""))
 
-def search_flights(origin_city: str, destination_city: str, date: str, token: str):
+def _offer_cache_get(key):
+    return offer_cache.get(key)
+
+def cached_offers():
+    """
+    Yield ((origin, destination, date), response) for every live entry of this
+    process's cache; filtered searches carry the filter key as a fourth item.
+    """
+    for key, result in offer_cache.local_items():
+        yield tuple(key.split("|")), result
+
+def _prepare_search(origin_city: str, destination_city: str, date: str):
+    """Validate the date and resolve IATA codes; returns (cache_key, None) or (None, error result)."""
+    is_valid_date, date_error = validate_date(date)
+    if not is_valid_date:
+        return None, {
+            "error": "INVALID_DATE",
+            "message": date_error,
+            "data": []
+        }
+    
     try:
-        is_valid_date, date_error = validate_date(date)
-        if not is_valid_date:
-            return {
-                "error": "INVALID_DATE",
-                "message": date_error,
-                "data": []
-            }
+        origin_code = origin_city if _is_iata_code(origin_city) else _get_iata_from_city(origin_city)
+        destination_code = destination_city if _is_iata_code(destination_city) else _get_iata_from_city(destination_city)
+    except ValueError as e:
+        return None, {
+            "error": "IATA_LOOKUP_ERROR", 
+            "message": str(e),
+            "data": []
+        }
+    
+    return (origin_code, destination_code, date), None
+
+def _filtered_key(cache_key: tuple, filters: SearchFilters) -> tuple:
+    return cache_key + (filters.key(),) if filters else cache_key
+
+def offer_cache_key(origin_city: str, destination_city: str, date: str, filters: SearchFilters = NO_FILTERS):
+    """offer_cache key of a one-way search, or None if the search is invalid."""
+    cache_key, error = _prepare_search(origin_city, destination_city, date)
+    return None if error else _filtered_key(cache_key, filters)
+
+def search_flights(origin_city: str, destination_city: str, date: str, token: str, nearby_radius_km: float = 0.0,
+                   filters: SearchFilters = NO_FILTERS):
+    """
+    One-way offers for a route. With nearby_radius_km > 0, airports within
+    that radius of either city are searched concurrently as well and all
+    offers are ranked by flight time plus estimated ground transfer.
+    filters are sent with the request, so only matching offers come back.
+    """
+    if nearby_radius_km > 0:
+        try:
+            routes = _nearby_routes(origin_city, destination_city, nearby_radius_km)
+        except ValueError as e:
+            return {"error": "IATA_LOOKUP_ERROR", "message": str(e), "data": []}
+        if not routes:
+            return _no_nearby_routes(origin_city, destination_city)
+        with ThreadPoolExecutor(max_workers=len(routes)) as pool:
+            results = list(pool.map(lambda r: search_flights(r[0], r[2], date, token, filters=filters), routes))
+        return _rank_nearby(routes, results)
+
+    try:
+        cache_key, error = _prepare_search(origin_city, destination_city, date)
+        if error:
+            return error
         
+        request_key = _filtered_key(cache_key, filters)
+        cached = _offer_cache_get(request_key)
+        if cached is not None:
+            return cached
+        
+        with profiler.track("provider", "amadeus.offers"):
+            return _flight_requests.do(request_key, _fetch_flight_offers, *cache_key, token, filters)
+        
+    except Exception as e:
+        return {
+            "error": "SEARCH_ERROR",
+            "message": str(e),
+            "data": []
+        }
+
+async def asearch_flights(origin_city: str, destination_city: str, date: str, token: str, nearby_radius_km: float = 0.0,
+                          filters: SearchFilters = NO_FILTERS):
+    """Async search_flights; shares the offer cache and in-flight requests with the sync path."""
+    if nearby_radius_km > 0:
         try:
-            origin_code = origin_city if _is_iata_code(origin_city) else _get_iata_from_city(origin_city)
-            destination_code = destination_city if _is_iata_code(destination_city) else _get_iata_from_city(destination_city)
+            routes = _nearby_routes(origin_city, destination_city, nearby_radius_km)
         except ValueError as e:
-            return {
-                "error": "IATA_LOOKUP_ERROR", 
-                "message": str(e),
-                "data": []
-            }
-        
-        url = "https://test.api.amadeus.com/v2/shopping/flight-offers"
-        params = {
-            "originLocationCode": origin_code,
-            "destinationLocationCode": destination_code,
-            "departureDate": date,
-            "adults": 1,
-            "max": 40
+            return {"error": "IATA_LOOKUP_ERROR", "message": str(e), "data": []}
+        if not routes:
+            return _no_nearby_routes(origin_city, destination_city)
+        results = await asyncio.gather(*(asearch_flights(r[0], r[2], date, token, filters=filters) for r in routes))
+        return _rank_nearby(routes, results)
+
+    try:
+        cache_key, error = _prepare_search(origin_city, destination_city, date)
+        if error:
+            return error
+        
+        request_key = _filtered_key(cache_key, filters)
+        cached = _offer_cache_get(request_key)
+        if cached is not None:
+            return cached
+        
+        with profiler.track("provider", "amadeus.offers"):
+            return await _flight_requests.ado(request_key, _afetch_flight_offers, *cache_key, token, filters)
+        
+    except Exception as e:
+        return {
+            "error": "SEARCH_ERROR",
+            "message": str(e),
+            "data": []
+        }
+
+def _offer_request(origin_code: str, destination_code: str, date: str, token: str, filters: SearchFilters = NO_FILTERS):
+    url = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+    params = {
+        "originLocationCode": origin_code,
+        "destinationLocationCode": destination_code,
+        "departureDate": date,
+        "adults": 1,
+        "max": OFFER_LIMIT,
+        **filters.get_params()
+    }
+    headers = {"Authorization": f"Bearer {token}", **COMPRESSED_HEADERS}
+    return url, params, headers
+
+def _offers_result(cache_key: tuple, status_code: int, result: dict, cache: TieredCache = offer_cache):
+    if status_code != 200:
+        error_msg = "Unknown API error"
+        if "errors" in result and result["errors"]:
+            error = result["errors"][0]
+            error_msg = f"{error.get('title', '')}: {error.get('detail', '')}"
+        
+        return {
+            "error": f"API_ERROR_{status_code}",
+            "message": error_msg,
+            "data": []
+        }
+    
+    cache.put(cache_key, result)
+    return result
+
+def _record_payload(filters: SearchFilters, wire_bytes: int, result: dict, started: float):
+    payload_stats.record(bool(filters), wire_bytes, len(result.get("data") or []), time.perf_counter() - started)
+
+def _fetch_flight_offers(origin_code: str, destination_code: str, date: str, token: str,
+                         filters: SearchFilters = NO_FILTERS):
+    cache_key = _filtered_key((origin_code, destination_code, date), filters)
+    # Connection limits and time windows only exist in the POST search
+    if filters.needs_post():
+        return _post_offers(((origin_code, destination_code, date),), token, filters, cache_key, offer_cache)
+    url, params, headers = _offer_request(origin_code, destination_code, date, token, filters)
+    
+    scheduler.acquire("amadeus")
+    started = time.perf_counter()
+    # Offers are parsed straight off the (decompressed) socket stream,
+    # keeping only the fields we use; error bodies are small and parsed whole
+    with requests.get(url, params=params, headers=headers, timeout=70, stream=True) as response:
+        if response.status_code == 200:
+            response.raw.decode_content = True
+            result = parse_offers(response.raw)
+            _record_payload(filters, response.raw.tell(), result, started)
+        else:
+            result = response.json()
+    return _offers_result(cache_key, response.status_code, result)
+
+async def _afetch_flight_offers(origin_code: str, destination_code: str, date: str, token: str,
+                                filters: SearchFilters = NO_FILTERS):
+    cache_key = _filtered_key((origin_code, destination_code, date), filters)
+    if filters.needs_post():
+        return await _apost_offers(((origin_code, destination_code, date),), token, filters, cache_key, offer_cache)
+    url, params, headers = _offer_request(origin_code, destination_code, date, token, filters)
+    
+    await scheduler.aacquire("amadeus")
+    started = time.perf_counter()
+    session = _aiohttp_session()
+    async with session.get(url, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=70)) as response:
+        if response.status == 200:
+            result = await aparse_offers(response.content)
+            _record_payload(filters, response.content_length or response.content.total_bytes, result, started)
+        else:
+            result = await response.json(content_type=None)
+        return _offers_result(cache_key, response.status, result)
+
+def _prepare_multi_city(legs: list):
+    """
+    Validate the legs' dates and order and resolve all their cities in one
+    batch; returns (legs as (origin code, destination code, date) tuples, None)
+    or (None, error result).
+    """
+    if len(legs) < 2 or len(legs) > MAX_MULTI_CITY_LEGS:
+        return None, {
+            "error": "INVALID_LEGS",
+            "message": f"A multi-city search needs 2 to {MAX_MULTI_CITY_LEGS} legs, got {len(legs)}",
+            "data": []
+        }
+    
+    previous = ""
+    for i, leg in enumerate(legs, 1):
+        day = leg.get("departure_date", "")
+        is_valid_date, date_error = validate_date(day)
+        if not is_valid_date:
+            return None, {"error": "INVALID_DATE", "message": f"Leg {i}: {date_error}", "data": []}
+        if day < previous:
+            return None, {"error": "INVALID_DATE", "message": f"Leg {i} departs on {day}, before leg {i - 1}", "data": []}
+        previous = day
+    
+    try:
+        codes = resolve_iata_codes([place for leg in legs for place in (leg.get("origin", ""), leg.get("destination", ""))])
+    except ValueError as e:
+        return None, {"error": "IATA_LOOKUP_ERROR", "message": str(e), "data": []}
+    
+    return tuple((codes[leg["origin"]], codes[leg["destination"]], leg["departure_date"]) for leg in legs), None
+
+def _multi_city_key(legs: tuple, filters: SearchFilters = NO_FILTERS) -> tuple:
+    return _filtered_key(tuple("-".join(leg) for leg in legs), filters)
+
+def search_multi_city(legs: list, token: str, filters: SearchFilters = NO_FILTERS):
+    """
+    Offers covering every leg of a multi-city trip, priced together, from a
+    single flight-offers POST request. Each offer has one itinerary per leg.
+    legs: [{"origin", "destination", "departure_date"}, ...] in travel order.
+    """
+    try:
+        resolved, error = _prepare_multi_city(legs)
+        if error:
+            return error
+        
+        request_key = _multi_city_key(resolved, filters)
+        cached = multi_city_cache.get(request_key)
+        if cached is not None:
+            return cached
+        
+        with profiler.track("provider", "amadeus.multi_city"):
+            return _flight_requests.do(request_key, _fetch_multi_city_offers, resolved, token, filters)
+        
+    except Exception as e:
+        return {
+            "error": "SEARCH_ERROR",
+            "message": str(e),
+            "data": []
         }
-        headers = {"Authorization": f"Bearer {token}"}
+
+async def asearch_multi_city(legs: list, token: str, filters: SearchFilters = NO_FILTERS):
+    """Async search_multi_city; shares the cache and in-flight requests with the sync path."""
+    try:
+        resolved, error = _prepare_multi_city(legs)
+        if error:
+            return error
         
-        response = requests.get(url, params=params, headers=headers, timeout=70)  
-        result = response.json()
+        request_key = _multi_city_key(resolved, filters)
+        cached = multi_city_cache.get(request_key)
+        if cached is not None:
+            return cached
         
-        if response.status_code != 200:
-            error_msg = "Unknown API error"
-            if "errors" in result and result["errors"]:
-                error = result["errors"][0]
-                error_msg = f"{error.get('title', '')}: {error.get('detail', '')}"
-            
-            return {
-                "error": f"API_ERROR_{response.status_code}",
-                "message": error_msg,
-                "data": []
-            }
-            
-        return result
+        with profiler.track("provider", "amadeus.multi_city"):
+            return await _flight_requests.ado(request_key, _afetch_multi_city_offers, resolved, token, filters)
         
     except Exception as e:
         return {
@@ -188,3 +502,229 @@ def search_flights(origin_city: str, destination_city: str, date: str, token: st
             "message": str(e),
             "data": []
         }
+
+def _post_offer_request(legs: tuple, token: str, filters: SearchFilters = NO_FILTERS):
+    """
+    POST flight-offers request for (origin code, destination code, date) legs.
+    A departure time window applies to the first leg; the other filters to all.
+    """
+    url = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+    leg_ids = [str(i) for i in range(1, len(legs) + 1)]
+    body = {
+        "originDestinations": [{
+            "id": leg_id,
+            "originLocationCode": origin_code,
+            "destinationLocationCode": destination_code,
+            "departureDateTimeRange": filters.date_range(day) if leg_id == "1" else {"date": day}
+        } for leg_id, (origin_code, destination_code, day) in zip(leg_ids, legs)],
+        "travelers": [{"id": "1", "travelerType": "ADULT"}],
+        "sources": ["GDS"],
+        "searchCriteria": {"maxFlightOffers": OFFER_LIMIT, **filters.search_criteria(leg_ids)}
+    }
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "X-HTTP-Method-Override": "GET",
+        **COMPRESSED_HEADERS
+    }
+    return url, body, headers
+
+def _post_offers(legs: tuple, token: str, filters: SearchFilters, cache_key: tuple, cache: TieredCache):
+    url, body, headers = _post_offer_request(legs, token, filters)
+    
+    scheduler.acquire("amadeus")
+    started = time.perf_counter()
+    with requests.post(url, json=body, headers=headers, timeout=70, stream=True) as response:
+        if response.status_code == 200:
+            response.raw.decode_content = True
+            result = parse_offers(response.raw)
+            _record_payload(filters, response.raw.tell(), result, started)
+        else:
+            result = response.json()
+    return _offers_result(cache_key, response.status_code, result, cache)
+
+async def _apost_offers(legs: tuple, token: str, filters: SearchFilters, cache_key: tuple, cache: TieredCache):
+    url, body, headers = _post_offer_request(legs, token, filters)
+    
+    await scheduler.aacquire("amadeus")
+    started = time.perf_counter()
+    session = _aiohttp_session()
+    async with session.post(url, json=body, headers=headers, timeout=aiohttp.ClientTimeout(total=70)) as response:
+        if response.status == 200:
+            result = await aparse_offers(response.content)
+            _record_payload(filters, response.content_length or response.content.total_bytes, result, started)
+        else:
+            result = await response.json(content_type=None)
+        return _offers_result(cache_key, response.status, result, cache)
+
+def _fetch_multi_city_offers(legs: tuple, token: str, filters: SearchFilters = NO_FILTERS):
+    return _post_offers(legs, token, filters, _multi_city_key(legs, filters), multi_city_cache)
+
+async def _afetch_multi_city_offers(legs: tuple, token: str, filters: SearchFilters = NO_FILTERS):
+    return await _apost_offers(legs, token, filters, _multi_city_key(legs, filters), multi_city_cache)
+
+def _nearby_airports(place: str, radius_km: float):
+    """(IATA code, km from the city) for the airports nearest to the city, its own included."""
+    code = place if _is_iata_code(place) else _get_iata_from_city(place)
+    index = airport_index()
+    point = index.locate(place) or index.locate(code)
+    if point is None:
+        # No coordinates for this city: only its own airport is searched
+        return [(code, 0.0)]
+    return index.nearby(point[0], point[1], radius_km)[:MAX_NEARBY_AIRPORTS] or [(code, 0.0)]
+
+def _nearby_routes(origin_city: str, destination_city: str, radius_km: float):
+    """(origin code, origin km, destination code, destination km) for every airport pair to search."""
+    return [
+        (o, o_km, d, d_km)
+        for o, o_km in _nearby_airports(origin_city, radius_km)
+        for d, d_km in _nearby_airports(destination_city, radius_km)
+        if o != d
+    ]
+
+def _no_nearby_routes(origin_city: str, destination_city: str):
+    return {
+        "error": "IATA_LOOKUP_ERROR",
+        "message": f"No airport pairs to search between {origin_city} and {destination_city}",
+        "data": []
+    }
+
+def _rank_nearby(routes: list, results: list):
+    offers, dictionaries, errors = [], {}, []
+    for (origin, origin_km, destination, destination_km), result in zip(routes, results):
+        if result.get("error"):
+            errors.append(result)
+            continue
+        transfer = {
+            "origin": {"iataCode": origin, "km": round(origin_km, 1), "minutes": transfer_minutes(origin_km)},
+            "destination": {"iataCode": destination, "km": round(destination_km, 1), "minutes": transfer_minutes(destination_km)},
+        }
+        ground = transfer["origin"]["minutes"] + transfer["destination"]["minutes"]
+        for offer in result.get("data", []):
+            flight = sum(_duration_minutes(it.get("duration")) for it in offer.get("itineraries", []))
+            offers.append({
+                **offer,
+                "id": f"{origin}{destination}-{offer.get('id')}",
+                "groundTransfer": transfer,
+                "totalTravelMinutes": flight + ground
+            })
+        for name, entries in (result.get("dictionaries") or {}).items():
+            dictionaries.setdefault(name, {}).update(entries)
+
+    if not offers and errors:
+        return errors[0]
+    offers.sort(key=lambda o: (o["totalTravelMinutes"], _offer_price(o)))
+    return {
+        "meta": {"count": len(offers), "routes": [f"{r[0]}-{r[2]}" for r in routes]},
+        "data": offers,
+        "dictionaries": dictionaries
+    }
+
+def _offer_price(offer: dict) -> float:
+    try:
+        return float(offer["price"]["total"])
+    except (KeyError, TypeError, ValueError):
+        return float("inf")
+
+def _top_k_pairs(outbound: list, inbound: list, k: int):
+    """
+    Yield up to k (outbound, inbound) pairs in increasing combined price.
+    Both lists must be sorted by price; only O(k log k) pairs are visited
+    instead of the full n*m cross product.
+    """
+    if not outbound or not inbound:
+        return
+    heap = [(_offer_price(outbound[0]) + _offer_price(inbound[0]), 0, 0)]
+    seen = {(0, 0)}
+    yielded = 0
+    while heap and yielded < k:
+        total, i, j = heapq.heappop(heap)
+        out_offer, in_offer = outbound[i], inbound[j]
+        out_arrival = out_offer["itineraries"][-1]["segments"][-1]["arrival"]["at"]
+        in_departure = in_offer["itineraries"][0]["segments"][0]["departure"]["at"]
+        if in_departure > out_arrival:
+            yield total, out_offer, in_offer
+            yielded += 1
+        for ni, nj in ((i + 1, j), (i, j + 1)):
+            if ni < len(outbound) and nj < len(inbound) and (ni, nj) not in seen:
+                seen.add((ni, nj))
+                heapq.heappush(heap, (_offer_price(outbound[ni]) + _offer_price(inbound[nj]), ni, nj))
+
+def _return_filters(filters: SearchFilters) -> SearchFilters:
+    # The departure window is for the outbound flight
+    return dataclasses.replace(filters, depart_after=None, depart_before=None)
+
+def search_round_trip(origin_city: str, destination_city: str, date: str, return_date: str, token: str, k: int = 20,
+                      filters: SearchFilters = NO_FILTERS):
+    """
+    Runs the outbound and inbound one-way searches concurrently and combines
+    the cheapest k valid pairs into round-trip offers (two itineraries each,
+    same shape as an Amadeus round-trip response). Both legs are searched
+    with the filters; max_price also caps the combined total.
+    """
+    if return_date < date:
+        return {
+            "error": "INVALID_DATE",
+            "message": f"Return date {return_date} is before departure date {date}",
+            "data": []
+        }
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        outbound_future = pool.submit(search_flights, origin_city, destination_city, date, token, filters=filters)
+        inbound_future = pool.submit(search_flights, destination_city, origin_city, return_date, token,
+                                     filters=_return_filters(filters))
+        outbound, inbound = outbound_future.result(), inbound_future.result()
+
+    return _combine_round_trip(outbound, inbound, k, filters.max_price)
+
+async def asearch_round_trip(origin_city: str, destination_city: str, date: str, return_date: str, token: str, k: int = 20,
+                             filters: SearchFilters = NO_FILTERS):
+    """Async search_round_trip: both legs are awaited concurrently."""
+    if return_date < date:
+        return {
+            "error": "INVALID_DATE",
+            "message": f"Return date {return_date} is before departure date {date}",
+            "data": []
+        }
+
+    outbound, inbound = await asyncio.gather(
+        asearch_flights(origin_city, destination_city, date, token, filters=filters),
+        asearch_flights(destination_city, origin_city, return_date, token, filters=_return_filters(filters))
+    )
+    return _combine_round_trip(outbound, inbound, k, filters.max_price)
+
+def _combine_round_trip(outbound: dict, inbound: dict, k: int, max_price: float = None):
+    for result in (outbound, inbound):
+        if result.get("error"):
+            return result
+
+    outbound_offers = sorted(outbound.get("data", []), key=_offer_price)
+    inbound_offers = sorted(inbound.get("data", []), key=_offer_price)
+
+    combined = []
+    for total, out_offer, in_offer in _top_k_pairs(outbound_offers, inbound_offers, k):
+        # Pairs come cheapest first
+        if max_price is not None and total > max_price:
+            break
+        combined.append({
+            "type": "flight-offer",
+            "id": f"{out_offer.get('id')}+{in_offer.get('id')}",
+            "itineraries": out_offer["itineraries"] + in_offer["itineraries"],
+            "price": {
+                "currency": out_offer.get("price", {}).get("currency", ""),
+                "total": f"{total:.2f}"
+            },
+            "validatingAirlineCodes": sorted(set(out_offer.get("validatingAirlineCodes", []) +
+                                                 in_offer.get("validatingAirlineCodes", [])))
+        })
+
+    dictionaries = {}
+    for result in (outbound, inbound):
+        for name, entries in (result.get("dictionaries") or {}).items():
+            dictionaries.setdefault(name, {}).update(entries)
+
+    return {
+        "meta": {"count": len(combined)},
+        "data": combined,
+        "dictionaries": dictionaries
+    }
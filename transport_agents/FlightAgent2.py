@@ -1,9 +1,26 @@
 from langgraph.graph import StateGraph, END  
-from transport_agents.API_helper import get_access_token, search_flights
+from transport_agents.API_helper import (
+    get_access_token, search_flights, search_round_trip, search_multi_city,
+    aget_access_token, asearch_flights, asearch_round_trip, asearch_multi_city
+)
 from graph.state import State
-from transport_agents.LLM_helper import filter_and_extract_flights, print_flights_table
+from transport_agents.LLM_helper import filter_and_extract_flights, afilter_and_extract_flights, print_flights_table
+from transport_agents.fare_calendar import search_fare_calendar, asearch_fare_calendar
+from transport_agents.offers_table import OffersTable
+from transport_agents.summary_cache import summary_cache
+from transport_agents.model_router import router
+from transport_agents.prefetch import prefetcher
+from transport_agents.search_filters import SearchFilters, payload_stats
+from transport_agents.refinement import flight_source
+from transport_agents.itinerary_planner import itinerary_results
 from langchain_core.messages import AIMessage
 from typing import Dict, Any
+import os
+
+# Most offers handed to the LLM; larger result sets are shortlisted locally first
+LLM_MAX_OFFERS = 40
+# Also search airports within this many km of origin and destination (0 = off)
+NEARBY_AIRPORT_KM = float(os.getenv("NEARBY_AIRPORT_KM", "0"))
 
 def flight_search_node(state: State) -> Dict[str, Any]:
     """
@@ -17,65 +34,224 @@ def flight_search_node(state: State) -> Dict[str, Any]:
         
         # Get access token and search flights
         token = get_access_token()
-        results = search_flights(
-            state["origin"], state["destination"], state["departure_date"], token
-        )
         
-        if results:
-            # Use the original user query if available, else create a fallback
-            user_query = state.get("user_query", 
-                f"Find me flights from {state['origin']} to {state['destination']} on {state['departure_date']}")
-
-            # Call LLM for filtering + extraction
-            llm_output = filter_and_extract_flights(user_query, results)
-            
-            # Store processed results in state
-            flight_results = llm_output.get("filtered_results", [])
-            
-            # Print summary + results table to console
-            print("\n✈️ Gemini Summary:")
-            print(llm_output.get("summary", "Flight search completed"))
-            print("\n📊 Flight Results:")
-            print_flights_table(flight_results)
-            
-            # Create response message for the chat
-            if flight_results:
-                response_msg = f" Found {len(flight_results)} flights from {state['origin']} to {state['destination']} on {state['departure_date']}. Check the console for detailed flight information."
-            else:
-                response_msg = f" No suitable flights found from {state['origin']} to {state['destination']} on {state['departure_date']}."
-            
-            # Return updated state with results
-            return {
-                **state,
-                "flight_results": flight_results,
-                "messages": messages + [AIMessage(content=response_msg)],
-                "next_agent": "end",
-                "needs_user_input": False
-            }
-            
+        # Flexible dates: search the whole range and continue with the cheapest day
+        if state.get("departure_date_end") and not _multi_city(state):
+            calendar = search_fare_calendar(
+                state["origin"], state["destination"], state["departure_date"], state["departure_date_end"], token,
+                return_start=state.get("return_date") or "", return_end=state.get("return_date_end") or ""
+            )
+            state = _apply_calendar(state, calendar)
+        
+        # Price, stops, cabin, airline and time constraints go to the provider
+        filters = _filters(state)
+        if _multi_city(state):
+            print(f" Multi-city: {_route_text(state)}...")
+            results = search_multi_city(state["legs"], token, filters=filters)
+        elif state.get("return_date"):
+            print(f" Round trip, returning on {state['return_date']}...")
+            results = search_round_trip(
+                state["origin"], state["destination"], state["departure_date"], state["return_date"], token,
+                filters=filters
+            )
         else:
-            response_msg = f" No flights found from {state['origin']} to {state['destination']} on {state['departure_date']}."
-            print(f"\n{response_msg}")
-            
-            return {
-                **state,
-                "flight_results": [],
-                "messages": messages + [AIMessage(content=response_msg)],
-                "next_agent": "end",
-                "needs_user_input": False
-            }
+            if not filters:
+                prefetcher.observe(state["origin"], state["destination"], state["departure_date"])
+            results = search_flights(
+                state["origin"], state["destination"], state["departure_date"], token,
+                nearby_radius_km=NEARBY_AIRPORT_KM, filters=filters
+            )
+        
+        if not results:
+            return _no_flights(state, messages)
+        state = {**state, "refine_source": _refine_source(state, filters, results),
+                 "itinerary_results": itinerary_results(state, results) if _one_way(state) else []}
+
+        table, llm_input = _shortlist(results, filters if _one_way(state) else None)
+        
+        # Call LLM for filtering + extraction; records are printed as
+        # soon as each one has streamed in
+        print("\n📊 Flight Results:")
+        streamed = []
+        def show_record(record):
+            streamed.append(record)
+            print_flights_table([record])
+        llm_output = filter_and_extract_flights(_user_query(state), llm_input, on_record=show_record)
+        
+        return _flight_response(state, messages, table, llm_output, streamed)
 
     except Exception as e:
-        error_msg = f" Error searching for flights: {str(e)}"
-        print(f"\n{error_msg}")
+        return _flight_error(state, messages, e)
+
+async def aflight_search_node(state: State) -> Dict[str, Any]:
+    """Async flight_search_node: same flow on aiohttp and the async Gemini stream."""
+    messages = state.get("messages", [])
+    
+    try:
+        print(f"\n Searching for flights from {state['origin']} to {state['destination']} on {state['departure_date']}...")
+        
+        token = await aget_access_token()
+        
+        if state.get("departure_date_end") and not _multi_city(state):
+            calendar = await asearch_fare_calendar(
+                state["origin"], state["destination"], state["departure_date"], state["departure_date_end"], token,
+                return_start=state.get("return_date") or "", return_end=state.get("return_date_end") or ""
+            )
+            state = _apply_calendar(state, calendar)
+        
+        filters = _filters(state)
+        if _multi_city(state):
+            print(f" Multi-city: {_route_text(state)}...")
+            results = await asearch_multi_city(state["legs"], token, filters=filters)
+        elif state.get("return_date"):
+            print(f" Round trip, returning on {state['return_date']}...")
+            results = await asearch_round_trip(
+                state["origin"], state["destination"], state["departure_date"], state["return_date"], token,
+                filters=filters
+            )
+        else:
+            if not filters:
+                prefetcher.observe(state["origin"], state["destination"], state["departure_date"])
+            results = await asearch_flights(
+                state["origin"], state["destination"], state["departure_date"], token,
+                nearby_radius_km=NEARBY_AIRPORT_KM, filters=filters
+            )
+        
+        if not results:
+            return _no_flights(state, messages)
+        state = {**state, "refine_source": _refine_source(state, filters, results),
+                 "itinerary_results": itinerary_results(state, results) if _one_way(state) else []}
+
+        table, llm_input = _shortlist(results, filters if _one_way(state) else None)
+        
+        print("\n📊 Flight Results:")
+        streamed = []
+        def show_record(record):
+            streamed.append(record)
+            print_flights_table([record])
+        llm_output = await afilter_and_extract_flights(_user_query(state), llm_input, on_record=show_record)
         
-        return {
-            **state,
-            "flight_results": [],
-            "messages": messages + [AIMessage(content=error_msg)],
-            "next_agent": "end",
-            "needs_user_input": False
-        }
+        return _flight_response(state, messages, table, llm_output, streamed)
+
+    except Exception as e:
+        return _flight_error(state, messages, e)
+
+def _apply_calendar(state: State, calendar) -> Dict[str, Any]:
+    print("\n📅 Fare Calendar (cheapest fare per day):")
+    print(calendar.summary())
+    best_pair = calendar.cheapest_pair()
+    best_day = calendar.cheapest_day()
+    # Once a day is chosen the trip is no longer flexible: later turns and
+    # the refine source must not see the ranges again
+    if best_pair:
+        state = {**state, "departure_date": best_pair[0], "return_date": best_pair[1],
+                 "departure_date_end": "", "return_date_end": ""}
+        print(f"Cheapest round trip: {best_pair[0]} → {best_pair[1]} at {best_pair[2]:.2f}")
+    elif best_day:
+        state = {**state, "departure_date": best_day[0], "departure_date_end": "", "return_date_end": ""}
+        print(f"Cheapest day: {best_day[0]} at {best_day[1]:.2f}")
+    return state
+
+def _filters(state: State) -> SearchFilters:
+    filters = SearchFilters.from_state(state)
+    if filters:
+        print(f" Filters sent to the provider: {filters.key()}")
+    return filters
+
+def _refine_source(state: State, filters: SearchFilters, results: dict):
+    # Follow-ups are refined locally from one cached one-way response
+    if not _one_way(state) or NEARBY_AIRPORT_KM > 0:
+        return None
+    return flight_source(state, filters, results)
+
+def _one_way(state: State) -> bool:
+    return not _multi_city(state) and not state.get("return_date")
+
+def _multi_city(state: State) -> bool:
+    return len(state.get("legs") or []) > 1
+
+def _route_text(state: State) -> str:
+    if _multi_city(state):
+        legs = state["legs"]
+        route = " → ".join([legs[0]["origin"]] + [l["destination"] for l in legs])
+        return f"on the multi-city route {route} departing {legs[0]['departure_date']}"
+    return f"from {state['origin']} to {state['destination']} on {state['departure_date']}"
+
+def _user_query(state: State) -> str:
+    # Use the original user query if available, else create a fallback
+    return state.get("user_query", f"Find me flights {_route_text(state)}")
+
+def _shortlist(results: dict, filters: SearchFilters = None):
+    # Parse offers once into columns; shortlist the cheapest and the
+    # fastest offers when there are more than the LLM should see
+    table = OffersTable.from_amadeus(results)
+    llm_input = results
+    if filters:
+        # Provider time windows are whole hours either side; cut exactly
+        trimmed = filters.apply(table)
+        if len(trimmed) < len(table):
+            table, llm_input = trimmed, trimmed.to_response()
+    if len(table) > LLM_MAX_OFFERS:
+        half = LLM_MAX_OFFERS // 2
+        llm_input = table.top_k("price", half).union(table.top_k("duration", half)).to_response()
+    return table, llm_input
+
+def _flight_response(state: State, messages: list, table: OffersTable, llm_output: dict, streamed: list) -> Dict[str, Any]:
+    # Store processed results in state, falling back to the cheapest
+    # offers if the LLM returned nothing usable
+    flight_results = llm_output.get("filtered_results", [])
+    if not flight_results and len(table):
+        flight_results = list(table.top_k("price", 10).rows())
+    # Re-render unless the streamed rows end with exactly what is stored
+    if not flight_results or streamed[len(streamed) - len(flight_results):] != flight_results:
+        print_flights_table(flight_results)
+    
+    # Print summary to console
+    print("\n✈️ Gemini Summary:")
+    print(llm_output.get("summary", "Flight search completed"))
+    print(f"({summary_cache.stats_line()})")
+    print(f"({router.stats_line('flight_summary')})")
+    print(f"({prefetcher.stats_line()})")
+    print(f"({payload_stats.stats_line()})")
+    
+    # Create response message for the chat
+    if flight_results:
+        response_msg = f" Found {len(flight_results)} flights {_route_text(state)}. Check the console for detailed flight information."
+    else:
+        response_msg = f" No suitable flights found {_route_text(state)}."
+    
+    # Return updated state with results
+    return {
+        **state,
+        "flight_results": flight_results,
+        "messages": messages + [AIMessage(content=response_msg)],
+        "next_agent": "end",
+        "needs_user_input": False
+    }
+
+def _no_flights(state: State, messages: list) -> Dict[str, Any]:
+    response_msg = f" No flights found {_route_text(state)}."
+    print(f"\n{response_msg}")
+    
+    return {
+        **state,
+        "flight_results": [],
+        "messages": messages + [AIMessage(content=response_msg)],
+        "next_agent": "end",
+        "needs_user_input": False
+    }
+
+def _flight_error(state: State, messages: list, e: Exception) -> Dict[str, Any]:
+    error_msg = f" Error searching for flights: {str(e)}"
+    print(f"\n{error_msg}")
+    
+    return {
+        **state,
+        "flight_results": [],
+        "messages": messages + [AIMessage(content=error_msg)],
+        "next_agent": "end",
+        "needs_user_input": False
+    }
 
 # if __name__ == "__main__":
 #     # Build workflow for testing
@@ -2,8 +2,15 @@ from tabulate import tabulate
 import google.generativeai as genai
 import os, json, re
 from dotenv import load_dotenv
+from transport_agents.offers_table import OffersTable
+from transport_agents.provider_scheduler import scheduler
+from transport_agents.summary_cache import summary_cache
+from transport_agents.json_stream import IncrementalJSONParser
+from transport_agents.model_router import router
 
 def print_flights_table(flight_results):
+    if isinstance(flight_results, OffersTable):
+        flight_results = list(flight_results.rows())
     if (not flight_results):
         print("No flights to display.")
         return
@@ -25,15 +32,115 @@ def print_flights_table(flight_results):
 load_dotenv()
 
 genai.configure(api_key = os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash")
 
+FLIGHT_FIELDS = ["airline", "price", "duration", "departure_time", "arrival_time", "stops"]
 
-def filter_and_extract_flights(user_query: str, raw_results: dict):
+# Schema-constrained output: Gemini returns exactly this JSON, no fences or prose
+FLIGHT_SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "filtered_results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {field: {"type": "string"} for field in FLIGHT_FIELDS},
+                "required": FLIGHT_FIELDS
+            }
+        }
+    },
+    "required": ["summary", "filtered_results"]
+}
+
+GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=FLIGHT_SUMMARY_SCHEMA
+)
+
+
+def filter_and_extract_flights(user_query: str, raw_results: dict, on_record=None):
     """
     Sends the raw Amadeus API results + user query to Gemini.
     Gemini filters relevant flights, extracts fields into JSON, and summarizes.
+    The response is streamed and parsed incrementally: each flight record is
+    passed to on_record as soon as it is complete, and a truncated response
+    still yields the records received so far.
+    Summaries are cached per offer set and query intent.
+    The cheapest model tier is tried first; truncated or malformed output
+    is retried on a stronger model, and a stream that fails is retried once
+    without streaming.
     """
-    raw_json = json.dumps(raw_results, indent=2)
+    cache_key = summary_cache.key(raw_results, user_query)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = _summary_prompt(user_query, raw_results)
+    rows = _RowStream(on_record)
+
+    def summarize_with(model_name):
+        rows.restart(model_name)
+        parser = IncrementalJSONParser("filtered_results")
+        model = router.genai_model(model_name)
+        try:
+            scheduler.acquire("gemini")
+            response = model.generate_content(prompt, generation_config=GENERATION_CONFIG, stream=True)
+            for chunk in response:
+                rows.feed(parser, chunk)
+        except Exception as e:
+            print(f"DEBUG: Gemini stream from {model_name} failed ({type(e).__name__}: {e}), retrying without streaming")
+            rows.restart(model_name)
+            scheduler.acquire("gemini")
+            response = model.generate_content(prompt, generation_config=GENERATION_CONFIG)
+            return rows.feed_all(response.text)
+        return parser.finish()
+
+    try:
+        parsed = router.call("flight_summary", summarize_with, _summary_problem)
+    except Exception as e:
+        print(f"DEBUG: Flight summary failed on every tier: {type(e).__name__}: {e}")
+        parsed = {"partial": True}
+    return _finish_summary(parsed, cache_key)
+
+
+async def afilter_and_extract_flights(user_query: str, raw_results: dict, on_record=None):
+    """Async filter_and_extract_flights, streaming with generate_content_async."""
+    cache_key = summary_cache.key(raw_results, user_query)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = _summary_prompt(user_query, raw_results)
+    rows = _RowStream(on_record)
+
+    async def summarize_with(model_name):
+        rows.restart(model_name)
+        parser = IncrementalJSONParser("filtered_results")
+        model = router.genai_model(model_name)
+        try:
+            await scheduler.aacquire("gemini")
+            response = await model.generate_content_async(prompt, generation_config=GENERATION_CONFIG, stream=True)
+            async for chunk in response:
+                rows.feed(parser, chunk)
+        except Exception as e:
+            print(f"DEBUG: Gemini stream from {model_name} failed ({type(e).__name__}: {e}), retrying without streaming")
+            rows.restart(model_name)
+            await scheduler.aacquire("gemini")
+            response = await model.generate_content_async(prompt, generation_config=GENERATION_CONFIG)
+            return rows.feed_all(response.text)
+        return parser.finish()
+
+    try:
+        parsed = await router.acall("flight_summary", summarize_with, _summary_problem)
+    except Exception as e:
+        print(f"DEBUG: Flight summary failed on every tier: {type(e).__name__}: {e}")
+        parsed = {"partial": True}
+    return _finish_summary(parsed, cache_key)
+
+
+def _summary_prompt(user_query: str, raw_results: dict) -> str:
+    # Compact separators: indentation only costs prompt tokens
+    raw_json = json.dumps(raw_results, separators=(",", ":"))
 
     prompt = f"""
     The user asked: "{user_query}"
@@ -65,21 +172,73 @@ def filter_and_extract_flights(user_query: str, raw_results: dict):
          ]
        }}
        You may use raw_json["data"][<index of offer>]["price"]["total"] to extract the price.
+       An offer with two itineraries is a round trip: report the outbound itinerary's times and the combined price.
+       An offer with "groundTransfer" uses a nearby airport: weigh its "totalTravelMinutes" (flight plus ground transfer) and mention the airport in the summary.
     Make sure it is valid JSON only, no extra text outside JSON. STRICTLY do NOT include any tables or formatting.
     """
+    return prompt
 
-    def safe_json_parse(raw_text: str):
-        # Remove markdown fences if present
-        clean = re.sub(r"^```json\s*|\s*```$", "", raw_text.strip(), flags=re.DOTALL)
-        return json.loads(clean)
 
-    response = model.generate_content(prompt)
-    print(response.text)
-    try:
-        parsed = safe_json_parse(response.text)
+class _RowStream:
+    """
+    Flight rows passed to on_record as they stream in. When a response is
+    replaced (escalation to a stronger tier, or a failed stream retried
+    without streaming) the user is told, and the replacement's rows are
+    shown again from the start, so what is on screen ends with what lands in state.
+    """
+
+    def __init__(self, on_record):
+        self.on_record = on_record
+        self.shown = []
+
+    def restart(self, model_name: str):
+        if self.shown and self.on_record:
+            print(f"\n↻ The {len(self.shown)} rows above are replaced by the {model_name} answer:")
+        self.shown = []
+
+    def _show(self, record):
+        self.shown.append(record)
+        if self.on_record:
+            self.on_record(record)
+
+    def feed(self, parser: IncrementalJSONParser, chunk):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. only finish metadata)
+            return
+        for record in parser.feed(text):
+            self._show(record)
+
+    def feed_all(self, text: str) -> dict:
+        """Parse a complete (non-streamed) response, showing its rows."""
+        parser = IncrementalJSONParser("filtered_results")
+        for record in parser.feed(text):
+            self._show(record)
+        return parser.finish()
+
+
+def _summary_problem(parsed: dict):
+    """Why a summary should go to a stronger model, or None if it is usable."""
+    if parsed.get("partial"):
+        return "truncated or malformed JSON"
+    if not isinstance(parsed.get("filtered_results"), list):
+        return "missing filtered_results"
+    if not str(parsed.get("summary", "")).strip():
+        return "empty summary"
+    return None
+
+
+def _finish_summary(parsed: dict, cache_key: str):
+    if parsed.get("partial"):
+        recovered = parsed.get("filtered_results", [])
+        if not recovered:
+            return {
+                "summary": "Could not parse Gemini output. Showing no filtered results.",
+                "filtered_results": []
+            }
+        parsed.setdefault("summary", f"Showing {len(recovered)} flights recovered from an incomplete response.")
         return parsed
-    except Exception:
-        return {
-            "summary": "Could not parse Gemini output. Showing no filtered results.",
-            "filtered_results": []
-        }
+
+    summary_cache.put(cache_key, parsed)
+    return parsed
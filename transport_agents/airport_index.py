@@ -0,0 +1,162 @@
+import math
+import os
+import sys
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AIRPORTS_FILE = os.path.join(BASE_DIR, "Airports1.csv")
+
+EARTH_RADIUS_KM = 6371.0
+# Grid cell size in degrees; a query only scans the cells its radius touches
+CELL_DEG = 1.0
+# Ground transfer estimate: road distance is longer than great-circle distance
+ROAD_FACTOR = 1.3
+GROUND_SPEED_KMH = float(os.getenv("GROUND_SPEED_KMH", "60"))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; works on scalars and NumPy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def transfer_minutes(km: float) -> int:
+    """Rough door-to-door ground time for a great-circle distance."""
+    return int(round(km * ROAD_FACTOR / GROUND_SPEED_KMH * 60))
+
+
+class AirportIndex:
+    """
+    Spatial index over airports with known coordinates.
+
+    Airports are bucketed into a CELL_DEG x CELL_DEG lat/lon grid; a radius
+    query gathers the cells the search circle can touch and computes exact
+    haversine distances for those candidates only.
+    """
+
+    def __init__(self, codes: List[str], cities: List[str], lat: np.ndarray, lon: np.ndarray):
+        self.codes = np.asarray(codes, dtype=object)
+        self.cities = np.asarray([c.strip().lower() for c in cities], dtype=object)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self._row = {code: i for i, code in enumerate(self.codes)}
+        self._city_rows: Dict[str, List[int]] = {}
+        for i, city in enumerate(self.cities):
+            self._city_rows.setdefault(city, []).append(i)
+
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, (la, lo) in enumerate(zip(self.lat, self.lon)):
+            cells.setdefault(self._cell(la, lo), []).append(i)
+        self._cells = {key: np.array(rows, dtype=np.int32) for key, rows in cells.items()}
+
+    @staticmethod
+    def _cell(lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / CELL_DEG)), int(math.floor(lon / CELL_DEG))
+
+    @classmethod
+    def from_csv(cls, path: str = AIRPORTS_FILE) -> "AirportIndex":
+        df = pd.read_csv(path)
+        if "Latitude" not in df.columns or "Longitude" not in df.columns:
+            return cls([], [], np.empty(0), np.empty(0))
+        df = df.dropna(subset=["IATA_Code", "Latitude", "Longitude"])
+        return cls(df["IATA_Code"].tolist(), df["City"].fillna("").tolist(),
+                   df["Latitude"].to_numpy(), df["Longitude"].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def locate(self, place: str) -> Optional[Tuple[float, float]]:
+        """Coordinates of an IATA code, or the centroid of a city's airports."""
+        if not place:
+            return None
+        row = self._row.get(place.strip().upper())
+        if row is not None:
+            return float(self.lat[row]), float(self.lon[row])
+        rows = self._city_rows.get(place.strip().lower())
+        if rows:
+            return float(self.lat[rows].mean()), float(self.lon[rows].mean())
+        return None
+
+    def nearby(self, lat: float, lon: float, radius_km: float) -> List[Tuple[str, float]]:
+        """(IATA code, distance km) of airports within radius_km, nearest first."""
+        dlat = radius_km / 111.0
+        dlon = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        lat_lo, lon_lo = self._cell(lat - dlat, lon - dlon)
+        lat_hi, lon_hi = self._cell(lat + dlat, lon + dlon)
+        candidates = [
+            rows for i in range(lat_lo, lat_hi + 1) for j in range(lon_lo, lon_hi + 1)
+            if (rows := self._cells.get((i, (j + 180) % 360 - 180))) is not None
+        ]
+        if not candidates:
+            return []
+        rows = np.concatenate(candidates) if len(candidates) > 1 else candidates[0]
+        dist = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+        keep = dist <= radius_km
+        rows, dist = rows[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return [(self.codes[rows[k]], float(dist[k])) for k in order]
+
+    def near(self, place: str, radius_km: float) -> List[Tuple[str, float]]:
+        """Airports within radius_km of a city name or IATA code."""
+        point = self.locate(place)
+        if point is None:
+            return []
+        return self.nearby(point[0], point[1], radius_km)
+
+
+@lru_cache(maxsize=1)
+def airport_index() -> AirportIndex:
+    index = AirportIndex.from_csv()
+    print(f"DEBUG: Airport index: {len(index)} airports with coordinates")
+    return index
+
+
+def merge_coordinates(source_csv: str, path: str = AIRPORTS_FILE) -> int:
+    """
+    Fill Latitude/Longitude in the airport dataset from an OurAirports
+    airports.csv (iata_code, latitude_deg, longitude_deg). Returns the
+    number of airports that have coordinates afterwards.
+    """
+    source = pd.read_csv(source_csv, usecols=["iata_code", "latitude_deg", "longitude_deg"], keep_default_na=False)
+    source = source[source["iata_code"].str.fullmatch(r"[A-Z]{3}")].drop_duplicates("iata_code").set_index("iata_code")
+    airports = pd.read_csv(path, encoding="utf-8-sig")
+    for column in ("Latitude", "Longitude"):
+        if column not in airports.columns:
+            airports[column] = np.nan
+    found = airports["IATA_Code"].map(source["latitude_deg"]).notna()
+    airports.loc[found, "Latitude"] = airports.loc[found, "IATA_Code"].map(source["latitude_deg"]).round(4)
+    airports.loc[found, "Longitude"] = airports.loc[found, "IATA_Code"].map(source["longitude_deg"]).round(4)
+    airports.to_csv(path, index=False, encoding="utf-8-sig")
+    airport_index.cache_clear()
+    return int(airports["Latitude"].notna().sum())
+
+
+if __name__ == "__main__":
+    # python -m transport_agents.airport_index [ourairports airports.csv]
+    if len(sys.argv) > 1:
+        print(f"{merge_coordinates(sys.argv[1])} airports with coordinates")
+
+    index = airport_index()
+    for city in ["Pune", "London", "New York"]:
+        print(city, [(code, round(km), transfer_minutes(km)) for code, km in index.near(city, 200)])
+
+    # Radius queries over 50k random airports
+    rng = np.random.default_rng(5)
+    n = 50_000
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    lon = rng.uniform(-180, 180, n)
+    synthetic = AirportIndex([f"A{i}" for i in range(n)], [""] * n, lat, lon)
+    queries = [(float(lat[i]), float(lon[i])) for i in rng.integers(0, n, 2000)]
+    started = time.perf_counter()
+    hits = sum(len(synthetic.nearby(la, lo, 150)) for la, lo in queries)
+    grid_us = (time.perf_counter() - started) / len(queries) * 1e6
+    started = time.perf_counter()
+    brute = sum(int((haversine_km(la, lo, lat, lon) <= 150).sum()) for la, lo in queries[:200])
+    brute_us = (time.perf_counter() - started) / 200 * 1e6
+    print(f"{n} airports: grid {grid_us:.0f} us/query, brute force {brute_us:.0f} us/query, {hits / len(queries):.1f} hits/query")
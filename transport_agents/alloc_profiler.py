@@ -0,0 +1,259 @@
+"""
+Opt-in memory profiling around graph nodes and provider calls.
+
+With PROFILE_MEMORY=1 (or profiler.enable()), every tracked block records
+a tracemalloc snapshot diff, the traced peak above its starting point, the
+RSS change and peak RSS, and the change in the number of GC-tracked
+objects. Results are aggregated per (kind, name) and can be written as a
+ranked JSON report and compared with a report from another commit:
+
+    PROFILE_MEMORY=1 python -m graph.batch_runner in.jsonl out.jsonl --stub-providers --profile-memory mem.json
+    python -m transport_agents.alloc_profiler old.json mem.json
+
+Measurements are process-wide, so profile with one conversation in flight
+(e.g. --workers 1) for clean per-node attribution.
+"""
+import asyncio
+import functools
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+PROFILE_FRAMES = int(os.getenv("PROFILE_MEMORY_FRAMES", "1"))
+TOP_SITES = 8
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_IGNORED = (tracemalloc.__file__, __file__, "<frozen importlib._bootstrap>", "<unknown>")
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, f) for f in _IGNORED])
+
+
+class _Stats:
+    __slots__ = ("calls", "allocated", "net", "peak", "rss", "objects", "seconds", "sites")
+
+    def __init__(self):
+        self.calls = 0
+        self.allocated = 0
+        self.net = 0
+        self.peak = 0
+        self.rss = 0
+        self.objects = 0
+        self.seconds = 0.0
+        self.sites = Counter()
+
+
+class _Frame:
+    __slots__ = ("snapshot", "overhead", "current", "peak", "rss", "objects", "started")
+
+
+class AllocationProfiler:
+    """Aggregates per-block allocation measurements; inert unless enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self._stats: Dict[tuple, _Stats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_FRAMES)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _stack(self) -> List[_Frame]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def track(self, kind: str, name: str):
+        """Measure the block as (kind, name); a no-op while disabled."""
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        current, peak = tracemalloc.get_traced_memory()
+        # Nested blocks reset the peak; fold it into the enclosing block first
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        frame = _Frame()
+        frame.snapshot = _snapshot()
+        frame.current = tracemalloc.get_traced_memory()[0]
+        # The held snapshot is profiler memory, not the block's
+        frame.overhead = frame.current - current
+        frame.peak = frame.current
+        frame.rss = _rss_bytes()
+        frame.objects = len(gc.get_objects())
+        tracemalloc.reset_peak()
+        stack.append(frame)
+        frame.started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame.started
+            stack.pop()
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(frame.peak, peak)
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak - frame.overhead)
+            diff = _snapshot().compare_to(frame.snapshot, "lineno")
+            self._record(kind, name, frame, elapsed, current, peak, diff)
+            # Keep the snapshots taken here out of the enclosing block's peak
+            tracemalloc.reset_peak()
+
+    def _record(self, kind, name, frame, elapsed, current, peak, diff):
+        rss = _rss_bytes() - frame.rss
+        objects = len(gc.get_objects()) - frame.objects
+        with self._lock:
+            stats = self._stats.setdefault((kind, name), _Stats())
+            stats.calls += 1
+            stats.seconds += elapsed
+            stats.net += current - frame.current
+            stats.peak = max(stats.peak, peak - frame.current)
+            stats.rss += rss
+            stats.objects += objects
+            for stat in diff:
+                if stat.size_diff > 0:
+                    stats.allocated += stat.size_diff
+                    tb = stat.traceback[0]
+                    stats.sites[f"{os.path.relpath(tb.filename)}:{tb.lineno}"] += stat.size_diff
+
+    def wrap(self, kind: str, name: str, fn: Callable) -> Callable:
+        """fn (sync or async) measured under (kind, name) whenever profiling is enabled."""
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                with self.track(kind, name):
+                    return await fn(*args, **kwargs)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.track(kind, name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def report(self) -> Dict[str, Any]:
+        """Entries ranked by bytes allocated (and still live) inside the block."""
+        with self._lock:
+            entries = [{
+                "kind": kind,
+                "name": name,
+                "calls": s.calls,
+                "allocated_kb": round(s.allocated / 1024, 1),
+                "allocated_kb_per_call": round(s.allocated / 1024 / s.calls, 1),
+                "net_kb": round(s.net / 1024, 1),
+                "max_peak_kb": round(s.peak / 1024, 1),
+                "rss_delta_kb": round(s.rss / 1024, 1),
+                "object_delta": s.objects,
+                "avg_ms": round(s.seconds / s.calls * 1000, 1),
+                "top_sites": [{"site": site, "kb": round(size / 1024, 1)} for site, size in s.sites.most_common(TOP_SITES)],
+            } for (kind, name), s in self._stats.items()]
+        entries.sort(key=lambda e: e["allocated_kb"], reverse=True)
+        return {
+            "commit": _git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "peak_rss_kb": round(_peak_rss_bytes() / 1024),
+            "entries": entries,
+        }
+
+    def write_report(self, path: str) -> Dict[str, Any]:
+        report = self.report()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report: Dict[str, Any], limit: int = 20):
+    print(f"Allocation report ({report.get('commit') or 'unknown commit'}), peak RSS {report['peak_rss_kb']:,} KB")
+    print(f"{'kind':<9} {'name':<28} {'calls':>5} {'alloc KB':>9} {'KB/call':>8} {'peak KB':>8} {'RSS KB':>8} {'objects':>8}")
+    for e in report["entries"][:limit]:
+        print(f"{e['kind']:<9} {e['name']:<28} {e['calls']:>5} {e['allocated_kb']:>9.1f} {e['allocated_kb_per_call']:>8.1f} "
+              f"{e['max_peak_kb']:>8.1f} {e['rss_delta_kb']:>8.1f} {e['object_delta']:>8}")
+        for site in e["top_sites"][:3]:
+            print(f"{'':<15}{site['site']} {site['kb']} KB")
+
+
+def compare_reports(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per (kind, name) change in KB allocated per call and peak, largest increase first."""
+    before = {(e["kind"], e["name"]): e for e in old["entries"]}
+    rows = []
+    for e in new["entries"]:
+        b = before.pop((e["kind"], e["name"]), None)
+        rows.append({
+            "kind": e["kind"], "name": e["name"],
+            "kb_per_call": e["allocated_kb_per_call"],
+            "kb_per_call_delta": round(e["allocated_kb_per_call"] - (b["allocated_kb_per_call"] if b else 0), 1),
+            "peak_kb_delta": round(e["max_peak_kb"] - (b["max_peak_kb"] if b else 0), 1),
+        })
+    for (kind, name), b in before.items():
+        rows.append({"kind": kind, "name": name, "kb_per_call": 0.0,
+                     "kb_per_call_delta": -b["allocated_kb_per_call"], "peak_kb_delta": -b["max_peak_kb"]})
+    rows.sort(key=lambda r: r["kb_per_call_delta"], reverse=True)
+    return rows
+
+
+profiler = AllocationProfiler()
+if os.getenv("PROFILE_MEMORY") == "1":
+    profiler.enable()
+
+
+if __name__ == "__main__":
+    # python -m transport_agents.alloc_profiler report.json            -> print a report
+    # python -m transport_agents.alloc_profiler old.json new.json      -> compare two reports
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m transport_agents.alloc_profiler REPORT.json [NEW_REPORT.json]")
+    with open(sys.argv[1], encoding="utf-8") as f:
+        first = json.load(f)
+    if len(sys.argv) == 2:
+        print_report(first)
+    else:
+        with open(sys.argv[2], encoding="utf-8") as f:
+            second = json.load(f)
+        print(f"{first.get('commit')} -> {second.get('commit')}")
+        print(f"{'kind':<9} {'name':<28} {'KB/call':>8} {'delta':>8} {'peak delta':>10}")
+        for r in compare_reports(first, second):
+            print(f"{r['kind']:<9} {r['name']:<28} {r['kb_per_call']:>8.1f} {r['kb_per_call_delta']:>+8.1f} {r['peak_kb_delta']:>+10.1f}")
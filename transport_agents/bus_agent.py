@@ -0,0 +1,460 @@
+"""
+Bus agent over a local GTFS timetable.
+
+The feed is not shipped with the repository. Put an operator's static GTFS
+feed (stops.txt, trips.txt, stop_times.txt, optionally routes.txt and
+calendar.txt) in transport_agents/gtfs, or point BUS_GTFS_DIR at it:
+
+    python -m transport_agents.bus_agent --install <feed.zip | URL | directory>   # unpack into BUS_GTFS_DIR
+    python -m transport_agents.bus_agent                                            # synthetic query benchmark
+
+Without a feed the bus node answers that the timetable is not available.
+"""
+import asyncio
+import io
+import os
+import shutil
+import sys
+import time
+import zipfile
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+from tabulate import tabulate
+from langchain_core.messages import AIMessage
+from graph.state import State
+from transport_agents.itinerary_planner import itinerary_results
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GTFS_DIR = os.getenv("BUS_GTFS_DIR", os.path.join(BASE_DIR, "gtfs"))
+
+GTFS_FILES = ["stops.txt", "trips.txt", "stop_times.txt", "routes.txt", "calendar.txt"]
+REQUIRED_GTFS_FILES = GTFS_FILES[:3]
+
+INF = np.iinfo(np.int32).max
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+ALL_DAYS = 0b1111111
+SCAN_CHUNK = 4096
+
+
+def _gtfs_seconds(values: pd.Series) -> np.ndarray:
+    """Convert GTFS HH:MM:SS strings (hours may exceed 24) to seconds after midnight."""
+    parts = values.astype(str).str.strip().str.split(":", expand=True).astype(np.int32)
+    return (parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy(dtype=np.int32)
+
+
+def _fmt_seconds(seconds: int) -> str:
+    hours, rem = divmod(int(seconds), 3600)
+    return f"{hours:02d}:{rem // 60:02d}"
+
+
+class BusTimetable:
+    """
+    Columnar GTFS-style timetable.
+
+    Stops, trips and stop_times are held as flat NumPy arrays. Consecutive
+    stop_times of a trip are turned into elementary connections sorted by
+    departure time (for the connection scan), and a CSR index maps every
+    stop to its departures ordered by time.
+    """
+
+    def __init__(self, stop_ids, stop_names, trip_ids, trip_routes, trip_days,
+                 st_trip, st_stop, st_arrival, st_departure):
+        self.stop_ids = np.asarray(stop_ids, dtype=object)
+        self.stop_names = np.asarray(stop_names, dtype=object)
+        self.trip_ids = np.asarray(trip_ids, dtype=object)
+        self.trip_routes = np.asarray(trip_routes, dtype=object)
+        self.trip_days = np.asarray(trip_days, dtype=np.uint8)
+
+        st_trip = np.asarray(st_trip, dtype=np.int32)
+        st_stop = np.asarray(st_stop, dtype=np.int32)
+        st_arrival = np.asarray(st_arrival, dtype=np.int32)
+        st_departure = np.asarray(st_departure, dtype=np.int32)
+
+        # stop_times must be grouped by trip in stop_sequence order
+        same_trip = st_trip[1:] == st_trip[:-1]
+        order = np.argsort(st_departure[:-1][same_trip], kind="stable")
+        self.c_trip = st_trip[:-1][same_trip][order]
+        self.c_dep_stop = st_stop[:-1][same_trip][order]
+        self.c_arr_stop = st_stop[1:][same_trip][order]
+        self.c_dep_time = st_departure[:-1][same_trip][order]
+        self.c_arr_time = st_arrival[1:][same_trip][order]
+
+        # stop -> departures index (CSR): departures of stop s are
+        # stop_departures[stop_offsets[s]:stop_offsets[s + 1]], sorted by time
+        by_stop = np.lexsort((self.c_dep_time, self.c_dep_stop))
+        self.stop_departures = by_stop.astype(np.int32)
+        counts = np.bincount(self.c_dep_stop, minlength=len(self.stop_ids))
+        self.stop_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+
+        self._name_index = pd.Series(self.stop_names).str.strip().str.lower().to_numpy(dtype=object)
+
+    @property
+    def n_stops(self) -> int:
+        return len(self.stop_ids)
+
+    @property
+    def n_connections(self) -> int:
+        return len(self.c_trip)
+
+    @classmethod
+    def from_gtfs(cls, gtfs_dir: str) -> "BusTimetable":
+        """Load stops.txt, trips.txt, stop_times.txt (and calendar.txt if present)."""
+        stops = pd.read_csv(os.path.join(gtfs_dir, "stops.txt"), dtype={"stop_id": str})
+        trips = pd.read_csv(os.path.join(gtfs_dir, "trips.txt"),
+                            dtype={"trip_id": str, "route_id": str, "service_id": str})
+        stop_times = pd.read_csv(
+            os.path.join(gtfs_dir, "stop_times.txt"),
+            usecols=["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"],
+            dtype={"trip_id": str, "stop_id": str},
+        ).dropna()
+
+        route_names = {}
+        routes_file = os.path.join(gtfs_dir, "routes.txt")
+        if os.path.exists(routes_file):
+            routes = pd.read_csv(routes_file, dtype={"route_id": str})
+            name_col = "route_short_name" if "route_short_name" in routes.columns else "route_long_name"
+            route_names = dict(zip(routes["route_id"], routes[name_col].fillna("").astype(str)))
+
+        service_days = {}
+        calendar_file = os.path.join(gtfs_dir, "calendar.txt")
+        if os.path.exists(calendar_file):
+            calendar = pd.read_csv(calendar_file, dtype={"service_id": str})
+            bits = np.zeros(len(calendar), dtype=np.uint8)
+            for i, day in enumerate(WEEKDAYS):
+                bits |= (calendar[day].to_numpy(dtype=np.uint8) & 1) << i
+            service_days = dict(zip(calendar["service_id"], bits))
+
+        stop_pos = pd.Series(np.arange(len(stops), dtype=np.int32), index=stops["stop_id"])
+        trip_pos = pd.Series(np.arange(len(trips), dtype=np.int32), index=trips["trip_id"])
+
+        stop_times = stop_times.sort_values(["trip_id", "stop_sequence"], kind="stable")
+        trip_days = trips["service_id"].map(service_days).fillna(ALL_DAYS).to_numpy(dtype=np.uint8)
+        trip_routes = trips["route_id"].map(lambda r: route_names.get(r) or r).to_numpy(dtype=object)
+
+        return cls(
+            stop_ids=stops["stop_id"].to_numpy(),
+            stop_names=stops["stop_name"].fillna("").to_numpy(),
+            trip_ids=trips["trip_id"].to_numpy(),
+            trip_routes=trip_routes,
+            trip_days=trip_days,
+            st_trip=trip_pos.loc[stop_times["trip_id"]].to_numpy(),
+            st_stop=stop_pos.loc[stop_times["stop_id"]].to_numpy(),
+            st_arrival=_gtfs_seconds(stop_times["arrival_time"]),
+            st_departure=_gtfs_seconds(stop_times["departure_time"]),
+        )
+
+    def find_stops(self, place: str) -> np.ndarray:
+        """Return indices of stops whose name matches the place (exact first, then substring)."""
+        place_norm = (place or "").strip().lower()
+        if not place_norm:
+            return np.empty(0, dtype=np.int32)
+        exact = np.flatnonzero(self._name_index == place_norm)
+        if len(exact):
+            return exact.astype(np.int32)
+        partial = [i for i, name in enumerate(self._name_index) if place_norm in name]
+        return np.asarray(partial, dtype=np.int32)
+
+    def departures(self, stop: int, after: int = 0) -> np.ndarray:
+        """Connection indices leaving `stop` at or after `after` seconds, in time order."""
+        conns = self.stop_departures[self.stop_offsets[stop]:self.stop_offsets[stop + 1]]
+        start = np.searchsorted(self.c_dep_time[conns], after)
+        return conns[start:]
+
+    def earliest_arrival(self, sources, targets, depart_after: int,
+                         weekday: Optional[int] = None, horizon: int = 24 * 3600) -> Optional[List[tuple]]:
+        """
+        Connection Scan Algorithm earliest-arrival query.
+
+        Returns the journey as a list of (trip, board_connection, alight_connection)
+        tuples, or None if no target is reachable within `horizon` seconds.
+        """
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        if not len(sources) or not len(targets):
+            return None
+
+        # Narrow the scan to the time window and to trips running on the day
+        lo = np.searchsorted(self.c_dep_time, depart_after)
+        hi = np.searchsorted(self.c_dep_time, depart_after + horizon)
+        window = np.arange(lo, hi, dtype=np.int32)
+        if weekday is not None:
+            day_bit = np.uint8(1 << weekday)
+            window = window[(self.trip_days[self.c_trip[window]] & day_bit) != 0]
+        if not len(window):
+            return None
+
+        arrival = [INF] * self.n_stops
+        for s in sources.tolist():
+            arrival[s] = depart_after
+        target_set = set(targets.tolist())
+        board = {}
+        reached_by = {}
+        best = INF
+
+        # Scan in chunks so the inner loop works on plain lists but we never
+        # convert connections that depart after the best arrival found
+        for chunk_start in range(0, len(window), SCAN_CHUNK):
+            chunk = window[chunk_start:chunk_start + SCAN_CHUNK]
+            if self.c_dep_time[chunk[0]] >= best:
+                break
+            conn_ids = chunk.tolist()
+            c_trip = self.c_trip[chunk].tolist()
+            c_dep_stop = self.c_dep_stop[chunk].tolist()
+            c_arr_stop = self.c_arr_stop[chunk].tolist()
+            c_dep_time = self.c_dep_time[chunk].tolist()
+            c_arr_time = self.c_arr_time[chunk].tolist()
+
+            for i in range(len(conn_ids)):
+                dep = c_dep_time[i]
+                if dep >= best:
+                    break
+                trip = c_trip[i]
+                if trip in board or arrival[c_dep_stop[i]] <= dep:
+                    if trip not in board:
+                        board[trip] = conn_ids[i]
+                    arr_stop = c_arr_stop[i]
+                    arr = c_arr_time[i]
+                    if arr < arrival[arr_stop]:
+                        arrival[arr_stop] = arr
+                        reached_by[arr_stop] = (trip, board[trip], conn_ids[i])
+                        if arr_stop in target_set:
+                            best = arr
+
+        if best == INF:
+            return None
+
+        target = min(target_set, key=lambda s: arrival[s])
+        journey = []
+        stop = target
+        source_set = set(sources.tolist())
+        while stop not in source_set:
+            trip, b, a = reached_by[stop]
+            journey.append((trip, b, a))
+            stop = int(self.c_dep_stop[b])
+        journey.reverse()
+        return journey
+
+    def describe(self, journey: List[tuple]) -> Dict[str, Any]:
+        legs = []
+        for trip, b, a in journey:
+            legs.append({
+                "route": str(self.trip_routes[trip]),
+                "trip_id": str(self.trip_ids[trip]),
+                "from": str(self.stop_names[self.c_dep_stop[b]]),
+                "to": str(self.stop_names[self.c_arr_stop[a]]),
+                "departure_time": _fmt_seconds(self.c_dep_time[b]),
+                "arrival_time": _fmt_seconds(self.c_arr_time[a]),
+            })
+        dep = int(self.c_dep_time[journey[0][1]])
+        arr = int(self.c_arr_time[journey[-1][2]])
+        return {
+            "operator": legs[0]["route"] if len(legs) == 1 else " + ".join(l["route"] for l in legs),
+            "departure_time": _fmt_seconds(dep),
+            "arrival_time": _fmt_seconds(arr),
+            "duration": _fmt_seconds(arr - dep),
+            "transfers": len(legs) - 1,
+            "legs": legs,
+        }
+
+    def search(self, origin: str, destination: str, date_str: str, time_str: str = "",
+               max_results: int = 5) -> List[Dict[str, Any]]:
+        """Earliest-arrival journeys between two places, one per successive departure."""
+        sources = self.find_stops(origin)
+        targets = self.find_stops(destination)
+        if not len(sources):
+            raise ValueError(f"No bus stops found for: '{origin}'")
+        if not len(targets):
+            raise ValueError(f"No bus stops found for: '{destination}'")
+
+        weekday = datetime.strptime(date_str, "%Y-%m-%d").weekday()
+        depart_after = 0
+        if time_str:
+            hours, minutes = time_str.split(":")[:2]
+            depart_after = int(hours) * 3600 + int(minutes) * 60
+
+        results = []
+        while len(results) < max_results:
+            journey = self.earliest_arrival(sources, targets, depart_after, weekday)
+            if not journey:
+                break
+            results.append(self.describe(journey))
+            depart_after = int(self.c_dep_time[journey[0][1]]) + 1
+        return results
+
+
+def install_feed(source: str, gtfs_dir: str = GTFS_DIR) -> List[str]:
+    """Copy the timetable files of a GTFS feed (zip file, URL or directory) into gtfs_dir."""
+    if os.path.isdir(source):
+        files = {name: os.path.join(source, name) for name in GTFS_FILES if os.path.exists(os.path.join(source, name))}
+        missing = [name for name in REQUIRED_GTFS_FILES if name not in files]
+        if missing:
+            raise ValueError(f"GTFS feed is missing {', '.join(missing)}")
+        os.makedirs(gtfs_dir, exist_ok=True)
+        for name, path in files.items():
+            shutil.copyfile(path, os.path.join(gtfs_dir, name))
+        return sorted(files)
+
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, timeout=60)
+        response.raise_for_status()
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+    else:
+        archive = zipfile.ZipFile(source)
+    with archive:
+        # Feeds are sometimes zipped inside a top-level folder
+        members = {os.path.basename(m): m for m in archive.namelist() if os.path.basename(m) in GTFS_FILES}
+        missing = [name for name in REQUIRED_GTFS_FILES if name not in members]
+        if missing:
+            raise ValueError(f"GTFS feed is missing {', '.join(missing)}")
+        os.makedirs(gtfs_dir, exist_ok=True)
+        for name, member in members.items():
+            with archive.open(member) as src, open(os.path.join(gtfs_dir, name), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+    return sorted(members)
+
+
+_timetable = None
+
+
+def get_timetable() -> Optional[BusTimetable]:
+    """Lazily load the bus timetable from BUS_GTFS_DIR."""
+    global _timetable
+    if _timetable is None and os.path.isdir(GTFS_DIR):
+        try:
+            _timetable = BusTimetable.from_gtfs(GTFS_DIR)
+            print(f"Loaded bus timetable: {_timetable.n_stops} stops, {_timetable.n_connections} connections")
+        except Exception as e:
+            print(f"Error loading bus timetable: {e}")
+    return _timetable
+
+
+def print_bus_table(bus_results):
+    if not bus_results:
+        print("No buses to display.")
+        return
+
+    table = [[b["operator"], b["departure_time"], b["arrival_time"], b["duration"], b["transfers"]]
+             for b in bus_results]
+    headers = ["Route", "Departure", "Arrival", "Duration", "Transfers"]
+    print(tabulate(table, headers=headers, tablefmt="fancy_grid"))
+
+
+def bus_search_node(state: State) -> Dict[str, Any]:
+    """
+    Bus search agent that integrates with the main workflow.
+    Answers earliest-arrival queries against the local timetable.
+    """
+    messages = state.get("messages", [])
+    route = f"from {state.get('origin')} to {state.get('destination')} on {state.get('departure_date')}"
+
+    try:
+        print(f"\n Searching for buses {route}...")
+        timetable = get_timetable()
+        if timetable is None:
+            print(f"DEBUG: No GTFS feed in {GTFS_DIR}; install one with python -m transport_agents.bus_agent --install")
+            response_msg = f" Bus timetable is not available, cannot search buses {route}."
+            bus_results = []
+        else:
+            started = time.perf_counter()
+            bus_results = timetable.search(
+                state["origin"], state["destination"], state["departure_date"],
+                state.get("departure_time") or "",
+            )
+            print(f"DEBUG: Bus query took {(time.perf_counter() - started) * 1000:.1f} ms")
+            print("\n🚌 Bus Results:")
+            print_bus_table(bus_results)
+
+            if bus_results:
+                response_msg = f" Found {len(bus_results)} bus connections {route}. Check the console for detailed bus information."
+            else:
+                response_msg = f" No bus connections found {route}."
+
+        return {
+            **state,
+            "bus_results": bus_results,
+            "itinerary_results": itinerary_results({**state, "bus_results": bus_results}),
+            "messages": messages + [AIMessage(content=response_msg)],
+            "next_agent": "end",
+            "needs_user_input": False
+        }
+
+    except Exception as e:
+        error_msg = f" Error searching for buses: {str(e)}"
+        print(f"\n{error_msg}")
+
+        return {
+            **state,
+            "bus_results": [],
+            "messages": messages + [AIMessage(content=error_msg)],
+            "next_agent": "end",
+            "needs_user_input": False
+        }
+
+
+async def abus_search_node(state: State) -> Dict[str, Any]:
+    """
+    Async bus_search_node. A query is a few milliseconds of local CPU work and
+    runs inline; only the first timetable load is moved off the event loop.
+    """
+    if _timetable is None:
+        await asyncio.to_thread(get_timetable)
+    return bus_search_node(state)
+
+
+def _synthetic_timetable(n_stops: int = 2000, n_routes: int = 400, stops_per_route: int = 20,
+                         trips_per_route: int = 40, seed: int = 7) -> BusTimetable:
+    """Random regional network used for benchmarking."""
+    rng = np.random.default_rng(seed)
+    st_trip, st_stop, st_arr, st_dep, trip_routes = [], [], [], [], []
+    trip = 0
+    for route in range(n_routes):
+        path = rng.choice(n_stops, size=stops_per_route, replace=False)
+        hops = rng.integers(180, 1200, size=stops_per_route - 1)
+        offsets = np.concatenate(([0], np.cumsum(hops)))
+        for start in np.sort(rng.integers(5 * 3600, 22 * 3600, size=trips_per_route)):
+            st_trip.append(np.full(stops_per_route, trip))
+            st_stop.append(path)
+            st_arr.append(start + offsets)
+            st_dep.append(start + offsets + 30)
+            trip_routes.append(f"R{route}")
+            trip += 1
+    return BusTimetable(
+        stop_ids=[str(i) for i in range(n_stops)],
+        stop_names=[f"Stop {i}" for i in range(n_stops)],
+        trip_ids=[str(i) for i in range(trip)],
+        trip_routes=trip_routes,
+        trip_days=np.full(trip, ALL_DAYS, dtype=np.uint8),
+        st_trip=np.concatenate(st_trip),
+        st_stop=np.concatenate(st_stop),
+        st_arrival=np.concatenate(st_arr),
+        st_departure=np.concatenate(st_dep),
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--install":
+        installed = install_feed(sys.argv[2])
+        print(f"Installed {', '.join(installed)} into {GTFS_DIR}")
+        tt = BusTimetable.from_gtfs(GTFS_DIR)
+        print(f"Loaded bus timetable: {tt.n_stops} stops, {tt.n_connections} connections")
+        sys.exit(0)
+
+    # Benchmark earliest-arrival queries on a synthetic regional network
+    started = time.perf_counter()
+    tt = _synthetic_timetable()
+    print(f"Built {tt.n_stops} stops / {tt.n_connections} connections in {time.perf_counter() - started:.2f}s")
+
+    rng = np.random.default_rng(1)
+    n_queries = 200
+    found = 0
+    started = time.perf_counter()
+    for _ in range(n_queries):
+        src, dst = rng.choice(tt.n_stops, size=2, replace=False)
+        if tt.earliest_arrival([src], [dst], int(rng.integers(6, 12)) * 3600, weekday=0):
+            found += 1
+    elapsed = time.perf_counter() - started
+    print(f"{n_queries} queries ({found} reachable): {elapsed / n_queries * 1000:.2f} ms/query")
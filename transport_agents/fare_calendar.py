@@ -0,0 +1,139 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from transport_agents.API_helper import (
+    search_flights, asearch_flights, validate_date, _get_iata_from_city, _is_iata_code
+)
+
+CALENDAR_WORKERS = int(os.getenv("FARE_CALENDAR_WORKERS", "4"))
+MAX_CALENDAR_DAYS = 62
+
+
+def _date_range(start: str, end: str) -> List[str]:
+    """Valid search dates between start and end (inclusive), clamped to the bookable window."""
+    first = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end or start, "%Y-%m-%d").date()
+    first = max(first, date.today())
+    days = []
+    current = first
+    while current <= last and len(days) < MAX_CALENDAR_DAYS:
+        day = current.isoformat()
+        if validate_date(day)[0]:
+            days.append(day)
+        current += timedelta(days=1)
+    return days
+
+
+def _min_price(result: Optional[dict]) -> float:
+    """Cheapest total price in an Amadeus response, NaN if there is none."""
+    offers = (result or {}).get("data") or []
+    prices = np.fromiter((float(o.get("price", {}).get("total", "nan")) for o in offers),
+                         dtype=np.float32, count=len(offers))
+    if not len(prices) or np.isnan(prices).all():
+        return np.nan
+    return np.nanmin(prices)
+
+
+class FareCalendar:
+    """
+    Min-price calendar for a route.
+
+    `outbound[i]` is the cheapest fare departing on `dates[i]`; when a return
+    range is searched, `inbound[j]` is the cheapest fare back on
+    `return_dates[j]`. Missing days are NaN. The vectors are built from the
+    search responses, one per date in the same order.
+    """
+
+    def __init__(self, origin: str, destination: str, dates: List[str],
+                 return_dates: Optional[List[str]] = None, outbound_results: Optional[List[dict]] = None,
+                 inbound_results: Optional[List[dict]] = None):
+        self.origin = origin
+        self.destination = destination
+        self.dates = np.array(dates, dtype="datetime64[D]")
+        self.return_dates = np.array(return_dates or [], dtype="datetime64[D]")
+        outbound_results = outbound_results or [None] * len(dates)
+        inbound_results = inbound_results or [None] * len(return_dates or [])
+        self.outbound = np.array([_min_price(r) for r in outbound_results], dtype=np.float32)
+        self.inbound = np.array([_min_price(r) for r in inbound_results], dtype=np.float32)
+
+    def pair_matrix(self) -> np.ndarray:
+        """Round-trip price matrix [outbound day, return day]; NaN where the return is before departure."""
+        matrix = self.outbound[:, None] + self.inbound[None, :]
+        matrix[self.return_dates[None, :] < self.dates[:, None]] = np.nan
+        return matrix
+
+    def cheapest_day(self) -> Optional[Tuple[str, float]]:
+        if not len(self.outbound) or np.isnan(self.outbound).all():
+            return None
+        i = int(np.nanargmin(self.outbound))
+        return str(self.dates[i]), float(self.outbound[i])
+
+    def cheapest_pair(self) -> Optional[Tuple[str, str, float]]:
+        if not len(self.inbound):
+            return None
+        matrix = self.pair_matrix()
+        if np.isnan(matrix).all():
+            return None
+        i, j = np.unravel_index(np.nanargmin(matrix), matrix.shape)
+        return str(self.dates[i]), str(self.return_dates[j]), float(matrix[i, j])
+
+    def summary(self) -> str:
+        lines = []
+        for d, p in zip(self.dates, self.outbound):
+            lines.append(f"{d}: {'-' if np.isnan(p) else f'{p:.2f}'}")
+        return "\n".join(lines)
+
+
+def _calendar_jobs(origin_city: str, destination_city: str, start_date: str, end_date: str,
+                   return_start: str, return_end: str):
+    origin = origin_city if _is_iata_code(origin_city) else _get_iata_from_city(origin_city)
+    destination = destination_city if _is_iata_code(destination_city) else _get_iata_from_city(destination_city)
+
+    dates = _date_range(start_date, end_date)
+    return_dates = _date_range(return_start, return_end) if return_start else []
+    jobs = [(origin, destination, d) for d in dates] + [(destination, origin, d) for d in return_dates]
+    return origin, destination, dates, return_dates, jobs
+
+
+def search_fare_calendar(origin_city: str, destination_city: str, start_date: str, end_date: str,
+                         token: str, return_start: str = "", return_end: str = "",
+                         workers: int = CALENDAR_WORKERS) -> FareCalendar:
+    """
+    Search every day of the range (and the optional return range) with
+    bounded concurrency and fill the calendar's price vectors from the
+    responses.
+    """
+    origin, destination, dates, return_dates, jobs = _calendar_jobs(
+        origin_city, destination_city, start_date, end_date, return_start, return_end)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda job: search_flights(*job, token), jobs))
+    print(f"DEBUG: Fare calendar searched {len(jobs)} dates in {time.perf_counter() - started:.1f}s")
+
+    return FareCalendar(origin, destination, dates, return_dates, results[:len(dates)], results[len(dates):])
+
+
+async def asearch_fare_calendar(origin_city: str, destination_city: str, start_date: str, end_date: str,
+                                token: str, return_start: str = "", return_end: str = "",
+                                workers: int = CALENDAR_WORKERS) -> FareCalendar:
+    """Async search_fare_calendar; a semaphore bounds the in-flight searches instead of a thread pool."""
+    origin, destination, dates, return_dates, jobs = _calendar_jobs(
+        origin_city, destination_city, start_date, end_date, return_start, return_end)
+    semaphore = asyncio.Semaphore(max(1, workers))
+
+    async def search(job):
+        async with semaphore:
+            return await asearch_flights(*job, token)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(search(job) for job in jobs))
+    print(f"DEBUG: Fare calendar searched {len(jobs)} dates in {time.perf_counter() - started:.1f}s")
+
+    return FareCalendar(origin, destination, dates, return_dates, results[:len(dates)], results[len(dates):])
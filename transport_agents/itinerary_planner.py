@@ -0,0 +1,359 @@
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Any, List, NamedTuple, Optional
+
+import numpy as np
+from tabulate import tabulate
+
+# Minimum connection time (minutes) needed before boarding a leg of each mode
+MIN_TRANSFER_MINUTES = {
+    "flight": 120,
+    "train": 30,
+    "bus": 15,
+}
+DEFAULT_TRANSFER_MINUTES = 30
+# Arrival estimate for trains without a schedule: track is longer than the
+# great-circle distance, and the average speed includes halts
+RAIL_FACTOR = 1.2
+TRAIN_SPEED_KMH = float(os.getenv("TRAIN_SPEED_KMH", "60"))
+
+
+class Leg(NamedTuple):
+    mode: str
+    origin: str
+    destination: str
+    departure: datetime
+    arrival: datetime
+    # None when the provider gives no fare (GTFS buses, unenriched trains)
+    price: Optional[float]
+    label: str = ""
+
+
+def _minutes(dt: datetime) -> int:
+    return int(dt.timestamp() // 60)
+
+
+def _fmt_minutes(minutes: int) -> str:
+    hours, mins = divmod(int(minutes), 60)
+    return f"{hours}h {mins:02d}m"
+
+
+def _price_key(price: float) -> float:
+    # Unknown (NaN) prices rank after every known one
+    return math.inf if math.isnan(price) else price
+
+
+def _clock(date_str: str, time_str: str) -> datetime:
+    return datetime.strptime(f"{date_str} {time_str[:5]}", "%Y-%m-%d %H:%M")
+
+
+def legs_from_flight_offers(raw_results: dict) -> List[Leg]:
+    """One leg per Amadeus flight offer (first itinerary, door to door)."""
+    legs = []
+    for offer in (raw_results or {}).get("data", []) or []:
+        try:
+            segments = offer["itineraries"][0]["segments"]
+            carriers = sorted({s.get("carrierCode", "") for s in segments})
+            legs.append(Leg(
+                mode="flight",
+                origin=segments[0]["departure"]["iataCode"],
+                destination=segments[-1]["arrival"]["iataCode"],
+                departure=datetime.fromisoformat(segments[0]["departure"]["at"]),
+                arrival=datetime.fromisoformat(segments[-1]["arrival"]["at"]),
+                price=float(offer["price"]["total"]),
+                label="/".join(c for c in carriers if c),
+            ))
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+    return legs
+
+
+def legs_from_bus_results(bus_results: List[Dict], date_str: str) -> List[Leg]:
+    """One leg per bus journey returned by the bus agent."""
+    legs = []
+    for b in bus_results or []:
+        try:
+            departure = _clock(date_str, b["departure_time"])
+            arrival = _clock(date_str, b["arrival_time"])
+            if arrival < departure:
+                arrival += timedelta(days=1)
+            price = b.get("price")
+            legs.append(Leg("bus", b["legs"][0]["from"], b["legs"][-1]["to"],
+                            departure, arrival, float(price) if price is not None else None, b.get("operator", "")))
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+    return legs
+
+
+def _estimated_train_minutes(source: str, destination: str, km: Optional[float] = None) -> Optional[int]:
+    """Running time from the schedule's distance, or from the stations' cities when there is none."""
+    if km is None:
+        from transport_agents.airport_index import airport_index, haversine_km
+        aliases, index = default_aliases(), airport_index()
+        # Only stations whose city is known; a bare station code could collide with an IATA code
+        cities = [aliases.get((code or "").lower()) for code in (source, destination)]
+        ends = [index.locate(city) if city else None for city in cities]
+        if None in ends:
+            return None
+        km = float(haversine_km(*ends[0], *ends[1])) * RAIL_FACTOR
+    return int(round(km / TRAIN_SPEED_KMH * 60)) if km > 0 else None
+
+
+def _train_arrival(t: Dict, departure: datetime) -> Optional[datetime]:
+    """Arrival from the row, its enriched schedule, or estimated from distance."""
+    day = departure.strftime("%Y-%m-%d")
+    if t.get("arrival_time"):
+        arrival = _clock(day, t["arrival_time"])
+        return arrival + timedelta(days=1) if arrival < departure else arrival
+    schedule = t.get("schedule") or {}
+    if schedule.get("arrival_time"):
+        arrival = _clock(day, schedule["arrival_time"]) + timedelta(days=schedule.get("days") or 0)
+        return arrival + timedelta(days=1) if arrival < departure else arrival
+    minutes = _estimated_train_minutes(t["source"], t["destination"], schedule.get("km"))
+    return departure + timedelta(minutes=minutes) if minutes else None
+
+
+def legs_from_train_results(train_results: List[Dict], date_str: str) -> List[Leg]:
+    """
+    One leg per train result, priced at the cheapest enriched fare. Live-station
+    rows carry no arrival time: it comes from the train's schedule when the row
+    was enriched, otherwise it is estimated from distance and the label says so.
+    """
+    legs = []
+    for t in train_results or []:
+        try:
+            departure = _clock(t.get("date") or date_str, t["departure_time"])
+            arrival = _train_arrival(t, departure)
+            if arrival is None:
+                continue
+            fare = min((t.get("fares") or {}).values(), default=t.get("price") or t.get("fare"))
+            label = t.get("train_name") or t.get("trainName", "")
+            if not t.get("arrival_time") and not (t.get("schedule") or {}).get("arrival_time"):
+                label += " (est. arrival)"
+            legs.append(Leg("train", t.get("from") or t["source"], t.get("to") or t["destination"],
+                            departure, arrival, float(fare) if fare is not None else None, label))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return legs
+
+
+def cached_train_results(days) -> List[Dict]:
+    """Rows of this process's recent train searches on the given days."""
+    from transport_agents.train_enrichment import train_results_cache
+    return [row for _, rows in train_results_cache.local_items() for row in rows or [] if row.get("date") in days]
+
+
+@lru_cache(maxsize=1)
+def default_aliases() -> Dict[str, str]:
+    """Map airport IATA codes and railway station codes to a lowercase city key."""
+    aliases = {}
+    try:
+        from transport_agents.API_helper import _airports_df
+        for city, code in zip(_airports_df["City"], _airports_df["IATA_Code"]):
+            aliases.setdefault(str(code).lower(), str(city).strip().lower())
+    except Exception as e:
+        print(f"DEBUG: Could not load airport aliases: {e}")
+    try:
+        from transport_agents.train_agent import CITY_TO_CODE
+        for city, codes in CITY_TO_CODE.items():
+            for code in codes if isinstance(codes, list) else [codes]:
+                aliases.setdefault(code.lower(), city.strip().lower())
+    except Exception as e:
+        print(f"DEBUG: Could not load station aliases: {e}")
+    return aliases
+
+
+def plan_journeys(legs: List[Leg], origin: str, destination: str,
+                  aliases: Optional[Dict[str, str]] = None, max_transfers: int = 3,
+                  max_labels: int = 16) -> List[Dict[str, Any]]:
+    """
+    Pareto-optimal journeys over (price, duration, transfers).
+
+    Legs form a time-expanded graph: every leg is an edge from a departure
+    event to an arrival event, and a leg can follow another at the same place
+    once the mode's minimum transfer time has passed. Legs are scanned once in
+    departure order; each place keeps a bag of at most `max_labels`
+    non-dominated labels (arrival, price, transfers, journey start).
+    Legs without a price are NaN: journeys using them are never compared on
+    price, so an unknown fare does not make a journey look cheap.
+    """
+    if aliases is None:
+        aliases = default_aliases()
+
+    def place(name: str) -> str:
+        key = (name or "").strip().lower()
+        return aliases.get(key, key)
+
+    source, target = place(origin), place(destination)
+    if not legs or source == target:
+        return []
+
+    places = {}
+    dep = np.fromiter((_minutes(l.departure) for l in legs), dtype=np.int64, count=len(legs))
+    arr = np.fromiter((_minutes(l.arrival) for l in legs), dtype=np.int64, count=len(legs))
+    frm = np.fromiter((places.setdefault(place(l.origin), len(places)) for l in legs), dtype=np.int32, count=len(legs))
+    to = np.fromiter((places.setdefault(place(l.destination), len(places)) for l in legs), dtype=np.int32, count=len(legs))
+    price = np.fromiter((np.nan if l.price is None else l.price for l in legs), dtype=np.float64, count=len(legs))
+    transfer = np.fromiter((MIN_TRANSFER_MINUTES.get(l.mode, DEFAULT_TRANSFER_MINUTES) for l in legs),
+                           dtype=np.int64, count=len(legs))
+    if source not in places or target not in places:
+        return []
+    source_id, target_id = places[source], places[target]
+
+    order = np.argsort(dep, kind="stable")
+    # Only legs that arrive somewhere useful and never return to the origin
+    order = order[(arr[order] > dep[order]) & (to[order] != source_id) & (frm[order] != target_id)]
+
+    # label = (arrival, price, transfers, start, leg, parent)
+    bags: Dict[int, List[tuple]] = {}
+    results: List[tuple] = []
+
+    def dominated(label, bag):
+        a, p, k, s = label[:4]
+        return any(b[0] <= a and b[1] <= p and b[2] <= k and b[3] >= s for b in bag)
+
+    def target_dominated(label):
+        d, p, k = label[0] - label[3], label[1], label[2]
+        return any(r[0] - r[3] <= d and r[1] <= p and r[2] <= k for r in results)
+
+    for i, d, a, u, v, p, t in zip(order.tolist(), dep[order].tolist(), arr[order].tolist(),
+                                   frm[order].tolist(), to[order].tolist(), price[order].tolist(),
+                                   transfer[order].tolist()):
+        candidates = []
+        if u == source_id:
+            candidates.append((a, p, 0, d, i, None))
+        for lab in bags.get(u, ()):
+            if lab[0] + t <= d and lab[2] < max_transfers:
+                candidates.append((a, lab[1] + p, lab[2] + 1, lab[3], i, lab))
+
+        for cand in candidates:
+            if target_dominated(cand):
+                continue
+            if v == target_id:
+                results[:] = [r for r in results
+                              if not (cand[0] - cand[3] <= r[0] - r[3] and cand[1] <= r[1] and cand[2] <= r[2])]
+                results.append(cand)
+                continue
+            bag = bags.setdefault(v, [])
+            if dominated(cand, bag):
+                continue
+            bag[:] = [b for b in bag
+                      if not (cand[0] <= b[0] and cand[1] <= b[1] and cand[2] <= b[2] and cand[3] >= b[3])]
+            bag.append(cand)
+            if len(bag) > max_labels:
+                # Bounded bags: drop the most expensive label
+                bag.remove(max(bag, key=lambda b: (_price_key(b[1]), b[0])))
+
+    journeys = []
+    for label in sorted(results, key=lambda r: (_price_key(r[1]), r[0] - r[3], r[2])):
+        chain = []
+        node = label
+        while node is not None:
+            chain.append(legs[node[4]])
+            node = node[5]
+        chain.reverse()
+        journeys.append({
+            "modes": [l.mode for l in chain],
+            "price": None if math.isnan(label[1]) else round(label[1], 2),
+            "duration": _fmt_minutes(label[0] - label[3]),
+            "transfers": label[2],
+            "departure_time": chain[0].departure.isoformat(timespec="minutes"),
+            "arrival_time": chain[-1].arrival.isoformat(timespec="minutes"),
+            "legs": [{
+                "mode": l.mode,
+                "from": l.origin,
+                "to": l.destination,
+                "departure_time": l.departure.isoformat(timespec="minutes"),
+                "arrival_time": l.arrival.isoformat(timespec="minutes"),
+                "price": l.price,
+                "label": l.label,
+            } for l in chain],
+        })
+    return journeys
+
+
+def plan_itineraries(state: Dict[str, Any], flight_offers: Optional[dict] = None) -> List[Dict[str, Any]]:
+    """
+    Combine cached flight offers and train listings for the travel day (and
+    the next), the just-fetched one-way flight_offers and the train and bus
+    results in state into multi-leg, multi-modal itineraries for the state's
+    route.
+    """
+    from transport_agents.API_helper import cached_offers
+
+    date_str = state.get("departure_date") or ""
+    days = set()
+    if date_str:
+        try:
+            day = datetime.strptime(date_str, "%Y-%m-%d")
+            days = {date_str, (day + timedelta(days=1)).strftime("%Y-%m-%d")}
+        except ValueError:
+            pass
+    legs = legs_from_flight_offers(flight_offers)
+    for key, result in cached_offers():
+        # Unfiltered one-way searches only: their offers have one itinerary each
+        if len(key) == 3 and key[2] in days and result is not flight_offers:
+            legs.extend(legs_from_flight_offers(result))
+    if date_str:
+        trains = {(r.get("train_number") or id(r), r.get("source"), r.get("date")): r
+                  for r in cached_train_results(days) + list(state.get("train_results") or [])}
+        legs.extend(legs_from_train_results(list(trains.values()), date_str))
+        legs.extend(legs_from_bus_results(state.get("bus_results") or [], date_str))
+
+    return plan_journeys(legs, state.get("origin", ""), state.get("destination", ""))
+
+
+def print_itineraries(journeys: List[Dict[str, Any]]):
+    table = [[" + ".join(j["modes"]), "?" if j["price"] is None else j["price"], j["duration"], j["transfers"],
+              j["departure_time"], j["arrival_time"], " → ".join([j["legs"][0]["from"]] + [l["to"] for l in j["legs"]])]
+             for j in journeys]
+    headers = ["Modes", "Price", "Duration", "Transfers", "Departure", "Arrival", "Route"]
+    print(tabulate(table, headers=headers, tablefmt="fancy_grid"))
+
+
+def itinerary_results(state: Dict[str, Any], flight_offers: Optional[dict] = None) -> List[Dict[str, Any]]:
+    """itinerary_results for a search node; connecting journeys are shown in the console."""
+    try:
+        started = time.perf_counter()
+        journeys = plan_itineraries(state, flight_offers)
+        print(f"DEBUG: Itinerary planning took {(time.perf_counter() - started) * 1000:.1f} ms, "
+              f"{len(journeys)} Pareto journeys")
+    except Exception as e:
+        print(f"DEBUG: Itinerary planning failed: {e}")
+        return []
+    if any(j["transfers"] or len(set(j["modes"])) > 1 for j in journeys):
+        print("\n🧭 Connecting Itineraries:")
+        print_itineraries(journeys)
+    return journeys
+
+
+def _synthetic_legs(n_places: int = 80, n_legs: int = 5000, seed: int = 3) -> List[Leg]:
+    """Random multi-modal network over one day used for benchmarking."""
+    rng = np.random.default_rng(seed)
+    base = datetime(2025, 1, 1)
+    modes = np.array(["flight", "train", "bus"])
+    legs = []
+    for _ in range(n_legs):
+        u, v = rng.choice(n_places, size=2, replace=False)
+        mode = modes[rng.integers(0, 3)]
+        start = base + timedelta(minutes=int(rng.integers(0, 20 * 60)))
+        minutes = int(rng.integers(45, 240 if mode == "flight" else 480))
+        price = float(rng.integers(20, 400)) * (3 if mode == "flight" else 1)
+        legs.append(Leg(str(mode), f"city{u}", f"city{v}", start, start + timedelta(minutes=minutes), price))
+    return legs
+
+
+if __name__ == "__main__":
+    # Benchmark on synthetic networks of increasing size
+    for n_legs in (1000, 5000, 20000):
+        legs = _synthetic_legs(n_legs=n_legs)
+        started = time.perf_counter()
+        n_queries, total = 20, 0
+        for q in range(n_queries):
+            total += len(plan_journeys(legs, f"city{q}", f"city{q + 40}", aliases={}))
+        elapsed = time.perf_counter() - started
+        print(f"{n_legs:>6} legs: {elapsed / n_queries * 1000:7.2f} ms/query, "
+              f"{total / n_queries:.1f} Pareto journeys on average")
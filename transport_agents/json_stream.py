@@ -0,0 +1,106 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", flags=re.DOTALL)
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for a streamed JSON object of the form
+    {"summary": "...", "<array_key>": [{...}, {...}]}.
+
+    Text is fed in arbitrary chunks; every element of the array is returned
+    by `feed` as soon as its closing brace arrives. `finish` returns the
+    whole object, or what could be recovered from a truncated stream.
+    """
+
+    def __init__(self, array_key: str = "filtered_results"):
+        self.array_key = array_key
+        self.records: List[Dict[str, Any]] = []
+        self.fields: Dict[str, Any] = {}
+        self._buf = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._array_depth = -1
+        self._item_start = -1
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self._buf += chunk
+        new_records = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._end_string(buf[self._string_start:i + 1])
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._stack.append(c)
+                depth = len(self._stack)
+                if depth == 1:
+                    self._expect_key = c == "{"
+                elif c == "[" and depth == 2 and self._key == self.array_key:
+                    self._array_depth = depth
+                elif c == "{" and depth == self._array_depth + 1 and self._array_depth > 0:
+                    self._item_start = i
+            elif c in "}]":
+                depth = len(self._stack)
+                if self._stack:
+                    self._stack.pop()
+                if c == "}" and depth == self._array_depth + 1 and self._item_start >= 0:
+                    try:
+                        record = json.loads(buf[self._item_start:i + 1])
+                        self.records.append(record)
+                        new_records.append(record)
+                    except ValueError:
+                        pass
+                    self._item_start = -1
+                elif c == "]" and depth == self._array_depth:
+                    self._array_depth = -1
+            elif len(self._stack) == 1:
+                if c == ",":
+                    self._expect_key = True
+                elif c == ":":
+                    self._expect_key = False
+        self._pos = len(buf)
+        return new_records
+
+    def _end_string(self, literal: str):
+        if len(self._stack) != 1 or self._stack[0] != "{":
+            return
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            return
+        if self._expect_key:
+            self._key = value
+        elif self._key is not None:
+            self.fields[self._key] = value
+
+    def finish(self) -> Dict[str, Any]:
+        """Full parse when the text is complete, else the partially recovered object."""
+        try:
+            parsed = json.loads(_FENCE_RE.sub("", self._buf.strip()))
+            if isinstance(parsed, dict):
+                return parsed
+        except ValueError:
+            pass
+        result = dict(self.fields)
+        result[self.array_key] = list(self.records)
+        result["partial"] = True
+        return result
@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from transport_agents.alloc_profiler import profiler
+
+# Model tiers per call site, cheapest/fastest first. A call starts on the
+# first tier and moves to the next one only when the output fails validation.
+# Override with e.g. MODEL_ROUTE_QUERY_PARSER="gemini-2.0-flash,gemini-2.5-flash".
+DEFAULT_ROUTES = {
+    "query_parser": ["gemini-2.0-flash-lite", "gemini-2.0-flash"],
+    "train_agent": ["gemini-2.0-flash-lite", "gemini-2.0-flash"],
+    "flight_summary": ["gemini-2.0-flash", "gemini-2.5-flash"],
+}
+MODEL_ROUTES = {
+    site: [m.strip() for m in os.getenv(f"MODEL_ROUTE_{site.upper()}", ",".join(tiers)).split(",") if m.strip()]
+    for site, tiers in DEFAULT_ROUTES.items()
+}
+CHAT_PROVIDER = "google_genai"
+
+
+def _init_chat_model(name: str):
+    from langchain.chat_models import init_chat_model
+    return init_chat_model(f"{CHAT_PROVIDER}:{name}")
+
+
+def _init_genai_model(name: str):
+    import google.generativeai as genai
+    return genai.GenerativeModel(name)
+
+
+class _TierStats:
+    __slots__ = ("calls", "accepted", "escalated", "errors", "latencies")
+
+    def __init__(self):
+        self.calls = 0
+        self.accepted = 0
+        self.escalated = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=1000)
+
+
+class ModelRouter:
+    """
+    Routes each LLM call site to a list of model tiers.
+
+    `call(site, fn, validate)` runs fn(model_name) on the cheapest tier;
+    validate(result) returns None to accept or a short reason to escalate
+    to the next tier. Exceptions escalate too. The last tier's result is
+    returned even if it fails validation, so callers keep their own
+    fallbacks. Model clients are created lazily, once per model name.
+    """
+
+    def __init__(self, routes: Dict[str, List[str]]):
+        self.routes = {site: list(tiers) for site, tiers in routes.items()}
+        self.chat_factory: Callable[[str], Any] = _init_chat_model
+        self.genai_factory: Callable[[str], Any] = _init_genai_model
+        self._models: Dict[tuple, Any] = {}
+        self._stats: Dict[tuple, _TierStats] = {}
+        self._lock = threading.Lock()
+
+    def tiers(self, site: str) -> List[str]:
+        return self.routes[site]
+
+    def use_factories(self, chat: Optional[Callable] = None, genai: Optional[Callable] = None):
+        """Swap the model constructors (e.g. for stubs) and drop cached clients."""
+        with self._lock:
+            if chat is not None:
+                self.chat_factory = chat
+            if genai is not None:
+                self.genai_factory = genai
+            self._models.clear()
+
+    def _model(self, kind: str, name: str, factory: Callable, tools=None):
+        key = (kind, name, tuple(id(t) for t in tools or []))
+        with self._lock:
+            model = self._models.get(key)
+        if model is None:
+            model = factory(name)
+            if tools:
+                model = model.bind_tools(tools)
+            with self._lock:
+                model = self._models.setdefault(key, model)
+        return model
+
+    def chat_model(self, name: str, tools=None):
+        """LangChain chat model for a tier, optionally with tools bound."""
+        return self._model("chat", name, self.chat_factory, tools)
+
+    def genai_model(self, name: str):
+        """google.generativeai model for a tier."""
+        return self._model("genai", name, self.genai_factory)
+
+    def _stat(self, site: str, name: str) -> _TierStats:
+        with self._lock:
+            return self._stats.setdefault((site, name), _TierStats())
+
+    def _record(self, site: str, tier: int, name: str, started: float, reason: Optional[str],
+                error: Optional[BaseException], last: bool):
+        elapsed = time.perf_counter() - started
+        stat = self._stat(site, name)
+        with self._lock:
+            stat.calls += 1
+            stat.latencies.append(elapsed)
+            if error is not None:
+                stat.errors += 1
+            if reason is None and error is None:
+                stat.accepted += 1
+            elif not last:
+                stat.escalated += 1
+        if reason is not None or error is not None:
+            why = reason if error is None else f"{type(error).__name__}: {error}"
+            action = "giving up" if last else "escalating"
+            print(f"DEBUG: {site} tier {tier} ({name}) {action} after {elapsed * 1000:.0f} ms: {why}")
+
+    def call(self, site: str, fn: Callable[[str], Any], validate: Callable[[Any], Optional[str]]):
+        tiers = self.tiers(site)
+        for tier, name in enumerate(tiers):
+            last = tier == len(tiers) - 1
+            started = time.perf_counter()
+            try:
+                with profiler.track("llm", f"{site}:{name}"):
+                    result = fn(name)
+            except Exception as e:
+                self._record(site, tier, name, started, None, e, last)
+                if last:
+                    raise
+                continue
+            reason = validate(result)
+            self._record(site, tier, name, started, reason, None, last)
+            if reason is None or last:
+                return result
+
+    async def acall(self, site: str, fn: Callable[[str], Any], validate: Callable[[Any], Optional[str]]):
+        """Async `call`; fn(model_name) returns an awaitable."""
+        tiers = self.tiers(site)
+        for tier, name in enumerate(tiers):
+            last = tier == len(tiers) - 1
+            started = time.perf_counter()
+            try:
+                with profiler.track("llm", f"{site}:{name}"):
+                    result = await fn(name)
+            except Exception as e:
+                self._record(site, tier, name, started, None, e, last)
+                if last:
+                    raise
+                continue
+            reason = validate(result)
+            self._record(site, tier, name, started, reason, None, last)
+            if reason is None or last:
+                return result
+
+    def metrics(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Per site and tier: calls, acceptance and escalation rates, latency (ms)."""
+        report: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        with self._lock:
+            for (site, name), stat in self._stats.items():
+                ordered = sorted(stat.latencies)
+                report.setdefault(site, {})[name] = {
+                    "calls": stat.calls,
+                    "accepted": stat.accepted,
+                    "escalated": stat.escalated,
+                    "errors": stat.errors,
+                    "escalation_rate": round(stat.escalated / stat.calls, 3) if stat.calls else 0.0,
+                    "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+                    "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 1) if ordered else 0.0,
+                }
+        return report
+
+    def stats_line(self, site: str) -> str:
+        parts = []
+        for name, m in self.metrics().get(site, {}).items():
+            parts.append(f"{name} {m['calls']} calls, {m['avg_ms']:.0f} ms avg, {m['escalation_rate'] * 100:.0f}% escalated")
+        return f"{site} models: " + ("; ".join(parts) or "no calls")
+
+
+router = ModelRouter(MODEL_ROUTES)
+
+
+if __name__ == "__main__":
+    # Routing check with fake tiers: the cheap tier returns a placeholder a
+    # third of the time and is escalated
+    import random
+
+    demo = ModelRouter({"demo": ["cheap", "strong"]})
+
+    def fake_model(name):
+        time.sleep(0.002 if name == "cheap" else 0.01)
+        return "[city name]" if name == "cheap" and random.random() < 0.33 else "Paris"
+
+    for _ in range(30):
+        demo.call("demo", fake_model, lambda r: "placeholder" if r.startswith("[") else None)
+
+    for name, stats in demo.metrics()["demo"].items():
+        print(name, stats)
+    print(demo.stats_line("demo"))
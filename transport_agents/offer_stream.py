@@ -0,0 +1,167 @@
+import gzip
+import io
+import json
+import time
+import tracemalloc
+from typing import Any, Dict, Iterable
+
+import ijson
+from ijson.common import ObjectBuilder
+
+# Ask every provider for a compressed body; requests and aiohttp decode it transparently
+COMPRESSED_HEADERS = {"Accept-Encoding": "gzip, deflate"}
+
+# Offer fields read anywhere downstream (OffersTable, itinerary planner,
+# round-trip and nearby ranking, fare calendar, summary fingerprint, LLM
+# prompt). Everything else, e.g. travelerPricings, pricingOptions, aircraft
+# and operating carriers, is dropped while parsing.
+OFFER_FIELDS = [
+    "id",
+    "numberOfBookableSeats",
+    "validatingAirlineCodes.item",
+    "price.currency",
+    "price.total",
+    "itineraries.item.duration",
+    "itineraries.item.segments.item.carrierCode",
+    "itineraries.item.segments.item.number",
+    "itineraries.item.segments.item.duration",
+    "itineraries.item.segments.item.numberOfStops",
+    "itineraries.item.segments.item.departure.iataCode",
+    "itineraries.item.segments.item.departure.at",
+    "itineraries.item.segments.item.arrival.iataCode",
+    "itineraries.item.segments.item.arrival.at",
+]
+# Kept whole: small lookup tables
+KEEP_SUBTREES = ("dictionaries", "meta")
+# Small read buffer: the parser yields events per buffer, so this bounds the transient event backlog
+PARSE_BUF_SIZE = 8192
+
+
+def _allowed_prefixes(fields: Iterable[str]) -> frozenset:
+    allowed = {""}
+    for field in fields:
+        parts = f"data.item.{field}".split(".")
+        for i in range(1, len(parts) + 1):
+            allowed.add(".".join(parts[:i]))
+    return frozenset(allowed)
+
+
+_ALLOWED = _allowed_prefixes(OFFER_FIELDS)
+
+
+def _result(builder: ObjectBuilder) -> Dict[str, Any]:
+    value = getattr(builder, "value", None)
+    return value if isinstance(value, dict) else {}
+
+
+def parse_offers(stream) -> Dict[str, Any]:
+    """
+    Parse an Amadeus flight-offers body from a binary file-like object,
+    keeping only OFFER_FIELDS. The event stream is filtered before any
+    object is built, so dropped subtrees are never materialized.
+    """
+    builder = ObjectBuilder()
+    event_sink, allowed = builder.event, _ALLOWED
+    # Hot loop: one set lookup per event, inlined
+    for prefix, event, value in ijson.parse(stream, use_float=True, buf_size=PARSE_BUF_SIZE):
+        if prefix in allowed or prefix.startswith(KEEP_SUBTREES):
+            event_sink(event, value)
+    return _result(builder)
+
+
+async def aparse_offers(stream) -> Dict[str, Any]:
+    """parse_offers for an async stream (e.g. aiohttp's response.content)."""
+    builder = ObjectBuilder()
+    event_sink, allowed = builder.event, _ALLOWED
+    async for prefix, event, value in ijson.parse_async(stream, use_float=True, buf_size=PARSE_BUF_SIZE):
+        if prefix in allowed or prefix.startswith(KEEP_SUBTREES):
+            event_sink(event, value)
+    return _result(builder)
+
+
+def _full_payload(n: int, seed: int = 11) -> bytes:
+    """Amadeus-shaped body with n offers, including the fields the parser drops."""
+    import random
+    rng = random.Random(seed)
+    carriers = ["AI", "6E", "UK", "EK", "LH", "BA", "AF", "QR"]
+    offers = []
+    for i in range(n):
+        segments = []
+        for s in range(rng.randint(1, 3)):
+            carrier = rng.choice(carriers)
+            segments.append({
+                "departure": {"iataCode": "DEL", "terminal": "3", "at": f"2025-03-01T{6 + s:02d}:15:00"},
+                "arrival": {"iataCode": "CDG", "terminal": "2E", "at": f"2025-03-01T{9 + s:02d}:40:00"},
+                "carrierCode": carrier, "number": str(rng.randint(100, 999)),
+                "aircraft": {"code": "789"}, "operating": {"carrierCode": carrier},
+                "duration": "PT3H25M", "id": str(s + 1), "numberOfStops": 0, "blacklistedInEU": False,
+            })
+        total = f"{rng.uniform(80, 1500):.2f}"
+        offers.append({
+            "type": "flight-offer", "id": str(i + 1), "source": "GDS",
+            "instantTicketingRequired": False, "nonHomogeneous": False, "oneWay": False,
+            "lastTicketingDate": "2025-02-20", "numberOfBookableSeats": rng.randint(1, 9),
+            "itineraries": [{"duration": f"PT{rng.randint(2, 20)}H{rng.randint(0, 59)}M", "segments": segments}],
+            "price": {"currency": "EUR", "total": total, "base": total, "grandTotal": total,
+                      "fees": [{"amount": "0.00", "type": "SUPPLIER"}, {"amount": "0.00", "type": "TICKETING"}]},
+            "pricingOptions": {"fareType": ["PUBLISHED"], "includedCheckedBagsOnly": True},
+            "validatingAirlineCodes": [segments[0]["carrierCode"]],
+            "travelerPricings": [{
+                "travelerId": "1", "fareOption": "STANDARD", "travelerType": "ADULT",
+                "price": {"currency": "EUR", "total": total, "base": total},
+                "fareDetailsBySegment": [{
+                    "segmentId": seg["id"], "cabin": "ECONOMY", "fareBasis": "KLOWINT",
+                    "brandedFare": "ECOLIGHT", "class": "K",
+                    "includedCheckedBags": {"quantity": 1},
+                    "amenities": [{"description": d, "isChargeable": c, "amenityType": t,
+                                   "amenityProvider": {"name": "BrandedFare"}}
+                                  for d, c, t in [("CHECKED BAG 1PC", False, "BAGGAGE"),
+                                                  ("SNACK", False, "MEAL"),
+                                                  ("CHANGEABLE TICKET", True, "BRANDED_FARES")]],
+                } for seg in segments],
+            }],
+        })
+    body = {
+        "meta": {"count": n},
+        "data": offers,
+        "dictionaries": {"carriers": {c: c for c in carriers}, "aircraft": {"789": "BOEING 787-9"}},
+    }
+    return json.dumps(body).encode()
+
+
+def _measure(fn, repeat: int = 5):
+    """(result, best wall time, peak traced memory); timing runs without tracemalloc."""
+    result = fn()
+    elapsed = min(_timed(fn) for _ in range(repeat))
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    # Parse time and peak memory per response: full json.loads tree vs the
+    # filtered event stream, plain and gzip-compressed bodies
+    print(f"{'max':>5} {'body KB':>8} {'gzip KB':>8} | {'json.loads ms':>13} {'peak KB':>8} | "
+          f"{'stream ms':>9} {'peak KB':>8} | {'gzip stream ms':>14} {'peak KB':>8} | {'kept KB':>7}")
+    for n in (10, 40, 100, 250):
+        body = _full_payload(n)
+        compressed = gzip.compress(body)
+
+        full, full_s, full_peak = _measure(lambda: json.loads(body))
+        slim, stream_s, stream_peak = _measure(lambda: parse_offers(io.BytesIO(body)))
+        _, gz_s, gz_peak = _measure(lambda: parse_offers(gzip.GzipFile(fileobj=io.BytesIO(compressed))))
+        assert len(slim["data"]) == n and slim["data"][0]["price"]["total"] == full["data"][0]["price"]["total"]
+        kept = len(json.dumps(slim))
+
+        print(f"{n:>5} {len(body) / 1024:>8.0f} {len(compressed) / 1024:>8.0f} | {full_s * 1000:>13.1f} "
+              f"{full_peak / 1024:>8.0f} | {stream_s * 1000:>9.1f} {stream_peak / 1024:>8.0f} | "
+              f"{gz_s * 1000:>14.1f} {gz_peak / 1024:>8.0f} | {kept / 1024:>7.0f}")
+    print(f"ijson backend: {ijson.backend}")
@@ -0,0 +1,215 @@
+import re
+import time
+from typing import Dict, Any, Iterator, List, Optional
+
+import numpy as np
+
+_DURATION_RE = re.compile(r"P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?")
+
+
+def _duration_minutes(value: str) -> int:
+    match = _DURATION_RE.fullmatch(value or "")
+    if not match:
+        return 0
+    days, hours, minutes = (int(g) if g else 0 for g in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+class OffersTable:
+    """
+    Columnar view over Amadeus flight offers.
+
+    The response is parsed once into NumPy columns (price, duration, stops,
+    departure/arrival time, airline). filter/sort/top_k only produce a new
+    row-index array over the same columns, so any slice can be rendered or
+    handed on without copying offer data. `raw` keeps a reference to the
+    original offer dict for consumers that need the full record.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], index: Optional[np.ndarray] = None,
+                 dictionaries: Optional[dict] = None):
+        self._columns = columns
+        self._index = np.arange(len(columns["price"])) if index is None else index
+        self.dictionaries = dictionaries or {}
+
+    @classmethod
+    def from_amadeus(cls, response: dict) -> "OffersTable":
+        offers = (response or {}).get("data") or []
+        dictionaries = (response or {}).get("dictionaries") or {}
+        carrier_names = dictionaries.get("carriers", {})
+
+        n = len(offers)
+        price = np.full(n, np.nan, dtype=np.float64)
+        duration = np.zeros(n, dtype=np.int32)
+        stops = np.zeros(n, dtype=np.int16)
+        departure = []
+        arrival = []
+        airline = np.empty(n, dtype=object)
+        raw = np.empty(n, dtype=object)
+
+        for i, offer in enumerate(offers):
+            raw[i] = offer
+            try:
+                price[i] = float(offer["price"]["total"])
+            except (KeyError, TypeError, ValueError):
+                pass
+            itineraries = offer.get("itineraries") or []
+            segments = itineraries[0].get("segments", []) if itineraries else []
+            duration[i] = sum(_duration_minutes(it.get("duration", "")) for it in itineraries)
+            stops[i] = sum(max(len(it.get("segments", [])) - 1, 0) for it in itineraries)
+            departure.append(segments[0]["departure"]["at"] if segments else "NaT")
+            arrival.append(segments[-1]["arrival"]["at"] if segments else "NaT")
+            code = segments[0].get("carrierCode", "") if segments else ""
+            airline[i] = carrier_names.get(code, code)
+
+        columns = {
+            "price": price,
+            "duration": duration,
+            "stops": stops,
+            "departure": np.array(departure, dtype="datetime64[m]"),
+            "arrival": np.array(arrival, dtype="datetime64[m]"),
+            "airline": airline,
+            "raw": raw,
+        }
+        return cls(columns, dictionaries=dictionaries)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def column(self, name: str) -> np.ndarray:
+        """Values of a column for the rows in this view."""
+        return self._columns[name][self._index]
+
+    def _view(self, index: np.ndarray) -> "OffersTable":
+        return OffersTable(self._columns, index, self.dictionaries)
+
+    def filter(self, max_price: Optional[float] = None, max_stops: Optional[int] = None,
+               max_duration: Optional[int] = None, depart_after: Optional[str] = None,
+               depart_before: Optional[str] = None, mask: Optional[np.ndarray] = None) -> "OffersTable":
+        """
+        Keep rows matching every given constraint. Times are "HH:MM" (time of
+        day) or full ISO datetimes; durations are minutes.
+        """
+        keep = np.ones(len(self._index), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        if max_price is not None:
+            keep &= self.column("price") <= max_price
+        if max_stops is not None:
+            keep &= self.column("stops") <= max_stops
+        if max_duration is not None:
+            keep &= self.column("duration") <= max_duration
+        if depart_after or depart_before:
+            departure = self.column("departure")
+            if depart_after:
+                keep &= self._time_key(departure, depart_after) >= 0
+            if depart_before:
+                keep &= self._time_key(departure, depart_before) <= 0
+        return self._view(self._index[keep])
+
+    @staticmethod
+    def _time_key(values: np.ndarray, bound: str) -> np.ndarray:
+        """Sign of (value - bound), comparing only the time of day for "HH:MM" bounds."""
+        if len(bound) <= 5:
+            hours, minutes = bound.split(":")
+            minute_of_day = (values - values.astype("datetime64[D]")).astype(np.int64)
+            return minute_of_day - (int(hours) * 60 + int(minutes))
+        return (values - np.datetime64(bound, "m")).astype(np.int64)
+
+    def sort_by(self, column: str, descending: bool = False) -> "OffersTable":
+        values = self.column(column)
+        order = np.argsort(values, kind="stable")
+        if descending:
+            order = order[::-1]
+        return self._view(self._index[order])
+
+    def top_k(self, column: str, k: int, descending: bool = False) -> "OffersTable":
+        """The k best rows by a column, via argpartition then a sort of only those k."""
+        values = self.column(column)
+        if descending:
+            values = -values.astype(np.float64)
+        if k < len(values):
+            part = np.argpartition(values, k)[:k]
+            order = part[np.argsort(values[part], kind="stable")]
+        else:
+            order = np.argsort(values, kind="stable")
+        return self._view(self._index[order])
+
+    def union(self, other: "OffersTable") -> "OffersTable":
+        """Rows of either view (same underlying table), in first-seen order."""
+        combined = np.concatenate((self._index, other._index))
+        _, first = np.unique(combined, return_index=True)
+        return self._view(combined[np.sort(first)])
+
+    def head(self, n: int) -> "OffersTable":
+        return self._view(self._index[:n])
+
+    def to_response(self) -> dict:
+        """Amadeus-shaped response holding references to this view's raw offers."""
+        return {"data": list(self.column("raw")), "dictionaries": self.dictionaries}
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Rows in the shape print_flights_table expects, produced lazily."""
+        cols = self._columns
+        for i in self._index.tolist():
+            minutes = int(cols["duration"][i])
+            yield {
+                "airline": cols["airline"][i],
+                "price": f"{cols['price'][i]:.2f}",
+                "duration": f"{minutes // 60}h {minutes % 60:02d}m",
+                "departure_time": str(cols["departure"][i]),
+                "arrival_time": str(cols["arrival"][i]),
+                "stops": int(cols["stops"][i]),
+            }
+
+
+def _synthetic_response(n: int, seed: int = 5) -> dict:
+    """Amadeus-shaped response with n random offers used for benchmarking."""
+    rng = np.random.default_rng(seed)
+    carriers = ["AI", "6E", "UK", "EK", "LH", "BA", "AF", "QR"]
+    offers = []
+    for i in range(n):
+        n_segments = int(rng.integers(1, 4))
+        hour = int(rng.integers(0, 24))
+        minutes = int(rng.integers(60, 1200))
+        segments = [{
+            "departure": {"iataCode": "DEL", "at": f"2025-03-0{1 + s}T{hour:02d}:{s * 10:02d}:00"},
+            "arrival": {"iataCode": "CDG", "at": f"2025-03-0{2 + s}T{(hour + 3) % 24:02d}:00:00"},
+            "carrierCode": carriers[int(rng.integers(0, len(carriers)))],
+        } for s in range(n_segments)]
+        offers.append({
+            "id": str(i),
+            "itineraries": [{"duration": f"PT{minutes // 60}H{minutes % 60}M", "segments": segments}],
+            "price": {"currency": "EUR", "total": f"{rng.uniform(80, 1500):.2f}"},
+        })
+    return {"data": offers, "dictionaries": {"carriers": {c: c for c in carriers}}}
+
+
+if __name__ == "__main__":
+    # Benchmark at 10k offers: columnar operations vs walking the offer dicts
+    response = _synthetic_response(10_000)
+
+    started = time.perf_counter()
+    table = OffersTable.from_amadeus(response)
+    parse_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for _ in range(100):
+        view = table.filter(max_price=800, max_stops=1, depart_after="06:00", depart_before="22:00")
+        best = view.top_k("price", 10)
+    columnar_ms = (time.perf_counter() - started) * 10
+
+    started = time.perf_counter()
+    for _ in range(100):
+        matches = []
+        for o in response["data"]:
+            segments = o["itineraries"][0]["segments"]
+            dep = segments[0]["departure"]["at"][11:16]
+            if (float(o["price"]["total"]) <= 800 and len(segments) - 1 <= 1
+                    and "06:00" <= dep <= "22:00"):
+                matches.append(o)
+        best_loop = sorted(matches, key=lambda o: float(o["price"]["total"]))[:10]
+    loop_ms = (time.perf_counter() - started) * 10
+
+    assert [r["id"] for r in best.column("raw")] == [o["id"] for o in best_loop]
+    print(f"parse 10k offers once: {parse_ms:.1f} ms")
+    print(f"filter + top-10, columnar: {columnar_ms:.2f} ms/query ({len(view)} matches)")
+    print(f"filter + top-10, dict loop: {loop_ms:.2f} ms/query")
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+
+from transport_agents import API_helper
+from transport_agents.provider_scheduler import Priority, priority
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+# Departure days searched ahead while the user is still asked for a date
+PREFETCH_DAYS = int(os.getenv("PREFETCH_DAYS", "3"))
+# Speculative provider calls allowed per rolling hour, across all sessions
+PREFETCH_BUDGET_PER_HOUR = int(os.getenv("PREFETCH_BUDGET_PER_HOUR", "120"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+# A prefetched route/date counts as used if it is searched within this time
+PREFETCH_TRACK_SECONDS = API_helper.OFFER_CACHE_TTL
+
+
+class Prefetcher:
+    """
+    Speculative flight searches from a partially filled trip.
+
+    Once the parser knows origin and destination and the mode is (or is
+    inferred as) flight, but is still asking for the departure date, the
+    next PREFETCH_DAYS days are searched in the background at PREFETCH
+    priority into the offer cache, so the search after the user answers is
+    usually a cache hit. Trains and buses have no response cache to warm.
+    Speculative calls are capped per rolling hour; `observe` is called by
+    the flight node before each real search to measure hit rates.
+    """
+
+    def __init__(self, days: int = PREFETCH_DAYS, budget_per_hour: int = PREFETCH_BUDGET_PER_HOUR,
+                 workers: int = PREFETCH_WORKERS):
+        self.days = days
+        self.budget_per_hour = budget_per_hour
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._spent = deque()
+        self._issued: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.skipped_budget = 0
+        self.skipped_cached = 0
+        self.failed = 0
+        self.searches = 0
+        self.hits = 0
+        self.joined = 0
+
+    def candidates(self, trip: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+        """Likely (origin, destination, date) completions of a partial trip."""
+        origin, destination = (trip.get("origin") or "").strip(), (trip.get("destination") or "").strip()
+        mode = (trip.get("mode") or "flight").strip().lower()
+        if not origin or not destination or "flight" not in mode or trip.get("return_date"):
+            return []
+        if (trip.get("departure_date") or "").strip():
+            return []
+        today = date.today()
+        return [(origin, destination, (today + timedelta(days=d)).isoformat()) for d in range(1, self.days + 1)]
+
+    def _take_budget(self) -> bool:
+        now = time.monotonic()
+        while self._spent and now - self._spent[0] > 3600:
+            self._spent.popleft()
+        if len(self._spent) >= self.budget_per_hour:
+            return False
+        self._spent.append(now)
+        return True
+
+    def maybe_prefetch(self, trip: Dict[str, Any]) -> int:
+        """Queue background searches for the trip's likely completions; returns how many were queued."""
+        if not PREFETCH_ENABLED:
+            return 0
+        queued = []
+        for origin, destination, day in self.candidates(trip):
+            key, error = API_helper._prepare_search(origin, destination, day)
+            if error:
+                continue
+            with self._lock:
+                if key in self._issued or API_helper._offer_cache_get(key) is not None:
+                    self.skipped_cached += 1
+                    continue
+                if not self._take_budget():
+                    self.skipped_budget += 1
+                    continue
+                self._issued[key] = time.time()
+                self.issued += 1
+            queued.append(key)
+            self._pool.submit(self._run, key)
+        if queued:
+            print(f"DEBUG: Prefetching {len(queued)} flight searches: {', '.join('-'.join(k) for k in queued)}")
+        return len(queued)
+
+    def _run(self, key: tuple):
+        try:
+            with priority(Priority.PREFETCH):
+                result = API_helper.search_flights(*key, API_helper.get_access_token())
+            if "error" in result:
+                raise RuntimeError(result.get("message"))
+        except Exception as e:
+            print(f"DEBUG: Prefetch {key} failed: {e}")
+            with self._lock:
+                self.failed += 1
+                self._issued.pop(key, None)
+
+    def observe(self, origin: str, destination: str, day: str):
+        """Record a real one-way search: was it warmed by a prefetch?"""
+        key, error = API_helper._prepare_search(origin, destination, day)
+        if error:
+            return
+        cached = API_helper._offer_cache_get(key) is not None
+        with self._lock:
+            self.searches += 1
+            now = time.time()
+            for stale in [k for k, t in self._issued.items() if now - t > PREFETCH_TRACK_SECONDS]:
+                del self._issued[stale]
+            if self._issued.pop(key, None) is not None:
+                if cached:
+                    self.hits += 1
+                else:
+                    # Still in flight: the search joins it through the request coalescer
+                    self.joined += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            used = self.hits + self.joined
+            return {
+                "issued": self.issued,
+                "skipped_budget": self.skipped_budget,
+                "skipped_cached": self.skipped_cached,
+                "failed": self.failed,
+                "searches": self.searches,
+                "hits": self.hits,
+                "joined_in_flight": self.joined,
+                "hit_rate": round(used / self.searches, 3) if self.searches else 0.0,
+                "precision": round(used / self.issued, 3) if self.issued else 0.0,
+                "spent_last_hour": len(self._spent),
+            }
+
+    def stats_line(self) -> str:
+        m = self.metrics()
+        return (f"prefetch: {m['issued']} issued, {m['hits'] + m['joined_in_flight']} used, "
+                f"hit rate {m['hit_rate'] * 100:.0f}%, precision {m['precision'] * 100:.0f}%")
+
+
+prefetcher = Prefetcher()
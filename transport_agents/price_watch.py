@@ -0,0 +1,379 @@
+import itertools
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from transport_agents.API_helper import _prepare_search, _fetch_flight_offers, _flight_requests, get_access_token
+from transport_agents.date_resolver import resolve_date
+from transport_agents.provider_scheduler import Priority, priority
+from transport_agents.time_phrases import mentions_date
+from transport_agents.train_agent import _fetch_live_station, _station_requests, resolve_city_code
+
+WATCH_INTERVAL = float(os.getenv("PRICE_WATCH_INTERVAL", "1800"))
+WATCH_WORKERS = int(os.getenv("PRICE_WATCH_WORKERS", "4"))
+MAX_PENDING_NOTIFICATIONS = 50
+
+
+def _fetch_flight(query: Tuple[str, str, str]) -> Dict[str, Any]:
+    # Goes through the shared coalescer and refreshes the offer cache for interactive searches
+    return _flight_requests.do(query, _fetch_flight_offers, *query, get_access_token())
+
+
+def _fetch_train(query: Tuple[str, str]) -> Dict[str, Any]:
+    api_key = os.getenv("RAPIDAPI_KEY")
+    if not api_key:
+        return {"error": "MISSING_API_KEY", "message": "RAPIDAPI_KEY is not set", "data": []}
+    return _station_requests.do(query, _fetch_live_station, *query, api_key)
+
+
+# One provider call per unique query per poll; replaceable for stubs
+FETCHERS: Dict[str, Callable[[tuple], Dict[str, Any]]] = {
+    "flight": _fetch_flight,
+    "train": _fetch_train,
+}
+
+
+def _flight_view(snapshot: Dict[str, Any], sub: "Subscription"):
+    """(cheapest total, currency) of a flight-offers response."""
+    prices = [(float(o["price"]["total"]), o["price"].get("currency", ""))
+              for o in snapshot.get("data") or [] if o.get("price", {}).get("total")]
+    return min(prices) if prices else None
+
+
+def _train_view(snapshot: Dict[str, Any], sub: "Subscription"):
+    """Trains of the live-station listing that run on the subscription's weekday."""
+    day = resolve_date(sub.date)
+    if not day:
+        return None
+    weekday = day.strftime("%a").lower()[:3]
+    return tuple(sorted(
+        f"{t.get('trainName')} ({t.get('trainNumber')}) at {t.get('departureTime')}"
+        for t in snapshot.get("data") or [] if t.get("runDays", {}).get(weekday, False)
+    ))
+
+
+VIEWS = {"flight": _flight_view, "train": _train_view}
+
+
+@dataclass
+class Subscription:
+    id: int
+    session_id: str
+    mode: str
+    query: tuple
+    date: str
+    threshold: Optional[float] = None
+    callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    last_seen: Any = None
+
+
+class PriceWatch:
+    """
+    Route watchlist with deduplicated background polling.
+
+    Sessions subscribe to (route, date, threshold). Each poll groups the
+    subscriptions by provider query, fetches every unique query once at
+    BACKGROUND priority, and compares each subscriber's view of the new
+    snapshot (cheapest fare, or trains running that day) with what it saw
+    last. Subscribers are notified only when their view changed and, for
+    flights with a threshold, the cheapest fare is at or below it. Provider
+    calls scale with unique routes, not with subscribers.
+    """
+
+    def __init__(self, interval: float = WATCH_INTERVAL, workers: int = WATCH_WORKERS):
+        self.interval = interval
+        self.workers = workers
+        self._subs: Dict[int, Subscription] = {}
+        self._snapshots: Dict[tuple, Dict[str, Any]] = {}
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.polls = 0
+        self.provider_calls = 0
+        self.notified = 0
+
+    def _query(self, mode: str, origin: str, destination: str, date: str):
+        if mode == "flight":
+            return _prepare_search(origin, destination, date)
+        if mode == "train":
+            if not resolve_date(date):
+                return None, {"error": "INVALID_DATE", "message": f"Could not parse date: {date}", "data": []}
+            return (resolve_city_code(origin), resolve_city_code(destination)), None
+        return None, {"error": "UNSUPPORTED_MODE", "message": f"Cannot watch {mode} routes", "data": []}
+
+    def subscribe(self, session_id: str, origin: str, destination: str, date: str,
+                  threshold: Optional[float] = None, mode: str = "flight",
+                  callback: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """Returns (subscription id, None) or (None, error result)."""
+        mode = (mode or "flight").lower()
+        query, error = self._query(mode, origin, destination, date)
+        if error:
+            return None, error
+        sub = Subscription(next(self._ids), session_id, mode, query, date, threshold, callback)
+        with self._lock:
+            snapshot = self._snapshots.get((mode, query))
+            # Subscribers joining a watched route start from its current state
+            if snapshot is not None:
+                sub.last_seen = VIEWS[mode](snapshot, sub)
+            self._subs[sub.id] = sub
+        print(f"DEBUG: Watching {mode} {query} on {date} for session {session_id} (#{sub.id})")
+        return sub.id, None
+
+    def unsubscribe(self, subscription_id: int):
+        with self._lock:
+            sub = self._subs.pop(subscription_id, None)
+            if sub and not any(s.mode == sub.mode and s.query == sub.query for s in self._subs.values()):
+                self._snapshots.pop((sub.mode, sub.query), None)
+
+    def unsubscribe_session(self, session_id: str) -> int:
+        """Drop every subscription and queued notification of a session; returns how many were watched."""
+        with self._lock:
+            ids = [s.id for s in self._subs.values() if s.session_id == session_id]
+            self._pending.pop(session_id, None)
+        for sub_id in ids:
+            self.unsubscribe(sub_id)
+        return len(ids)
+
+    def notifications(self, session_id: str) -> List[Dict[str, Any]]:
+        """Drain the notifications queued for a session."""
+        with self._lock:
+            return self._pending.pop(session_id, [])
+
+    def _poll_query(self, mode: str, query: tuple):
+        try:
+            with priority(Priority.BACKGROUND):
+                return FETCHERS[mode](query)
+        except Exception as e:
+            return {"error": "POLL_ERROR", "message": str(e), "data": []}
+
+    def poll_once(self) -> int:
+        """Poll every watched query once; returns the number of notifications sent."""
+        with self._lock:
+            groups: Dict[tuple, List[Subscription]] = {}
+            for sub in self._subs.values():
+                groups.setdefault((sub.mode, sub.query), []).append(sub)
+        if not groups:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(groups))) as pool:
+            snapshots = dict(zip(groups, pool.map(lambda key: self._poll_query(*key), groups)))
+
+        sent = []
+        with self._lock:
+            self.polls += 1
+            self.provider_calls += len(groups)
+            for key, snapshot in snapshots.items():
+                if "error" in snapshot:
+                    print(f"DEBUG: Watch poll {key} failed: {snapshot.get('message')}")
+                    continue
+                self._snapshots[key] = snapshot
+                for sub in groups[key]:
+                    if sub.id not in self._subs:
+                        continue
+                    view = VIEWS[sub.mode](snapshot, sub)
+                    if view == sub.last_seen:
+                        continue
+                    previous, sub.last_seen = sub.last_seen, view
+                    if previous is None or not self._wanted(sub, view):
+                        continue
+                    note = {"subscription_id": sub.id, "session_id": sub.session_id, "mode": sub.mode,
+                            "query": sub.query, "date": sub.date, "previous": previous, "current": view,
+                            "checked_at": time.time()}
+                    if sub.callback is None:
+                        queue = self._pending.setdefault(sub.session_id, [])
+                        queue.append(note)
+                        del queue[:-MAX_PENDING_NOTIFICATIONS]
+                    sent.append((sub, note))
+            self.notified += len(sent)
+
+        for sub, note in sent:
+            if sub.callback is not None:
+                try:
+                    sub.callback(note)
+                except Exception as e:
+                    print(f"DEBUG: Watch callback #{sub.id} failed: {e}")
+        if sent:
+            print(f"DEBUG: Watch poll: {len(groups)} queries for {sum(map(len, groups.values()))} subscriptions, {len(sent)} notifications")
+        return len(sent)
+
+    @staticmethod
+    def _wanted(sub: Subscription, view) -> bool:
+        if sub.mode == "flight" and sub.threshold is not None:
+            return view is not None and view[0] <= sub.threshold
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"DEBUG: Watch poll failed: {e}")
+
+    def start(self):
+        """Start the background poller (daemon thread)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="price-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscriptions": len(self._subs),
+                "unique_queries": len({(s.mode, s.query) for s in self._subs.values()}),
+                "polls": self.polls,
+                "provider_calls": self.provider_calls,
+                "notifications": self.notified,
+            }
+
+
+watchlist = PriceWatch()
+
+
+# Watch requests on the current trip are recognised without the LLM parser
+_WATCH_RE = re.compile(r"\b(watch|track|monitor|keep an eye on|alert me|notify me)\b", re.I)
+# Only an adjacent "stop watching"/"cancel the alerts"; "non-stop" and "1 stop" are stop limits
+_UNWATCH_RE = re.compile(
+    r"\bunwatch\b|(?<!non)(?<!non-)(?<!non )(?<!\d)(?<!\d )(?<!one )(?<!two )"
+    r"\b(?:stop|cancel|end|turn off|no more|don'?t)\s+(?:(?:the|my|all|all the|these|those|this)\s+)?"
+    r"(?:watch(?:ing|es)?|track(?:ing)?|monitor(?:ing)?|alerts?|alerting me|notifications?|notify(?:ing)? me)\b", re.I)
+_WATCH_TARGET_RE = re.compile(r"\b(route|price|prices|fare|fares|flights?|trains?|this|it)\b", re.I)
+# A request naming a destination, origin or date goes through the parser first
+_NEW_ROUTE_RE = re.compile(
+    r"\b(?:to|from|via)\s+(?!(?:\d|below\b|under\b|less\b|around\b|me\b|it\b|this\b|that\b|the (?:price|fare)s?\b))"
+    r"[a-z]", re.I)
+_THRESHOLD_RE = re.compile(r"(?:below|under|less than|drops? (?:to|below|under)|at most|cheaper than)\s*"
+                           r"(?:rs\.?|inr|eur|usd|[$€£₹])?\s*(\d[\d,]*(?:\.\d+)?)"
+                           r"(?!\s*(?:[\d,:]|stops?\b|hours?\b|h\b|min\w*\b))", re.I)
+
+
+def parse_watch(text: str) -> Optional[Tuple[str, Optional[float]]]:
+    """("watch", threshold) or ("unwatch", None) for a watch request, None otherwise."""
+    text = (text or "").strip()
+    if _UNWATCH_RE.search(text):
+        return "unwatch", None
+    if _WATCH_RE.search(text) and _WATCH_TARGET_RE.search(text) \
+            and not _NEW_ROUTE_RE.search(text) and not mentions_date(text):
+        threshold = _THRESHOLD_RE.search(text)
+        return "watch", float(threshold.group(1).replace(",", "")) if threshold else None
+    return None
+
+
+def _latest_query(messages: list) -> str:
+    for msg in reversed(messages or []):
+        if isinstance(msg, HumanMessage):
+            return str(msg.content)
+    return ""
+
+
+def wants_watch(state: Dict[str, Any]) -> bool:
+    return parse_watch(_latest_query(state.get("messages"))) is not None
+
+
+def format_notification(note: Dict[str, Any]) -> str:
+    route = " → ".join(note["query"][:2])
+    if note["mode"] == "flight":
+        (price, currency), previous = note["current"], note["previous"]
+        was = f" (was {previous[0]:.2f} {previous[1]})" if previous else ""
+        return f"🔔 {route} on {note['date']}: cheapest fare is now {price:.2f} {currency}{was}"
+    return (f"🔔 {route} on {note['date']}: {len(note['current'] or ())} trains now running "
+            f"(was {len(note['previous'] or ())})")
+
+
+def notification_messages(session_id: str) -> List[AIMessage]:
+    """Drain a session's queued watch notifications as assistant messages, for the start of a turn."""
+    return [AIMessage(content=format_notification(note)) for note in watchlist.notifications(session_id)]
+
+
+def watch_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Graph node: watch the current trip's route, or stop the session's watches."""
+    messages = state.get("messages") or []
+    query = _latest_query(messages)
+    intent = parse_watch(query)
+    if intent is None:
+        return {**state, "next_agent": "query_parser"}
+    session_id = state.get("session_id") or "default"
+    action, threshold = intent
+
+    if action == "unwatch":
+        count = watchlist.unsubscribe_session(session_id)
+        response_msg = f" Stopped watching {count} route{'s' if count != 1 else ''}." if count \
+            else " You are not watching any routes."
+    elif not (state.get("origin") and state.get("destination") and state.get("departure_date")):
+        response_msg = " Tell me the route and date first, then ask me to watch it."
+    else:
+        mode = state.get("mode") or "flight"
+        mode = str(getattr(mode, "value", mode)).strip().lower() or "flight"
+        route = f"{state['origin']} to {state['destination']} on {state['departure_date']}"
+        sub_id, error = watchlist.subscribe(session_id, state["origin"], state["destination"], state["departure_date"],
+                                            threshold if mode == "flight" else None, mode)
+        if error:
+            response_msg = f" Could not watch {route}: {error.get('message')}"
+        else:
+            watchlist.start()
+            if mode == "flight" and threshold is not None:
+                response_msg = f" Watching flights from {route}. I'll let you know when the cheapest fare is {threshold:g} or less."
+            else:
+                response_msg = f" Watching {mode}s from {route}. I'll let you know when that changes."
+
+    print(f"\n{response_msg}")
+    return {
+        **state,
+        "user_query": query,
+        "messages": messages + [AIMessage(content=response_msg)],
+        "next_agent": "end",
+        "needs_user_input": False
+    }
+
+
+async def awatch_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    # Subscribing resolves codes from local tables; polling runs in the background thread
+    return watch_node(state)
+
+
+if __name__ == "__main__":
+    # 2000 sessions watching 25 routes with a stubbed provider whose fares drift
+    import contextlib
+    import io
+    import random
+    from datetime import date, timedelta
+
+    rng = random.Random(3)
+    calls = []
+
+    def fake_flights(query):
+        calls.append(query)
+        base = 100 + 10 * (hash(query) % 20)
+        return {"data": [{"price": {"total": f"{base + rng.choice([-15, 0, 0, 0, 20]) + i * 5:.2f}", "currency": "EUR"}}
+                         for i in range(10)]}
+
+    FETCHERS["flight"] = fake_flights
+    cities = ["DEL", "BOM", "MAA", "CCU", "BLR"]
+    day = (date.today() + timedelta(days=30)).isoformat()
+    demo = PriceWatch(interval=0.05)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for session in range(2000):
+            origin, destination = rng.sample(cities, 2)
+            demo.subscribe(f"s{session}", origin, destination, day, rng.choice([None, 150.0, 250.0]))
+        demo.start()
+        time.sleep(0.5)
+        demo.stop()
+    m = demo.metrics()
+    print(m)
+    print(f"{m['provider_calls']} provider calls over {m['polls']} polls "
+          f"({m['provider_calls'] / max(m['polls'], 1):.0f}/poll for {m['subscriptions']} subscriptions)")
+    print("s1:", demo.notifications("s1")[:1])
@@ -0,0 +1,229 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Callable, Dict, Optional
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    PREFETCH = 1
+    BACKGROUND = 2
+
+
+class ProviderBusyError(Exception):
+    """Raised when a request could not get a provider slot within its wait budget."""
+
+
+# (sustained requests per second, burst size) per provider
+PROVIDER_LIMITS = {
+    "amadeus": (float(os.getenv("AMADEUS_RATE_PER_SEC", "10")), int(os.getenv("AMADEUS_BURST", "10"))),
+    "irctc": (float(os.getenv("IRCTC_RATE_PER_SEC", "2")), int(os.getenv("IRCTC_BURST", "5"))),
+    "gemini": (float(os.getenv("GEMINI_RATE_PER_SEC", "0.25")), int(os.getenv("GEMINI_BURST", "5"))),
+}
+MAX_QUEUE_WAIT = float(os.getenv("PROVIDER_MAX_QUEUE_WAIT", "30"))
+ASYNC_POLL_INTERVAL = 0.01
+
+_current_priority = contextvars.ContextVar("provider_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def priority(level: Priority):
+    """Run provider calls made inside the block at the given priority."""
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_token(self) -> float:
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+
+class _Provider:
+    def __init__(self, rate: float, capacity: int):
+        self.bucket = TokenBucket(rate, capacity)
+        self.cond = threading.Condition()
+        self.queue = []
+        self.waits = {p: deque(maxlen=1000) for p in Priority}
+        self.granted = 0
+        self.rejected = 0
+
+
+class ProviderScheduler:
+    """
+    Central rate limiter for external providers.
+
+    Each provider has a token bucket and a priority queue of waiting callers.
+    A caller is served once it is at the head of the queue (lowest priority
+    value, then arrival order) and a token is available, so interactive turns
+    overtake prefetch and background work. Callers wait rather than fail,
+    until their wait budget runs out.
+    """
+
+    def __init__(self, limits: Dict[str, tuple]):
+        self._providers = {name: _Provider(rate, burst) for name, (rate, burst) in limits.items()}
+        self._seq = itertools.count()
+
+    def set_limit(self, provider: str, rate: float, burst: int):
+        """Add a provider or replace its rate limit."""
+        self._providers[provider] = _Provider(rate, burst)
+
+    def acquire(self, provider: str, level: Optional[Priority] = None, max_wait: float = MAX_QUEUE_WAIT) -> float:
+        """Block until the provider may be called; returns the time spent queued."""
+        p = self._providers.get(provider)
+        if p is None:
+            return 0.0
+        level = _current_priority.get() if level is None else level
+        ticket = (int(level), next(self._seq))
+        started = time.monotonic()
+        deadline = started + max_wait
+
+        with p.cond:
+            heapq.heappush(p.queue, ticket)
+            try:
+                while True:
+                    if p.queue[0] == ticket and p.bucket.try_take():
+                        heapq.heappop(p.queue)
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        p.rejected += 1
+                        raise ProviderBusyError(f"{provider} rate limit: no slot within {max_wait:g}s")
+                    wait = p.bucket.time_until_token() if p.queue[0] == ticket else remaining
+                    p.cond.wait(timeout=min(max(wait, 0.001), remaining))
+            except ProviderBusyError:
+                p.queue.remove(ticket)
+                heapq.heapify(p.queue)
+                raise
+            finally:
+                p.cond.notify_all()
+
+            waited = time.monotonic() - started
+            p.granted += 1
+            p.waits[level].append(waited)
+        return waited
+
+    def run(self, provider: str, fn: Callable, *args, level: Optional[Priority] = None, **kwargs) -> Any:
+        self.acquire(provider, level)
+        return fn(*args, **kwargs)
+
+    async def aacquire(self, provider: str, level: Optional[Priority] = None, max_wait: float = MAX_QUEUE_WAIT) -> float:
+        """
+        Async variant sharing the same queue as `acquire`; waits with
+        asyncio.sleep so queued coroutines never hold a thread.
+        """
+        p = self._providers.get(provider)
+        if p is None:
+            return 0.0
+        level = _current_priority.get() if level is None else level
+        ticket = (int(level), next(self._seq))
+        started = time.monotonic()
+        deadline = started + max_wait
+
+        with p.cond:
+            heapq.heappush(p.queue, ticket)
+        try:
+            while True:
+                with p.cond:
+                    if p.queue[0] == ticket and p.bucket.try_take():
+                        heapq.heappop(p.queue)
+                        p.cond.notify_all()
+                        break
+                    wait = p.bucket.time_until_token() if p.queue[0] == ticket else ASYNC_POLL_INTERVAL
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ProviderBusyError(f"{provider} rate limit: no slot within {max_wait:g}s")
+                await asyncio.sleep(min(max(wait, 0.001), ASYNC_POLL_INTERVAL, remaining))
+        except BaseException as e:
+            with p.cond:
+                if ticket in p.queue:
+                    p.queue.remove(ticket)
+                    heapq.heapify(p.queue)
+                if isinstance(e, ProviderBusyError):
+                    p.rejected += 1
+                p.cond.notify_all()
+            raise
+
+        waited = time.monotonic() - started
+        with p.cond:
+            p.granted += 1
+            p.waits[level].append(waited)
+        return waited
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per provider: granted/rejected/queued counts and queue wait stats (ms) per priority."""
+        report = {}
+        for name, p in self._providers.items():
+            with p.cond:
+                waits = {}
+                for level, samples in p.waits.items():
+                    if not samples:
+                        continue
+                    ordered = sorted(samples)
+                    waits[level.name.lower()] = {
+                        "count": len(ordered),
+                        "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 1),
+                        "max_ms": round(ordered[-1] * 1000, 1),
+                    }
+                report[name] = {
+                    "granted": p.granted,
+                    "rejected": p.rejected,
+                    "queued": len(p.queue),
+                    "wait": waits,
+                }
+        return report
+
+
+scheduler = ProviderScheduler(PROVIDER_LIMITS)
+
+
+if __name__ == "__main__":
+    # 30 background requests are queued first, then 5 interactive ones arrive;
+    # the interactive ones are served ahead of the backlog
+    from concurrent.futures import ThreadPoolExecutor
+
+    demo = ProviderScheduler({"stub": (20.0, 2)})
+
+    def call(level):
+        demo.acquire("stub", level)
+        return level
+
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        futures = [pool.submit(call, Priority.BACKGROUND) for _ in range(30)]
+        time.sleep(0.2)
+        futures += [pool.submit(call, Priority.INTERACTIVE) for _ in range(5)]
+        [f.result() for f in futures]
+
+    for name, stats in demo.metrics().items():
+        print(name, stats)
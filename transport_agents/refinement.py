@@ -0,0 +1,332 @@
+"""
+Local refinement of the last search.
+
+Follow-ups such as "something earlier", "only non-stop" or "cheaper than
+500" that name no route, mode or date and ask no question are recognised
+without the LLM parser and answered by filtering and re-sorting the
+results already fetched for the session: the flight search's cached
+provider response or the cached train listing. No provider or LLM call is made. Only when a refinement
+widens the original search (e.g. allows stops the search excluded) or the
+cached offers were truncated and nothing in them matches does the turn go
+back to the search agent, with the new constraints pushed down to the
+provider.
+"""
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from dataclasses import dataclass
+from langchain_core.messages import AIMessage, HumanMessage
+
+from transport_agents import API_helper
+from transport_agents.LLM_helper import print_flights_table
+from transport_agents.offers_table import OffersTable
+from transport_agents.search_filters import SearchFilters
+from transport_agents.time_phrases import DATE_RE, clock, minute_of, minutes, time_window
+from transport_agents.train_enrichment import fill_from_cache, format_train_row, train_results_cache
+
+# Trip fields the refinement reads and rewrites
+FILTER_FIELDS = ("max_price", "max_stops", "cabin", "airlines", "departure_time")
+REFINED_RESULTS = 10
+
+# A bound is a price only with a currency or a price word in the message, and
+# never when a unit follows ("max 1 stop", "under 3 hours")
+_PRICE_RE = re.compile(r"(?:cheaper than|under|below|less than|at most|max(?:imum)?|up to|within|budget(?: of)?)\s*"
+                       r"(rs\.?|inr|eur|usd|[$€£₹])?\s*(\d[\d,]*)"
+                       r"(?!\s*(?:[\d,:]|stops?\b|connections?\b|layovers?\b|hours?\b|hrs?\b|h\b|min(?:ute)?s?\b|am\b|pm\b))"
+                       r"\s*(rs\b|inr\b|eur\b|usd\b|euros?\b|dollars?\b|rupees?\b)?", re.I)
+_PRICE_WORD_RE = re.compile(r"\b(cheap\w*|price[sd]?|budget|costs?|costing|fares?|pay|spend)\b", re.I)
+_STOPS_RE = re.compile(r"(?:at most|max(?:imum)?|no more than|up to)\s+(one|two|1|2)\s+stops?|\b(one|1)[- ]stop\b", re.I)
+_NONSTOP_RE = re.compile(r"non[- ]?stop|\bdirect\b", re.I)
+_EARLIER_RE = re.compile(r"\bearlier\b", re.I)
+_LATER_RE = re.compile(r"\blater\b", re.I)
+_SORTS = [
+    ("duration", re.compile(r"\b(fast(er|est)?|quick(er|est)?|short(er|est))\b", re.I)),
+    ("price", re.compile(r"\b(cheap(er|est)?|lowest price|budget)\b", re.I)),
+    ("departure", re.compile(r"\bearliest\b", re.I)),
+]
+# A new route, mode, date or trip shape, a booking or a question goes through the parser instead
+_ROUTE_RE = re.compile(
+    r"\b(?:to|from|via|into)\s+(?!(?:\d|one\b|two\b|three\b|the (?:list|results?|ones?)\b|these\b|those\b|them\b|"
+    r"this\b|that\b|what\b|above\b|be\b|leave\b|depart\b|arrive\b|fly\b|go\b|travel\b|get\b|see\b|have\b|pay\b|"
+    r"spend\b|take\b|show\b|keep\b|stay\b|noon\b|midnight\b|morning\b|afternoon\b|evening\b|night\b))[a-z]", re.I)
+_MODE_RE = re.compile(r"\b(flights?|fly|flying|planes?|airlines?|trains?|rail|bus(?:es)?|coach(?:es)?)\b", re.I)
+_TRIP_RE = re.compile(r"\b(return|round[- ]trip|one[- ]way|instead|business|economy|first class)\b", re.I)
+_INTENT_RE = re.compile(
+    r"\b(book\w*|reserve|reservation|buy|purchase|what|which|why|how|where|when|who|can i|could i|should i)\b|"
+    r"^\s*(is|are|was|were|do|does|did|will|would|has|have)\b", re.I)
+_NEW_SEARCH = (_ROUTE_RE, _MODE_RE, DATE_RE, _TRIP_RE, _INTENT_RE)
+_NUMBERS = {"one": 1, "two": 2}
+
+
+@dataclass(frozen=True)
+class Refinement:
+    max_price: Optional[int] = None
+    max_stops: Optional[int] = None
+    depart_after: Optional[str] = None
+    depart_before: Optional[str] = None
+    earlier: bool = False
+    later: bool = False
+    sort: Optional[str] = None
+
+
+def _price(text: str) -> Optional[int]:
+    for match in _PRICE_RE.finditer(text):
+        if match.group(1) or match.group(3) or _PRICE_WORD_RE.search(text):
+            return int(match.group(2).replace(",", ""))
+    return None
+
+
+def parse_refinement(text: str) -> Optional[Refinement]:
+    """Filter/sort operations in a follow-up message, or None if it is not a pure refinement."""
+    text = (text or "").strip()
+    if not text or any(pattern.search(text) for pattern in _NEW_SEARCH):
+        return None
+
+    # Stop limits first, so their numbers are not read as prices
+    stops, rest = None, text
+    nonstop = _NONSTOP_RE.search(text)
+    match = nonstop or _STOPS_RE.search(text)
+    if match:
+        rest = text[:match.start()] + " " + text[match.end():]
+    if nonstop:
+        stops = 0
+    elif match:
+        word = (match.group(1) or match.group(2)).lower()
+        stops = _NUMBERS.get(word, int(word) if word.isdigit() else 1)
+    price = _price(rest)
+
+    after, before = time_window(text)
+
+    sort = next((name for name, pattern in _SORTS if pattern.search(text)), None)
+    refinement = Refinement(
+        max_price=price,
+        max_stops=stops,
+        depart_after=after,
+        depart_before=before if before != "24:00" else "23:59",
+        earlier=bool(_EARLIER_RE.search(text)),
+        later=bool(_LATER_RE.search(text)),
+        sort=sort,
+    )
+    return refinement if refinement != Refinement() else None
+
+
+def trip_signature(state: Dict[str, Any]) -> List[str]:
+    """What must stay unchanged for earlier results to be refined."""
+    mode = state.get("mode") or ""
+    return [state.get("origin") or "", state.get("destination") or "", state.get("departure_date") or "",
+            state.get("return_date") or "", str(getattr(mode, "value", mode)).strip().lower()]
+
+
+def flight_source(state: Dict[str, Any], filters: SearchFilters, results: dict) -> Optional[Dict[str, Any]]:
+    """refine_source for a one-way flight search: where its full offer set is cached."""
+    if not results or results.get("error"):
+        return None
+    key = API_helper.offer_cache_key(state["origin"], state["destination"], state["departure_date"], filters)
+    if key is None:
+        return None
+    return {"mode": "flight", "key": list(key), "trip": trip_signature(state),
+            "fields": {f: state.get(f) or "" for f in FILTER_FIELDS}}
+
+
+def train_source(state: Dict[str, Any], rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """refine_source for a train search; the full rows are kept in train_results_cache."""
+    if not rows:
+        return None
+    key = (rows[0]["source"], rows[0]["destination"], rows[0]["date"])
+    train_results_cache.put(key, rows)
+    return {"mode": "train", "key": list(key), "trip": trip_signature(state), "fields": {}}
+
+
+def _latest_query(messages: list) -> str:
+    for msg in reversed(messages or []):
+        if isinstance(msg, HumanMessage):
+            return str(msg.content)
+    return ""
+
+
+def _window(current: SearchFilters, refinement: Refinement, shown: List[Dict[str, Any]]):
+    """Departure window after the refinement, as (after, before); None if it is empty."""
+    after, before = current.depart_after or "00:00", current.depart_before or "23:59"
+    if refinement.depart_after:
+        after = max(after, refinement.depart_after)
+    if refinement.depart_before:
+        before = min(before, refinement.depart_before)
+    # Relative to what is shown now; "earlier" after "later" moves the window back
+    departures = [m for m in (minute_of(r.get("departure_time")) for r in shown or []) if m is not None]
+    if refinement.earlier and departures:
+        after, before = refinement.depart_after or "00:00", min(before, clock(max(min(departures) - 1, 0)))
+    if refinement.later and departures:
+        after, before = max(after, clock(min(max(departures) + 1, 1439))), refinement.depart_before or "23:59"
+    return None if after > before else (after, before)
+
+
+class RefinementEngine:
+    """Answers refinements from the session's earlier results and counts how often that worked."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = 0
+        self.provider = 0
+        self.parser = 0
+        self.local_seconds = 0.0
+
+    def wants(self, state: Dict[str, Any]) -> bool:
+        """True when the new message can be tried as a refinement of the last results."""
+        source = state.get("refine_source")
+        return bool(source) and source.get("trip") == trip_signature(state) \
+            and parse_refinement(_latest_query(state.get("messages"))) is not None
+
+    def refine(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        messages = state.get("messages") or []
+        query = _latest_query(messages)
+        refinement = parse_refinement(query)
+        source = state.get("refine_source") or {}
+        if refinement is None or source.get("trip") != trip_signature(state):
+            return self._to_parser(state)
+        if source["mode"] == "train":
+            result = self._refine_trains(state, messages, query, refinement, source)
+        else:
+            result = self._refine_flights(state, messages, query, refinement, source)
+        if result.get("next_agent") == "end":
+            with self._lock:
+                self.local += 1
+                self.local_seconds += time.perf_counter() - started
+            print(f"({self.stats_line()})")
+        return result
+
+    def _to_parser(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.parser += 1
+        return {**state, "next_agent": "query_parser"}
+
+    def _to_provider(self, state: Dict[str, Any], query: str, fields: Dict[str, str], agent: str) -> Dict[str, Any]:
+        print(f"DEBUG: Refinement '{query}' is outside the cached results, searching again")
+        with self._lock:
+            self.provider += 1
+        return {**state, **fields, "user_query": query, "next_agent": agent, "needs_user_input": False}
+
+    def _refine_flights(self, state, messages, query, refinement: Refinement, source) -> Dict[str, Any]:
+        current = SearchFilters.from_state(state)
+        fields = {f: state.get(f) or "" for f in FILTER_FIELDS}
+        if refinement.max_price is not None:
+            fields["max_price"] = str(refinement.max_price)
+        if refinement.max_stops is not None:
+            fields["max_stops"] = str(refinement.max_stops)
+        window = _window(current, refinement, state.get("flight_results"))
+        if window is None:
+            return self._answer_flights(state, messages, query, fields, None, 0, refinement)
+        if window != ("00:00", "23:59"):
+            fields["departure_time"] = "-".join(window)
+        wanted = SearchFilters.from_state(fields)
+
+        cached = None
+        if wanted.within(SearchFilters.from_state(source["fields"])):
+            cached = API_helper.offer_cache.get(tuple(source["key"]))
+        if cached is None:
+            return self._to_provider(state, query, fields, "flight_agent")
+        offers = len(cached.get("data") or [])
+        view = wanted.apply(OffersTable.from_amadeus(cached))
+        # A full-length response may be truncated: nothing matching in it is no proof there is nothing to find
+        if not len(view) and offers >= API_helper.OFFER_LIMIT:
+            return self._to_provider(state, query, fields, "flight_agent")
+        return self._answer_flights(state, messages, query, fields, view, offers, refinement)
+
+    def _answer_flights(self, state, messages, query, fields, view, offers, refinement: Refinement):
+        wanted = SearchFilters.from_state(fields)
+        rows = []
+        if view is not None and len(view):
+            sort = refinement.sort or ("departure" if refinement.earlier or refinement.later else "price")
+            # Earlier: latest of the earlier flights first
+            view = view.sort_by(sort, descending=refinement.earlier and not refinement.sort)
+            rows = list(view.head(REFINED_RESULTS).rows())
+            print("\n📊 Refined Flight Results:")
+            print_flights_table(rows)
+            response_msg = (f" {len(view)} of the {offers} flights already found match ({wanted.describe()}), "
+                            f"sorted by {sort}. Check the console for detailed flight information.")
+        else:
+            response_msg = f" None of the flights already found match ({wanted.describe()})."
+        return {
+            **state,
+            **fields,
+            "user_query": query,
+            "flight_results": rows,
+            "messages": messages + [AIMessage(content=response_msg)],
+            "next_agent": "end",
+            "needs_user_input": False
+        }
+
+    def _refine_trains(self, state, messages, query, refinement: Refinement, source) -> Dict[str, Any]:
+        # Trains have no stop counts and no provider-side filters
+        if refinement.max_price is None and refinement.depart_after is None and refinement.depart_before is None \
+                and not (refinement.earlier or refinement.later or refinement.sort in ("price", "departure")):
+            return self._to_parser(state)
+        rows = train_results_cache.get(tuple(source["key"]))
+        if rows is None:
+            return self._to_provider(state, query, {}, "train_agent")
+        rows = fill_from_cache(rows)
+
+        window = _window(SearchFilters(), refinement, state.get("train_results"))
+        matches = []
+        for row in rows:
+            departure = minute_of(row.get("departure_time"))
+            if window and departure is not None and not (minutes(window[0]) <= departure <= minutes(window[1])):
+                continue
+            fare = min((row.get("fares") or {}).values(), default=None)
+            if refinement.max_price is not None and (fare is None or fare > refinement.max_price):
+                continue
+            matches.append(row)
+        if window is None:
+            matches = []
+
+        sort = refinement.sort if refinement.sort in ("price", "departure") else "departure"
+        if sort == "price":
+            matches.sort(key=lambda r: min((r.get("fares") or {}).values(), default=float("inf")))
+        else:
+            matches.sort(key=lambda r: minute_of(r.get("departure_time")) or 0, reverse=refinement.earlier)
+        shown = matches[:REFINED_RESULTS]
+
+        if shown:
+            listing = "\n".join(format_train_row(r) for r in shown)
+            text = f"{len(matches)} of the {len(rows)} trains already found match, sorted by {sort}:\n{listing}"
+        else:
+            text = f"None of the {len(rows)} trains already found match."
+        return {
+            **state,
+            "user_query": query,
+            "train_results": shown,
+            "messages": messages + [AIMessage(content=f"🚂 **Train Search Results**\n\n{text}")],
+            "next_agent": "end",
+            "needs_user_input": False
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.local + self.provider
+            return {
+                "local": self.local,
+                "provider": self.provider,
+                "parser": self.parser,
+                "local_rate": round(self.local / total, 3) if total else 0.0,
+                "avg_local_ms": round(self.local_seconds / self.local * 1000, 2) if self.local else 0.0,
+            }
+
+    def stats_line(self) -> str:
+        m = self.metrics()
+        return (f"refinements: {m['local']} answered locally in {m['avg_local_ms']:.1f} ms avg, "
+                f"{m['provider']} searched again")
+
+
+refiner = RefinementEngine()
+
+
+def refine_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Graph node: answer a follow-up from earlier results, or hand it to the parser or a search agent."""
+    return refiner.refine(state)
+
+
+async def arefine_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    # No provider or LLM I/O on this path
+    return refiner.refine(state)
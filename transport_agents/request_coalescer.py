@@ -0,0 +1,177 @@
+import asyncio
+import inspect
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+_registry: Dict[str, "SingleFlight"] = {}
+
+
+class _Call:
+    __slots__ = ("event", "done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.done = False
+        self.result = None
+        self.error = None
+        self.waiters = []
+
+
+def _settle(future: asyncio.Future, result: Any, error: BaseException):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests.
+
+    The first caller for a key (the leader) runs the request; callers that
+    arrive with the same key while it is in flight wait for and share its
+    result or exception, whether they come from threads (`do`) or from
+    coroutines (`ado`). Nothing is kept once the call completes; caching is
+    left to the caller.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.requests = 0
+        self.executed = 0
+        _registry[name] = self
+
+    def _join(self, key: Hashable):
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self.executed += 1
+            return call, True
+
+    def _finish(self, key: Hashable, call: _Call, result: Any, error: BaseException):
+        with self._lock:
+            self._calls.pop(key, None)
+            call.result, call.error, call.done = result, error, True
+            waiters, call.waiters = call.waiters, []
+        call.event.set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_settle, future, result, error)
+
+    def _outcome(self, call: _Call):
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) once per in-flight key from synchronous code."""
+        call, leader = self._join(key)
+        if leader:
+            result, error = None, None
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                error = e
+            self._finish(key, call, result, error)
+        else:
+            call.event.wait()
+        return self._outcome(call)
+
+    async def ado(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """
+        Async variant. fn may be a coroutine function or a blocking function
+        (run in a worker thread); in-flight calls are shared with `do` callers.
+        """
+        call, leader = self._join(key)
+        if leader:
+            result, error = None, None
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    result = await fn(*args, **kwargs)
+                else:
+                    result = await asyncio.to_thread(fn, *args, **kwargs)
+            except BaseException as e:
+                error = e
+            self._finish(key, call, result, error)
+            return self._outcome(call)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if not call.done:
+                call.waiters.append((loop, future))
+        if call.done:
+            return self._outcome(call)
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "executed": self.executed,
+            "coalesced": self.requests - self.executed,
+            "fan_in": round(self.requests / self.executed, 2) if self.executed else 0.0,
+        }
+
+
+def coalescer_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters for every registered coalescer, keyed by provider name."""
+    return {name: flight.stats() for name, flight in _registry.items()}
+
+
+if __name__ == "__main__":
+    # Concurrency check against a local stub provider: 40 threads and
+    # 40 coroutines ask for the same route while one slow request is in flight
+    import json
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    hits = []
+
+    class StubProvider(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(0.3)
+            body = json.dumps({"data": [{"id": "1", "path": self.path}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/flight-offers?from=DEL&to=BOM"
+
+    def fetch(u):
+        with urllib.request.urlopen(u) as response:
+            return json.loads(response.read())
+
+    flight = SingleFlight("stub")
+    key = ("DEL", "BOM", "2025-10-01")
+
+    async def async_callers():
+        return await asyncio.gather(*(flight.ado(key, fetch, url) for _ in range(40)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        sync_futures = [pool.submit(flight.do, key, fetch, url) for _ in range(40)]
+        async_results = asyncio.run(async_callers())
+        sync_results = [f.result() for f in sync_futures]
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    assert all(r == sync_results[0] for r in sync_results + async_results)
+    print(f"{len(sync_results) + len(async_results)} callers, {len(hits)} provider hits, {elapsed:.2f}s")
+    print(coalescer_stats())
@@ -0,0 +1,270 @@
+"""
+User constraints on a flight search, pushed down into the Amadeus request.
+
+The parser stores max price, max stops, cabin, preferred airlines and a
+departure time (or "HH:MM-HH:MM" window) in the trip state. SearchFilters
+turns them into GET query parameters (nonStop, maxPrice, travelClass,
+includedAirlineCodes) or, when a connection limit above zero or a time
+window is asked for, into POST search criteria (connectionRestriction,
+departureDateTimeRange time windows, cabin and carrier restrictions), so the
+provider only returns offers that can be shown.
+
+    python -m transport_agents.search_filters DEL BOM 2025-12-01   # live payload/latency comparison
+"""
+import math
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from transport_agents.time_phrases import clock, minutes
+
+CABINS = {
+    "economy": "ECONOMY",
+    "premium economy": "PREMIUM_ECONOMY",
+    "premium": "PREMIUM_ECONOMY",
+    "business": "BUSINESS",
+    "first": "FIRST",
+}
+# A single departure time is searched with this many hours either side
+DEFAULT_TIME_WINDOW_HOURS = int(os.getenv("DEFAULT_TIME_WINDOW_HOURS", "2"))
+# Amadeus caps timeWindow at 12 hours either side
+MAX_TIME_WINDOW_HOURS = 12
+# Amadeus allows at most 2 connections per bound
+MAX_CONNECTIONS = 2
+
+_CARRIER_RE = re.compile(r"[A-Z0-9]{2}")
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(float(str(value).strip().lstrip("$€£₹")))
+    except (TypeError, ValueError):
+        return None
+
+
+def _carriers(offer: Dict[str, Any]) -> set:
+    return {s.get("carrierCode") for it in offer.get("itineraries") or [] for s in it.get("segments") or []}
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    max_price: Optional[int] = None
+    max_stops: Optional[int] = None
+    cabin: Optional[str] = None
+    carriers: Tuple[str, ...] = ()
+    depart_after: Optional[str] = None
+    depart_before: Optional[str] = None
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "SearchFilters":
+        """Filters from the parser's trip fields; unusable values are ignored."""
+        max_stops = _int(state.get("max_stops"))
+        cabin = CABINS.get((state.get("cabin") or "").strip().lower().replace("_", " "))
+        carriers = tuple(sorted({c.strip().upper() for c in (state.get("airlines") or "").split(",")
+                                 if _CARRIER_RE.fullmatch(c.strip().upper())}))
+
+        after = before = None
+        window = (state.get("departure_time") or "").strip()
+        if "-" in window:
+            start, end = (minutes(part) for part in window.split("-", 1))
+            if start is not None and end is not None and start <= end:
+                after, before = clock(start), clock(end)
+        elif minutes(window) is not None:
+            center, spread = minutes(window), DEFAULT_TIME_WINDOW_HOURS * 60
+            after, before = clock(max(center - spread, 0)), clock(min(center + spread, 1439))
+
+        max_price = _int(state.get("max_price"))
+        return cls(
+            max_price=max_price if max_price and max_price > 0 else None,
+            max_stops=min(max_stops, MAX_CONNECTIONS) if max_stops is not None and max_stops >= 0 else None,
+            cabin=cabin,
+            carriers=carriers,
+            depart_after=after,
+            depart_before=before,
+        )
+
+    def __bool__(self) -> bool:
+        return self != NO_FILTERS
+
+    def key(self) -> str:
+        """Compact, stable form for cache and coalescer keys ("" without filters)."""
+        parts = []
+        if self.max_price is not None:
+            parts.append(f"p{self.max_price}")
+        if self.max_stops is not None:
+            parts.append(f"s{self.max_stops}")
+        if self.cabin:
+            parts.append(f"c{self.cabin}")
+        if self.carriers:
+            parts.append("a" + ".".join(self.carriers))
+        if self.depart_after or self.depart_before:
+            parts.append(f"t{self.depart_after or '00:00'}-{self.depart_before or '23:59'}")
+        return ";".join(parts)
+
+    def needs_post(self) -> bool:
+        """True when a constraint can only be expressed in the POST search criteria."""
+        return bool(self.max_stops) or bool(self.depart_after or self.depart_before)
+
+    def get_params(self) -> Dict[str, Any]:
+        """Query parameters for the GET flight-offers search."""
+        params = {}
+        if self.max_stops == 0:
+            params["nonStop"] = "true"
+        if self.max_price is not None:
+            params["maxPrice"] = self.max_price
+        if self.cabin:
+            params["travelClass"] = self.cabin
+        if self.carriers:
+            params["includedAirlineCodes"] = ",".join(self.carriers)
+        return params
+
+    def date_range(self, day: str) -> Dict[str, str]:
+        """departureDateTimeRange for a POST originDestination: the window as a centre time +/- hours."""
+        date_range = {"date": day}
+        if self.depart_after or self.depart_before:
+            start, end = minutes(self.depart_after or "00:00"), minutes(self.depart_before or "23:59")
+            center = (start + end) // 2
+            hours = min(max(math.ceil((end - start) / 120), 1), MAX_TIME_WINDOW_HOURS)
+            date_range.update(time=f"{clock(center)}:00", timeWindow=f"{hours}H")
+        return date_range
+
+    def search_criteria(self, leg_ids) -> Dict[str, Any]:
+        """maxPrice and flightFilters for POST searchCriteria (merged into the caller's)."""
+        criteria, flight_filters = {}, {}
+        if self.max_price is not None:
+            criteria["maxPrice"] = self.max_price
+        if self.max_stops is not None:
+            flight_filters["connectionRestriction"] = {"maxNumberOfConnections": self.max_stops}
+        if self.cabin:
+            flight_filters["cabinRestrictions"] = [{
+                "cabin": self.cabin, "coverage": "MOST_SEGMENTS", "originDestinationIds": list(leg_ids)
+            }]
+        if self.carriers:
+            flight_filters["carrierRestrictions"] = {"includedCarrierCodes": list(self.carriers)}
+        if flight_filters:
+            criteria["flightFilters"] = flight_filters
+        return criteria
+
+    def within(self, base: "SearchFilters") -> bool:
+        """True if every offer matching these filters also matches base, so base's results can be narrowed locally."""
+        def tighter(new, old):
+            return old is None or (new is not None and new <= old)
+        if self.cabin != base.cabin:
+            return False
+        if base.carriers and not (self.carriers and set(self.carriers) <= set(base.carriers)):
+            return False
+        if not tighter(self.max_price, base.max_price) or not tighter(self.max_stops, base.max_stops):
+            return False
+        return ((self.depart_after or "00:00") >= (base.depart_after or "00:00")
+                and (self.depart_before or "23:59") <= (base.depart_before or "23:59"))
+
+    def describe(self) -> str:
+        parts = []
+        if self.max_stops is not None:
+            parts.append("non-stop" if self.max_stops == 0 else f"max {self.max_stops} stops")
+        if self.max_price is not None:
+            parts.append(f"max {self.max_price}")
+        if self.cabin:
+            parts.append(self.cabin.replace("_", " ").lower())
+        if self.carriers:
+            parts.append("on " + "/".join(self.carriers))
+        if self.depart_after or self.depart_before:
+            parts.append(f"departing {self.depart_after or '00:00'}-{self.depart_before or '23:59'}")
+        return ", ".join(parts) or "no filters"
+
+    def apply(self, table):
+        """
+        Trim an OffersTable to the filters. Provider time windows are centre
+        +/- whole hours and may be wider than asked, so this is the exact cut.
+        Cabin is not visible in the parsed offers and is left to the provider.
+        """
+        mask = None
+        if self.carriers:
+            wanted = set(self.carriers)
+            mask = [bool(_carriers(offer) & wanted) for offer in table.column("raw")]
+        return table.filter(max_price=self.max_price, max_stops=self.max_stops,
+                            depart_after=self.depart_after, depart_before=self.depart_before, mask=mask)
+
+
+NO_FILTERS = SearchFilters()
+
+
+class PayloadStats:
+    """Wire bytes, offers and latency of provider searches, with and without pushed-down filters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, filtered: bool, wire_bytes: int, offers: int, seconds: float):
+        with self._lock:
+            t = self._totals.setdefault("filtered" if filtered else "unfiltered", [0, 0, 0, 0.0])
+            t[0] += 1
+            t[1] += wire_bytes
+            t[2] += offers
+            t[3] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {kind: {
+                "requests": n,
+                "avg_kb": round(size / n / 1024, 1),
+                "avg_offers": round(offers / n, 1),
+                "avg_ms": round(seconds / n * 1000, 1),
+            } for kind, (n, size, offers, seconds) in self._totals.items()}
+
+    def stats_line(self) -> str:
+        parts = [f"{kind} {m['requests']} req, {m['avg_kb']:.1f} KB, {m['avg_offers']:.0f} offers, {m['avg_ms']:.0f} ms avg"
+                 for kind, m in sorted(self.metrics().items())]
+        return "provider payloads: " + ("; ".join(parts) or "no requests")
+
+
+payload_stats = PayloadStats()
+
+
+# Representative constraint sets for the live comparison
+BENCH_FILTERS = {
+    "none": {},
+    "non-stop": {"max_stops": "0"},
+    "max price 300": {"max_price": "300"},
+    "morning, 1 stop max": {"departure_time": "06:00-12:00", "max_stops": "1"},
+    "business, non-stop": {"cabin": "business", "max_stops": "0"},
+}
+
+
+if __name__ == "__main__":
+    # Live comparison against the Amadeus test API (needs AMADEUS_API_KEY/SECRET):
+    # the unfiltered search (up to 40 offers, trimmed locally) against the same
+    # route with each constraint set pushed into the request
+    from transport_agents import API_helper
+    from transport_agents.offers_table import OffersTable
+
+    if len(sys.argv) != 4:
+        sys.exit("usage: python -m transport_agents.search_filters ORIGIN DESTINATION YYYY-MM-DD")
+    origin, destination, day = sys.argv[1:]
+    token = API_helper.get_access_token()
+    baseline = None
+    print(f"{'constraints':<22} {'KB':>7} {'offers':>7} {'usable':>7} {'ms':>7}")
+    for label, fields in BENCH_FILTERS.items():
+        filters = SearchFilters.from_state(fields)
+        payload_stats.reset()
+        started = time.perf_counter()
+        result = API_helper.search_flights(origin, destination, day, token, filters=filters)
+        elapsed = (time.perf_counter() - started) * 1000
+        if result.get("error"):
+            print(f"{label:<22} {result.get('message')}")
+            continue
+        if baseline is None:
+            baseline = OffersTable.from_amadeus(result)
+        m = next(iter(payload_stats.metrics().values()), {"avg_kb": 0.0})
+        # usable: offers of the unfiltered response that survive the constraints
+        print(f"{label:<22} {m['avg_kb']:>7.1f} {len(result.get('data') or []):>7} "
+              f"{len(filters.apply(baseline)):>7} {elapsed:>7.0f}")
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+
+from transport_agents.time_phrases import time_window
+from transport_agents.tiered_cache import SQLiteTier, TieredCache, shared_tier
+
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "512"))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", "1800"))
+# Optional SQLite tier on disk when no shared CACHE_BACKEND is configured
+SUMMARY_CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR", "")
+
+
+def offer_fingerprint(raw_results: dict) -> str:
+    """Stable hash of an offer set: ids, prices and flown segments, independent of order."""
+    rows = []
+    for offer in (raw_results or {}).get("data", []) or []:
+        segments = [
+            (s.get("carrierCode", ""), s.get("number", ""), s.get("departure", {}).get("at", ""))
+            for it in offer.get("itineraries", []) for s in it.get("segments", [])
+        ]
+        rows.append((str(offer.get("id", "")), str(offer.get("price", {}).get("total", "")), segments))
+    rows.sort()
+    return hashlib.sha1(json.dumps(rows, separators=(",", ":")).encode()).hexdigest()
+
+
+def normalize_intent(user_query: str) -> str:
+    """Reduce a query to what changes the summary: ranking preference, stops and time window."""
+    q = (user_query or "").lower()
+    parts = []
+    if any(k in q for k in ["cheap", "lowest", "budget", "affordable"]):
+        parts.append("cheapest")
+    if any(k in q for k in ["fast", "quick", "shortest"]):
+        parts.append("fastest")
+    if any(k in q for k in ["non-stop", "nonstop", "non stop", "direct"]):
+        parts.append("nonstop")
+
+    window = None
+    after, before = time_window(q)
+    if after or before:
+        window = f"{after or '00:00'}-{before or '24:00'}"
+    if window:
+        parts.append(window)
+    return "|".join(parts) or "any"
+
+
+class SummaryCache(TieredCache):
+    """
+    LRU/TTL cache of LLM flight summaries keyed by offer fingerprint and
+    intent, in front of the shared cache tier. Without CACHE_BACKEND,
+    SUMMARY_CACHE_DIR keeps a SQLite tier on disk that survives restarts.
+    """
+
+    def __init__(self, max_entries: int = SUMMARY_CACHE_SIZE, ttl: int = SUMMARY_CACHE_TTL,
+                 disk_dir: str = SUMMARY_CACHE_DIR):
+        shared = "default"
+        if disk_dir and not shared_tier():
+            shared = SQLiteTier(os.path.join(disk_dir, "summaries.db"))
+        super().__init__("summaries", ttl=ttl, local_size=max_entries, shared=shared)
+
+    @staticmethod
+    def key(raw_results: dict, user_query: str) -> str:
+        return f"{offer_fingerprint(raw_results)}:{normalize_intent(user_query)}"
+
+
+summary_cache = SummaryCache()
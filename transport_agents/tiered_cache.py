@@ -0,0 +1,534 @@
+"""
+Two-level cache: an in-process LRU in front of an optional shared tier.
+
+The shared tier lets every worker process (and host) reuse provider and
+LLM results instead of each one calling the providers again. It is chosen
+with CACHE_BACKEND:
+
+    redis://host:6379/0          any Redis-protocol server
+    sqlite:///var/tmp/cache.db   single host, many workers (WAL + mmap)
+    (unset)                      in-process tier only
+
+Shared entries are msgpack-encoded [expiry, value] pairs, zlib-compressed
+above COMPRESS_MIN_BYTES. A minimal Redis-protocol server is included as a
+local stand-in for development and benchmarks:
+
+    python -m transport_agents.tiered_cache serve --port 6390
+    python -m transport_agents.tiered_cache bench
+"""
+import argparse
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import msgpack
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "")
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "1024"))
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "100000"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = 1024
+SHARED_TIMEOUT = float(os.getenv("SHARED_CACHE_TIMEOUT", "0.5"))
+
+_RAW, _ZLIB = b"\x00", b"\x01"
+_registry: Dict[str, "TieredCache"] = {}
+
+
+def dumps(expiry: float, value: Any) -> bytes:
+    body = msgpack.packb([expiry, value], use_bin_type=True)
+    if len(body) >= COMPRESS_MIN_BYTES:
+        return _ZLIB + zlib.compress(body, 1)
+    return _RAW + body
+
+
+def loads(blob: bytes) -> Tuple[float, Any]:
+    body = zlib.decompress(blob[1:]) if blob[:1] == _ZLIB else blob[1:]
+    expiry, value = msgpack.unpackb(body, raw=False)
+    return expiry, value
+
+
+def _key_str(key) -> str:
+    return "|".join(map(str, key)) if isinstance(key, tuple) else str(key)
+
+
+class TierStats:
+    __slots__ = ("hits", "misses", "errors", "latencies")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=1000)
+
+    def report(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        ordered = sorted(self.latencies)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "errors": self.errors,
+            "avg_us": round(sum(ordered) / len(ordered) * 1e6, 1) if ordered else 0.0,
+            "p95_us": round(ordered[int(0.95 * (len(ordered) - 1))] * 1e6, 1) if ordered else 0.0,
+        }
+
+
+class LocalTier:
+    """In-process LRU with per-entry expiry; holds live objects, no serialization."""
+
+    name = "local"
+
+    def __init__(self, max_entries: int = LOCAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry[0]:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, expiry: float, value: Any):
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.items())
+        for key, (expiry, value) in entries:
+            if now < expiry:
+                yield key, value
+
+
+class RedisTier:
+    """
+    Shared tier over the Redis protocol (RESP2): GET, SET PX and INFO on one
+    socket per thread. Eviction is the server's maxmemory policy; its
+    evicted_keys counter is reported.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, timeout: float = SHARED_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = self._local.conn = (sock, sock.makefile("rb"))
+            if self.password:
+                self._roundtrip(conn, b"AUTH", self.password.encode())
+            if self.db:
+                self._roundtrip(conn, b"SELECT", str(self.db).encode())
+        return conn
+
+    @staticmethod
+    def _encode(*args: bytes) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    @classmethod
+    def _read(cls, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = reader.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            return [cls._read(reader) for _ in range(int(rest))]
+        raise RuntimeError(f"unexpected reply {line!r}")
+
+    def _roundtrip(self, conn, *args: bytes):
+        sock, reader = conn
+        sock.sendall(self._encode(*args))
+        return self._read(reader)
+
+    def command(self, *args: bytes):
+        try:
+            return self._roundtrip(self._conn(), *args)
+        except (OSError, ConnectionError):
+            # One reconnect, then let the caller count the error
+            self.close()
+            return self._roundtrip(self._conn(), *args)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn:
+            conn[0].close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.command(b"GET", key.encode())
+
+    def put(self, key: str, blob: bytes, ttl: float):
+        self.command(b"SET", key.encode(), blob, b"PX", str(max(1, int(ttl * 1000))).encode())
+
+    def evictions(self) -> int:
+        try:
+            info = self.command(b"INFO", b"stats") or b""
+        except Exception:
+            return 0
+        for line in info.decode(errors="replace").splitlines():
+            if line.startswith("evicted_keys:"):
+                return int(line.split(":", 1)[1])
+        return 0
+
+
+class SQLiteTier:
+    """
+    Shared tier for worker processes on one host: one SQLite file in WAL
+    mode with memory-mapped reads. When over max_entries, expired rows go
+    first, then the rows closest to expiry.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = SHARED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._puts = 0
+        self._evicted = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expiry REAL NOT NULL) WITHOUT ROWID")
+        self._conn().execute("CREATE INDEX IF NOT EXISTS cache_expiry ON cache (expiry)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SHARED_TIMEOUT * 10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute("SELECT value FROM cache WHERE key = ? AND expiry > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, blob: bytes, ttl: float):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expiry) VALUES (?, ?, ?)", (key, blob, time.time() + ttl))
+        self._puts += 1
+        if self._puts % 256 == 0:
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        expired = conn.execute("DELETE FROM cache WHERE expiry <= ?", (time.time(),)).rowcount
+        count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        extra = count - self.max_entries
+        if extra > 0:
+            extra = conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expiry LIMIT ?)", (extra,)).rowcount
+        self._evicted += max(expired, 0) + max(extra, 0)
+
+    def evictions(self) -> int:
+        return self._evicted
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn:
+            conn.close()
+
+
+_shared_tiers: Dict[str, Any] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_tier(url: str = CACHE_BACKEND):
+    """The process-wide shared tier for a backend URL (None when unset)."""
+    if not url:
+        return None
+    with _shared_lock:
+        tier = _shared_tiers.get(url)
+        if tier is None:
+            scheme = urlparse(url).scheme
+            if scheme in ("redis", "rediss"):
+                tier = RedisTier(url)
+            elif scheme == "sqlite":
+                tier = SQLiteTier(url[len("sqlite://"):])
+            else:
+                raise ValueError(f"Unsupported CACHE_BACKEND: {url}")
+            _shared_tiers[url] = tier
+        return tier
+
+
+class TieredCache:
+    """
+    A namespaced cache: the local LRU is checked first, then the shared
+    tier, whose hits are promoted into the local one with their original
+    expiry. Writes go to both. Shared-tier failures count as errors and
+    misses; they never fail the caller.
+    """
+
+    def __init__(self, namespace: str, ttl: float, local_size: int = LOCAL_CACHE_SIZE, shared="default"):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LocalTier(local_size)
+        self.shared = shared_tier() if shared == "default" else shared
+        self.stats = {"local": TierStats(), "shared": TierStats()}
+        self._lock = threading.Lock()
+        _registry[namespace] = self
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _count(self, tier: str, started: float, hit: bool, error: bool = False):
+        stat = self.stats[tier]
+        with self._lock:
+            stat.latencies.append(time.perf_counter() - started)
+            if error:
+                stat.errors += 1
+            if hit:
+                stat.hits += 1
+            else:
+                stat.misses += 1
+
+    def get(self, key) -> Optional[Any]:
+        key = _key_str(key)
+        started = time.perf_counter()
+        entry = self.local.get(key)
+        self._count("local", started, entry is not None)
+        if entry is not None:
+            return entry[1]
+        if self.shared is None:
+            return None
+
+        started = time.perf_counter()
+        try:
+            blob = self.shared.get(self._shared_key(key))
+            entry = loads(blob) if blob is not None else None
+            if entry is not None and time.time() >= entry[0]:
+                entry = None
+        except Exception as e:
+            print(f"DEBUG: {self.namespace} shared cache read failed: {e}")
+            self._count("shared", started, False, error=True)
+            return None
+        self._count("shared", started, entry is not None)
+        if entry is None:
+            return None
+        self.local.put(key, entry[0], entry[1])
+        return entry[1]
+
+    def put(self, key, value: Any, ttl: Optional[float] = None):
+        key = _key_str(key)
+        ttl = self.ttl if ttl is None else ttl
+        expiry = time.time() + ttl
+        self.local.put(key, expiry, value)
+        if self.shared is None:
+            return
+        try:
+            self.shared.put(self._shared_key(key), dumps(expiry, value), ttl)
+        except Exception as e:
+            print(f"DEBUG: {self.namespace} shared cache write failed: {e}")
+            with self._lock:
+                self.stats["shared"].errors += 1
+
+    def local_items(self) -> Iterator[Tuple[str, Any]]:
+        """Live entries of the in-process tier (the shared tier is not enumerable)."""
+        return self.local.items()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            report = {"local": self.stats["local"].report()}
+            report["local"]["evictions"] = self.local.evictions
+            if self.shared is not None:
+                report[self.shared.name] = self.stats["shared"].report()
+        if self.shared is not None:
+            report[self.shared.name]["evictions"] = self.shared.evictions()
+        return report
+
+    def stats_line(self) -> str:
+        parts = [f"{tier} {m['hits']}/{m['hits'] + m['misses']} hits, {m['avg_us']:.0f} us"
+                 for tier, m in self.metrics().items()]
+        return f"{self.namespace} cache: " + "; ".join(parts)
+
+
+def cache_metrics() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Per cache namespace and tier: hits, misses, latency and evictions."""
+    return {name: cache.metrics() for name, cache in _registry.items()}
+
+
+class _MiniRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                request = RedisTier._read(self.rfile)
+            except (ConnectionError, OSError, ValueError):
+                return
+            try:
+                reply = server.execute([a if isinstance(a, bytes) else str(a).encode() for a in request])
+            except Exception as e:
+                reply = RuntimeError(str(e))
+            self.wfile.write(_encode_reply(reply))
+            self.wfile.flush()
+
+
+def _encode_reply(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, RuntimeError):
+        return b"-ERR %s\r\n" % str(reply).encode()
+    if isinstance(reply, bool):
+        return b"+OK\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+class MiniRedis(socketserver.ThreadingTCPServer):
+    """
+    Local Redis-protocol stand-in: GET, SET [PX|EX], DEL, PING, DBSIZE,
+    FLUSHDB, SELECT and INFO, with LRU eviction above max_keys. For
+    development and benchmarks only.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, max_keys: int = SHARED_CACHE_MAX_ENTRIES):
+        super().__init__((host, port), _MiniRedisHandler)
+        self.max_keys = max_keys
+        self.data: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def execute(self, args: List[bytes]):
+        cmd = args[0].upper()
+        with self.lock:
+            if cmd == b"GET":
+                entry = self.data.get(args[1])
+                if entry is None:
+                    return None
+                if entry[0] and time.time() >= entry[0]:
+                    del self.data[args[1]]
+                    return None
+                self.data.move_to_end(args[1])
+                return entry[1]
+            if cmd == b"SET":
+                expiry = 0.0
+                if len(args) >= 5 and args[3].upper() == b"PX":
+                    expiry = time.time() + int(args[4]) / 1000
+                elif len(args) >= 5 and args[3].upper() == b"EX":
+                    expiry = time.time() + int(args[4])
+                self.data[args[1]] = (expiry, args[2])
+                self.data.move_to_end(args[1])
+                while len(self.data) > self.max_keys:
+                    self.data.popitem(last=False)
+                    self.evicted += 1
+                return True
+            if cmd == b"DEL":
+                return sum(1 for k in args[1:] if self.data.pop(k, None) is not None)
+            if cmd == b"DBSIZE":
+                return len(self.data)
+            if cmd == b"FLUSHDB":
+                self.data.clear()
+                return True
+            if cmd in (b"PING", b"SELECT", b"AUTH"):
+                return True
+            if cmd == b"INFO":
+                return f"# Stats\r\nevicted_keys:{self.evicted}\r\nkeys:{len(self.data)}\r\n".encode()
+        raise RuntimeError(f"unknown command '{cmd.decode(errors='replace')}'")
+
+    def start(self) -> "MiniRedis":
+        threading.Thread(target=self.serve_forever, name="mini-redis", daemon=True).start()
+        return self
+
+
+def _bench(n: int = 2000):
+    """Cold/warm lookups of a slim offers response through each shared backend."""
+    import json
+    import tempfile
+    from transport_agents.offers_table import _synthetic_response
+
+    value = _synthetic_response(40)
+    blob = dumps(time.time() + 60, value)
+    print(f"entry: json {len(json.dumps(value)):,} B, msgpack+zlib {len(blob):,} B")
+
+    server = MiniRedis(max_keys=n // 2).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {"redis": RedisTier(server.url), "sqlite": SQLiteTier(os.path.join(tmp, "cache.db"), max_entries=n // 2)}
+        for name, tier in backends.items():
+            # Two caches on one namespace stand in for two worker processes
+            writer = TieredCache(f"bench-{name}", ttl=60, local_size=64, shared=tier)
+            reader = TieredCache(f"bench-{name}", ttl=60, local_size=64, shared=tier)
+            started = time.perf_counter()
+            for i in range(n):
+                writer.put(("DEL", "BOM", str(i)), value)
+            put_us = (time.perf_counter() - started) / n * 1e6
+            for i in range(n):
+                reader.get(("DEL", "BOM", str(i)))
+            # Second pass over the most recent keys hits the reader's own LRU
+            for i in range(n - 64, n):
+                reader.get(("DEL", "BOM", str(i)))
+            print(f"{name}: put {put_us:.0f} us; peer process view {reader.metrics()}")
+            tier.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiered cache tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run the local Redis-protocol stand-in")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=6390)
+    serve.add_argument("--max-keys", type=int, default=SHARED_CACHE_MAX_ENTRIES)
+    bench = sub.add_parser("bench", help="compare the shared backends")
+    bench.add_argument("--entries", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = MiniRedis(args.host, args.port, args.max_keys)
+        print(f"Serving {server.url}")
+        server.serve_forever()
+    else:
+        _bench(args.entries)
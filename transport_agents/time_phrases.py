@@ -0,0 +1,71 @@
+"""
+Times of day and dates in user messages.
+
+Shared by the summary cache (intent keys), the search filters (departure
+windows), the refinement engine and the price watch, so a phrase such as
+"after 6pm", "morning" or "on May 5" means the same thing everywhere.
+"""
+import re
+from typing import Optional, Tuple
+
+BEFORE_RE = re.compile(r"before\s+(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", re.I)
+AFTER_RE = re.compile(r"after\s+(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", re.I)
+DAY_PARTS = {
+    "early morning": "00:00-06:00",
+    "morning": "05:00-12:00",
+    "afternoon": "12:00-17:00",
+    "evening": "17:00-21:00",
+    "night": "21:00-24:00",
+}
+# Any way of naming a travel date: ISO, numeric, ordinal, relative, weekday or month
+DATE_RE = re.compile(
+    r"\d{4}-\d{2}-\d{2}|\b\d{1,2}[/.]\d{1,2}\b|\b\d{1,2}(st|nd|rd|th)\b|\b(tomorrow|today|tonight|next|weekend|week|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|january|february|march|april|may|june|july|august|"
+    r"september|october|november|december|jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec)\b", re.I)
+
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+
+
+def minutes(value: str) -> Optional[int]:
+    """Minute of day of "HH:MM", or None; "24:00" is the last minute of the day."""
+    match = _TIME_RE.fullmatch((value or "").strip())
+    if not match or int(match.group(1)) > 24 or int(match.group(2)) > 59:
+        return None
+    return min(int(match.group(1)) * 60 + int(match.group(2)), 1439)
+
+
+def clock(minute_of_day: int) -> str:
+    return f"{minute_of_day // 60:02d}:{minute_of_day % 60:02d}"
+
+
+def meridiem_clock(hour: str, minute: Optional[str], meridiem: Optional[str]) -> str:
+    """"HH:MM" of a matched "6", "6:30" or "6pm"."""
+    meridiem = (meridiem or "").lower()
+    h = int(hour) % 12 + (12 if meridiem == "pm" else 0) if meridiem else int(hour)
+    return f"{h:02d}:{minute or '00'}"
+
+
+def minute_of(value) -> Optional[int]:
+    """Minute of day of a departure like "08:05" or "2025-03-01T08:05"."""
+    times = re.findall(r"\d{1,2}:\d{2}", str(value or ""))
+    return minutes(times[-1]) if times else None
+
+
+def time_window(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """(after, before) asked for in a message; a day part sets both, "after"/"before" override it."""
+    lowered = (text or "").lower()
+    after = before = None
+    for name, span in DAY_PARTS.items():
+        if name in lowered:
+            after, before = span.split("-")
+            break
+    after_match, before_match = AFTER_RE.search(lowered), BEFORE_RE.search(lowered)
+    if after_match:
+        after = meridiem_clock(*after_match.groups())
+    if before_match:
+        before = meridiem_clock(*before_match.groups())
+    return after, before
+
+
+def mentions_date(text: str) -> bool:
+    return bool(DATE_RE.search(text or ""))
@@ -1,6 +1,6 @@
+import asyncio
 import os
 import re
-import dateparser
 import requests
 from datetime import datetime
 from langchain.tools import tool
@@ -19,12 +19,22 @@ import os
 # Add the parent directory to the Python path to import from graph module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from graph.state import State
+from transport_agents.date_resolver import resolve_date
+from transport_agents.request_coalescer import SingleFlight
+from transport_agents.provider_scheduler import scheduler
+from transport_agents.model_router import router
+from transport_agents.offer_stream import COMPRESSED_HEADERS
+from transport_agents.alloc_profiler import profiler
+from transport_agents.tiered_cache import TieredCache
+from transport_agents.train_enrichment import train_rows, enrich_trains, aenrich_trains, format_train_row
+from transport_agents.refinement import train_source
+from transport_agents.itinerary_planner import itinerary_results
 
 
 # Load environment variables for API keys
 load_dotenv()
 
-llm = init_chat_model("google_genai:gemini-2.0-flash")
+TOOL_ARGS = ["date_str", "source", "destination"]
 
 
 
@@ -40,72 +50,115 @@ CITY_TO_CODE = {
     # Add more as needed
 }
 
-def fetch_trains_by_day(date_str: str, source: str, destination: str) -> str:
-    try:
-        # Try different date parsing approaches
-        dt = dateparser.parse(date_str, settings={'PREFER_DATES_FROM': 'future'})
-        if not dt:
-            # Try with current date context
-            from datetime import datetime, timedelta
-            today = datetime.now()
-            if 'tuesday' in date_str.lower():
-                # Find next Tuesday
-                days_ahead = 1 - today.weekday()  # Tuesday is day 1
-                if days_ahead <= 0:  # Target day already happened this week
-                    days_ahead += 7
-                dt = today + timedelta(days_ahead)
-            elif 'monday' in date_str.lower():
-                days_ahead = 0 - today.weekday()
-                if days_ahead <= 0:
-                    days_ahead += 7
-                dt = today + timedelta(days_ahead)
-            # Add more day mappings as needed
-            
-        if not dt:
-            return f"Could not parse date: {date_str}. Please use format like '2023-10-15' or specific dates."
-            
-        weekday_key = dt.strftime("%a").lower()[:3]
-        
-        api_key = os.getenv("RAPIDAPI_KEY")
-        if not api_key:
-            return "API key not found. Please check your .env file."
-        
-        headers = {
-            'x-rapidapi-key': api_key,
-            'x-rapidapi-host': "irctc1.p.rapidapi.com"
-        }
-        url = f"https://irctc1.p.rapidapi.com/api/v3/getLiveStation?fromStationCode={source}&toStationCode={destination}&hours=8"
-        
-        print(f"DEBUG: API URL: {url}")
-        print(f"DEBUG: Headers: {headers}")
-        print(f"DEBUG: Looking for weekday: {weekday_key}")
-        
-        response = requests.get(url, headers=headers, timeout=15)
-        print(f"DEBUG: Response Status: {response.status_code}")
-        
-        response.raise_for_status()
-        data = response.json()
-        print(f"DEBUG: API Response: {data}")
-        
-        trains = data.get("data", [])
-        print(f"DEBUG: Total trains found: {len(trains)}")
-        
-        if trains:
-            print(f"DEBUG: First train example: {trains[0]}")
+# Identical concurrent station lookups share one in-flight IRCTC call
+_station_requests = SingleFlight("irctc")
+# Live-station listings per station pair; short TTL since they cover the next few hours
+STATION_CACHE_TTL = int(os.getenv("STATION_CACHE_TTL", "300"))
+station_cache = TieredCache("irctc", ttl=STATION_CACHE_TTL)
+
+def _fetch_live_station(source: str, destination: str, api_key: str) -> dict:
+    headers = {
+        'x-rapidapi-key': api_key,
+        'x-rapidapi-host': "irctc1.p.rapidapi.com",
+        **COMPRESSED_HEADERS
+    }
+    url = f"https://irctc1.p.rapidapi.com/api/v3/getLiveStation?fromStationCode={source}&toStationCode={destination}&hours=8"
+    
+    print(f"DEBUG: API URL: {url}")
+    
+    scheduler.acquire("irctc")
+    response = requests.get(url, headers=headers, timeout=15)
+    print(f"DEBUG: Response Status: {response.status_code}")
+    
+    response.raise_for_status()
+    return response.json()
+
+def _trains_on_day(date_str: str, source: str, destination: str):
+    """(travel date, live-station entries running that weekday, API key); ValueError carries the user-facing message."""
+    # Shared resolver: ISO fast path, relative phrases, memoized dateparser fallback
+    dt = resolve_date(date_str)
         
-        trains_today = [
-            t for t in trains if t.get("runDays", {}).get(weekday_key, False)
-        ]
-        print(f"DEBUG: Trains running on {weekday_key}: {len(trains_today)}")
+    if not dt:
+        raise ValueError(f"Could not parse date: {date_str}. Please use format like '2023-10-15' or specific dates.")
         
-        if not trains_today:
-            return f"No trains found on {dt.strftime('%d-%m-%Y')} from {source} to {destination}."
-        formatted = "\n".join(
-            f"{t['trainName']} ({t['trainNumber']}) at {t['departureTime']}" for t in trains_today
-        )
-        return f"Available trains on {dt.strftime('%d-%m-%Y')} from {source} to {destination}:\n{formatted}"
+    weekday_key = dt.strftime("%a").lower()[:3]
+    
+    api_key = os.getenv("RAPIDAPI_KEY")
+    if not api_key:
+        raise ValueError("API key not found. Please check your .env file.")
+    
+    print(f"DEBUG: Looking for weekday: {weekday_key}")
+    
+    # The live-station listing does not depend on the date, so the key is the station pair
+    key = (source.strip().upper(), destination.strip().upper())
+    data = station_cache.get(key)
+    if data is None:
+        with profiler.track("provider", "irctc.live_station"):
+            data = _station_requests.do(key, _fetch_live_station, key[0], key[1], api_key)
+        station_cache.put(key, data)
+    print(f"DEBUG: API Response: {data}")
+    
+    trains = data.get("data", [])
+    print(f"DEBUG: Total trains found: {len(trains)}")
+    
+    if trains:
+        print(f"DEBUG: First train example: {trains[0]}")
+    
+    trains_today = [
+        t for t in trains if t.get("runDays", {}).get(weekday_key, False)
+    ]
+    print(f"DEBUG: Trains running on {weekday_key}: {len(trains_today)}")
+    return dt, trains_today, api_key
+
+def fetch_trains_by_day(date_str: str, source: str, destination: str) -> str:
+    try:
+        dt, trains_today, _ = _trains_on_day(date_str, source, destination)
+    except ValueError as e:
+        return str(e)
     except Exception as e:
         return f"API error: {str(e)}"
+    
+    if not trains_today:
+        return f"No trains found on {dt.strftime('%d-%m-%Y')} from {source} to {destination}."
+    formatted = "\n".join(
+        f"{t['trainName']} ({t['trainNumber']}) at {t['departureTime']}" for t in trains_today
+    )
+    return f"Available trains on {dt.strftime('%d-%m-%Y')} from {source} to {destination}:\n{formatted}"
+
+def _listing_text(dt, source: str, destination: str, rows: list) -> str:
+    formatted = "\n".join(format_train_row(row) for row in rows)
+    return f"Available trains on {dt.strftime('%d-%m-%Y')} from {source} to {destination}:\n{formatted}"
+
+def search_trains(date_str: str, source: str, destination: str):
+    """
+    Trains running on the date with fares and seat availability for the
+    earliest ones, fetched concurrently: (message text, train_results).
+    """
+    source, destination = resolve_city_code(source), resolve_city_code(destination)
+    try:
+        dt, trains_today, api_key = _trains_on_day(date_str, source, destination)
+    except ValueError as e:
+        return str(e), []
+    except Exception as e:
+        return f"API error: {str(e)}", []
+    if not trains_today:
+        return f"No trains found on {dt.strftime('%d-%m-%Y')} from {source} to {destination}.", []
+    rows = enrich_trains(train_rows(trains_today, source, destination, dt.strftime("%Y-%m-%d")), api_key)
+    return _listing_text(dt, source, destination, rows), rows
+
+async def asearch_trains(date_str: str, source: str, destination: str):
+    """Async search_trains: the cached listing runs in a thread, enrichment on aiohttp."""
+    source, destination = resolve_city_code(source), resolve_city_code(destination)
+    try:
+        dt, trains_today, api_key = await asyncio.to_thread(_trains_on_day, date_str, source, destination)
+    except ValueError as e:
+        return str(e), []
+    except Exception as e:
+        return f"API error: {str(e)}", []
+    if not trains_today:
+        return f"No trains found on {dt.strftime('%d-%m-%Y')} from {source} to {destination}.", []
+    rows = await aenrich_trains(train_rows(trains_today, source, destination, dt.strftime("%Y-%m-%d")), api_key)
+    return _listing_text(dt, source, destination, rows), rows
 
 
 def resolve_city_code(city):
@@ -132,13 +185,70 @@ def train_options_tool(date_str: str, source: str, destination: str) -> str:
 
 
 tools = [train_options_tool]
-llm_with_tools = llm.bind_tools(tools)
+
+def _train_llm_problem(response) -> Optional[str]:
+    """Why a tool-calling response should go to a stronger model, or None if it is usable."""
+    tool_calls = getattr(response, "tool_calls", None) or []
+    for call in tool_calls:
+        args = call.get("args", {})
+        missing = [a for a in TOOL_ARGS if not str(args.get(a, "")).strip()]
+        if missing:
+            return f"tool call missing {', '.join(missing)}"
+        if any(str(v).strip().startswith('[') for v in args.values()):
+            return "placeholder in tool call"
+    if not tool_calls and not str(getattr(response, "content", "") or "").strip():
+        return "empty response"
+    return None
 
 def train_search_node(state: State) -> Dict[str, Any]:
     """
     Main train agent node that processes user queries and decides whether to use tools or provide direct responses.
     Compatible with main_graph.py.
     """
+    early, messages, llm_messages = _prepare_train_query(state)
+    if early is not None:
+        return early
+
+    try:
+        print("DEBUG: Calling LLM with tools...")
+        # Get response from LLM with tools
+        def ask(model_name):
+            scheduler.acquire("gemini")
+            return router.chat_model(model_name, tools).invoke(llm_messages)
+        response = router.call("train_agent", ask, _train_llm_problem)
+        print(f"DEBUG: LLM Response received: {type(response)}")
+        # Run the requested search here so train_results is filled this turn
+        tool_args = _tool_args(response)
+        if tool_args:
+            return _train_results(state, messages, *search_trains(**tool_args))
+        return _train_response(state, messages, response)
+        
+    except Exception as e:
+        return _train_error(state, messages, e)
+
+async def atrain_search_node(state: State) -> Dict[str, Any]:
+    """Async train_search_node: the tool-calling LLM request is awaited."""
+    early, messages, llm_messages = _prepare_train_query(state)
+    if early is not None:
+        return early
+
+    try:
+        print("DEBUG: Calling LLM with tools...")
+        async def ask(model_name):
+            await scheduler.aacquire("gemini")
+            return await router.chat_model(model_name, tools).ainvoke(llm_messages)
+        response = await router.acall("train_agent", ask, _train_llm_problem)
+        print(f"DEBUG: LLM Response received: {type(response)}")
+        tool_args = _tool_args(response)
+        if tool_args:
+            return _train_results(state, messages, *await asearch_trains(**tool_args))
+        return _train_response(state, messages, response)
+        
+    except Exception as e:
+        return _train_error(state, messages, e)
+
+def _prepare_train_query(state: State):
+    """LLM messages for the turn; the first item is a ready result when no LLM call is needed."""
     messages = state.get("messages", [])
     
     # CIRCUIT BREAKER: Check if we just got a tool result - if so, format and end , very important to break the look of api calling.
@@ -159,7 +269,7 @@ def train_search_node(state: State) -> Dict[str, Any]:
                 "messages": messages + [AIMessage(content=formatted_response)],
                 "next_agent": "end",
                 "needs_user_input": False
-            }
+            }, messages, None
     
     # Get the user query from the latest message or from state
     user_query = ""
@@ -191,7 +301,7 @@ def train_search_node(state: State) -> Dict[str, Any]:
             "messages": messages + [AIMessage(content="I need a query to help you with train information.")],
             "next_agent": "end",
             "needs_user_input": True
-        }
+        }, messages, None
 
     print(f"Processing User Query: {user_query}")
 
@@ -219,36 +329,51 @@ Provide direct answers for:
 When using the tool, extract the origin, destination, and date from the user's query or use the context information.
 Be helpful and conversational in your responses."""
 
-    try:
-        # Prepare messages for LLM
-        llm_messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_query}
-        ]
+    # Prepare messages for LLM
+    llm_messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_query}
+    ]
+    return None, messages, llm_messages
+
+def _tool_args(response) -> Optional[Dict[str, str]]:
+    """Arguments of the first train_options_tool call in an LLM response."""
+    for call in getattr(response, "tool_calls", None) or []:
+        if call.get("name") == train_options_tool.name:
+            args = call.get("args", {})
+            return {a: str(args.get(a, "")) for a in TOOL_ARGS}
+    return None
+
+def _train_results(state: State, messages: list, text: str, rows: list) -> Dict[str, Any]:
+    formatted_response = f"🚂 **Train Search Results**\n\n{text}\n\nHave a great journey!"
+    return {
+        **state,
+        "messages": messages + [AIMessage(content=formatted_response)],
+        "train_results": rows,
+        "refine_source": train_source(state, rows),
+        "itinerary_results": itinerary_results({**state, "train_results": rows}),
+        "next_agent": "end",
+        "needs_user_input": False
+    }
 
-        print("DEBUG: Calling LLM with tools...")
-        # Get response from LLM with tools
-        response = llm_with_tools.invoke(llm_messages)
-        print(f"DEBUG: LLM Response received: {type(response)}")
-        
-        # Merge into state and route to end
-        return {
-            **state,
-            "messages": messages + [response],
-            "next_agent": "end",
-            "needs_user_input": False
-        }
-        
-    except Exception as e:
-        error_msg = f"Error processing train request: {str(e)}"
-        print(f"Error in train_search_node: {error_msg}")
-        return {
-            **state,
-            "messages": messages + [AIMessage(content=error_msg)],
-            "next_agent": "end",
-            "needs_user_input": False
-        }
+def _train_response(state: State, messages: list, response) -> Dict[str, Any]:
+    # Merge into state and route to end
+    return {
+        **state,
+        "messages": messages + [response],
+        "next_agent": "end",
+        "needs_user_input": False
+    }
 
+def _train_error(state: State, messages: list, e: Exception) -> Dict[str, Any]:
+    error_msg = f"Error processing train request: {str(e)}"
+    print(f"Error in train_search_node: {error_msg}")
+    return {
+        **state,
+        "messages": messages + [AIMessage(content=error_msg)],
+        "next_agent": "end",
+        "needs_user_input": False
+    }
 
 
 tool_node = ToolNode(tools)
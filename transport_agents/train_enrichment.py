@@ -0,0 +1,303 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import requests
+
+from transport_agents.offer_stream import COMPRESSED_HEADERS
+from transport_agents.provider_scheduler import scheduler
+from transport_agents.request_coalescer import SingleFlight
+from transport_agents.tiered_cache import TieredCache
+
+IRCTC_HOST = "irctc1.p.rapidapi.com"
+# Trains enriched per search, earliest departures first
+TRAIN_ENRICH_TOP_N = int(os.getenv("TRAIN_ENRICH_TOP_N", "5"))
+# Concurrent fare/seat requests across all sessions
+TRAIN_ENRICH_WORKERS = int(os.getenv("TRAIN_ENRICH_WORKERS", "6"))
+# Rows still missing after this many seconds are returned as partial;
+# the requests finish in the background and land in the caches
+TRAIN_ENRICH_BUDGET = float(os.getenv("TRAIN_ENRICH_BUDGET", "6"))
+TRAIN_CLASS = os.getenv("TRAIN_CLASS", "3A")
+TRAIN_QUOTA = os.getenv("TRAIN_QUOTA", "GN")
+
+# Fares change rarely; availability is only good for a few minutes
+fare_cache = TieredCache("irctc-fare", ttl=int(os.getenv("TRAIN_FARE_CACHE_TTL", "86400")))
+seat_cache = TieredCache("irctc-seats", ttl=int(os.getenv("TRAIN_SEAT_CACHE_TTL", "300")))
+# Timetables change with the railway's schedule revisions, not daily
+schedule_cache = TieredCache("irctc-schedule", ttl=int(os.getenv("TRAIN_SCHEDULE_CACHE_TTL", "604800")))
+# Full train_results of recent searches, so follow-ups can be refined locally
+train_results_cache = TieredCache("train-results", ttl=int(os.getenv("TRAIN_RESULTS_CACHE_TTL", "900")))
+_fare_requests = SingleFlight("irctc-fare")
+_seat_requests = SingleFlight("irctc-seats")
+_schedule_requests = SingleFlight("irctc-schedule")
+_enrich_pool = ThreadPoolExecutor(max_workers=TRAIN_ENRICH_WORKERS, thread_name_prefix="train-enrich")
+
+
+def _headers(api_key: str) -> Dict[str, str]:
+    return {"x-rapidapi-key": api_key, "x-rapidapi-host": IRCTC_HOST, **COMPRESSED_HEADERS}
+
+
+def _fare_request(train_no: str, source: str, destination: str):
+    url = f"https://{IRCTC_HOST}/api/v2/getFare"
+    return url, {"trainNo": train_no, "fromStationCode": source, "toStationCode": destination}
+
+
+def _seat_request(train_no: str, source: str, destination: str, day: str):
+    url = f"https://{IRCTC_HOST}/api/v1/checkSeatAvailability"
+    return url, {"classType": TRAIN_CLASS, "fromStationCode": source, "quota": TRAIN_QUOTA,
+                 "toStationCode": destination, "trainNo": train_no, "date": day}
+
+
+def _schedule_request(train_no: str):
+    return f"https://{IRCTC_HOST}/api/v1/getTrainSchedule", {"trainNo": train_no}
+
+
+def _parse_fare(payload: dict) -> Optional[Dict[str, float]]:
+    """Fare per class from a getFare response (general quota)."""
+    data = (payload or {}).get("data") or {}
+    rows = data.get("general") if isinstance(data, dict) else data
+    fares = {}
+    for row in rows or []:
+        cls, fare = row.get("classType"), row.get("fare")
+        if cls and fare is not None:
+            fares[cls] = float(fare)
+    return fares or None
+
+
+def _parse_seats(payload: dict, day: str) -> Optional[Dict[str, Any]]:
+    """Availability on the travel day from a checkSeatAvailability response, None if that day is not listed."""
+    rows = (payload or {}).get("data") or []
+    if not isinstance(rows, list) or not rows:
+        return None
+    travel = date.fromisoformat(day)
+    wanted = f"{travel.day}-{travel.month}-{travel.year}"
+    row = next((r for r in rows if str(r.get("date", "")) == wanted), None)
+    if row is None:
+        return None
+    return {"class": TRAIN_CLASS, "status": row.get("current_status"), "fare": row.get("total_fare") or row.get("ticket_fare")}
+
+
+def _parse_schedule(payload: dict, source: str, destination: str) -> Optional[Dict[str, Any]]:
+    """
+    Arrival at destination from a getTrainSchedule response: {"arrival_time": "HH:MM",
+    "days": days after departing source, "km": distance or None}; None if the train does
+    not call at source and then destination.
+    """
+    data = (payload or {}).get("data") or {}
+    route = data.get("route") if isinstance(data, dict) else data
+    stops = [(str(r.get("station_code") or r.get("stationCode") or "").upper(), r) for r in route or []]
+    start = next((i for i, (code, _) in enumerate(stops) if code == source.upper()), None)
+    if start is None:
+        return None
+    end = next((i for i, (code, _) in enumerate(stops) if i > start and code == destination.upper()), None)
+    if end is None:
+        return None
+    first, last = stops[start][1], stops[end][1]
+    arrival = str(last.get("sta") or last.get("arrivalTime") or "")[:5]
+    if len(arrival) != 5 or ":" not in arrival:
+        return None
+    try:
+        days = int(last.get("day", 1)) - int(first.get("day", 1))
+    except (TypeError, ValueError):
+        days = 0
+    try:
+        km = float(last.get("distance_from_source", last.get("distance"))) \
+            - float(first.get("distance_from_source", first.get("distance")))
+    except (TypeError, ValueError):
+        km = None
+    return {"arrival_time": arrival, "days": max(days, 0), "km": km}
+
+
+def _get_json(url: str, params: dict, api_key: str) -> dict:
+    scheduler.acquire("irctc")
+    response = requests.get(url, params=params, headers=_headers(api_key), timeout=15)
+    response.raise_for_status()
+    return response.json()
+
+
+async def _aget_json(url: str, params: dict, api_key: str) -> dict:
+    from transport_agents.API_helper import _aiohttp_session
+    await scheduler.aacquire("irctc")
+    async with _aiohttp_session().get(url, params=params, headers=_headers(api_key),
+                                      timeout=aiohttp.ClientTimeout(total=15)) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+
+def train_fare(train_no: str, source: str, destination: str, api_key: str):
+    key = (train_no, source, destination)
+    fare = fare_cache.get(key)
+    if fare is None:
+        url, params = _fare_request(*key)
+        fare = _parse_fare(_fare_requests.do(key, _get_json, url, params, api_key))
+        if fare is not None:
+            fare_cache.put(key, fare)
+    return fare
+
+
+def train_seats(train_no: str, source: str, destination: str, day: str, api_key: str):
+    key = (train_no, source, destination, day, TRAIN_CLASS, TRAIN_QUOTA)
+    seats = seat_cache.get(key)
+    if seats is None:
+        url, params = _seat_request(train_no, source, destination, day)
+        seats = _parse_seats(_seat_requests.do(key, _get_json, url, params, api_key), day)
+        if seats is not None:
+            seat_cache.put(key, seats)
+    return seats
+
+
+def train_schedule(train_no: str, source: str, destination: str, api_key: str):
+    key = (train_no, source, destination)
+    schedule = schedule_cache.get(key)
+    if schedule is None:
+        url, params = _schedule_request(train_no)
+        schedule = _parse_schedule(_schedule_requests.do(train_no, _get_json, url, params, api_key), source, destination)
+        if schedule is not None:
+            schedule_cache.put(key, schedule)
+    return schedule
+
+
+async def atrain_fare(train_no: str, source: str, destination: str, api_key: str):
+    key = (train_no, source, destination)
+    fare = fare_cache.get(key)
+    if fare is None:
+        url, params = _fare_request(*key)
+        fare = _parse_fare(await _fare_requests.ado(key, _aget_json, url, params, api_key))
+        if fare is not None:
+            fare_cache.put(key, fare)
+    return fare
+
+
+async def atrain_seats(train_no: str, source: str, destination: str, day: str, api_key: str):
+    key = (train_no, source, destination, day, TRAIN_CLASS, TRAIN_QUOTA)
+    seats = seat_cache.get(key)
+    if seats is None:
+        url, params = _seat_request(train_no, source, destination, day)
+        seats = _parse_seats(await _seat_requests.ado(key, _aget_json, url, params, api_key), day)
+        if seats is not None:
+            seat_cache.put(key, seats)
+    return seats
+
+
+async def atrain_schedule(train_no: str, source: str, destination: str, api_key: str):
+    key = (train_no, source, destination)
+    schedule = schedule_cache.get(key)
+    if schedule is None:
+        url, params = _schedule_request(train_no)
+        schedule = _parse_schedule(await _schedule_requests.ado(train_no, _aget_json, url, params, api_key),
+                                   source, destination)
+        if schedule is not None:
+            schedule_cache.put(key, schedule)
+    return schedule
+
+
+def train_rows(trains: List[dict], source: str, destination: str, day: str) -> List[Dict[str, Any]]:
+    """train_results rows from live-station entries, earliest departure first."""
+    rows = [{
+        "train_name": t.get("trainName", ""),
+        "train_number": str(t.get("trainNumber", "")),
+        "departure_time": t.get("departureTime", ""),
+        "source": source,
+        "destination": destination,
+        "date": day,
+        "fares": None,
+        "availability": None,
+        "schedule": None,
+        "partial": False,
+    } for t in trains]
+    rows.sort(key=lambda r: r["departure_time"] or "99:99")
+    return rows
+
+
+def _jobs(rows: List[Dict[str, Any]], top_n: int):
+    for row in rows[:top_n]:
+        yield row, "fares", (row["train_number"], row["source"], row["destination"])
+        yield row, "availability", (row["train_number"], row["source"], row["destination"], row["date"])
+        yield row, "schedule", (row["train_number"], row["source"], row["destination"])
+
+
+FETCHES = {"fares": train_fare, "availability": train_seats, "schedule": train_schedule}
+AFETCHES = {"fares": atrain_fare, "availability": atrain_seats, "schedule": atrain_schedule}
+
+
+def _settle(row: Dict[str, Any], field: str, value=None, error: Optional[BaseException] = None):
+    if error is not None:
+        print(f"DEBUG: {field} for train {row['train_number']} failed: {error}")
+    row[field] = value
+
+
+def enrich_trains(rows: List[Dict[str, Any]], api_key: str, top_n: int = TRAIN_ENRICH_TOP_N,
+                  budget: float = TRAIN_ENRICH_BUDGET) -> List[Dict[str, Any]]:
+    """
+    Fill fares, seat availability and the arrival from the train's schedule
+    for the first top_n rows concurrently.
+    Rows not finished within the budget are marked partial.
+    """
+    futures = {}
+    for row, field, args in _jobs(rows, top_n):
+        fetch = FETCHES[field]
+        futures[_enrich_pool.submit(fetch, *args, api_key)] = (row, field)
+    done, pending = wait(futures, timeout=budget)
+    for future in done:
+        row, field = futures[future]
+        _settle(row, field, *((None, future.exception()) if future.exception() else (future.result(),)))
+    for future in pending:
+        futures[future][0]["partial"] = True
+    if pending:
+        print(f"DEBUG: Train enrichment budget of {budget:g}s hit, {len(pending)} lookups still running")
+    return rows
+
+
+async def aenrich_trains(rows: List[Dict[str, Any]], api_key: str, top_n: int = TRAIN_ENRICH_TOP_N,
+                         budget: float = TRAIN_ENRICH_BUDGET) -> List[Dict[str, Any]]:
+    """Async enrich_trains; parallelism is bounded by the same worker count."""
+    semaphore = asyncio.Semaphore(TRAIN_ENRICH_WORKERS)
+
+    async def bounded(fetch, args):
+        async with semaphore:
+            return await fetch(*args, api_key)
+
+    tasks = {}
+    for row, field, args in _jobs(rows, top_n):
+        fetch = AFETCHES[field]
+        tasks[asyncio.ensure_future(bounded(fetch, args))] = (row, field)
+    if not tasks:
+        return rows
+    # Unfinished lookups keep running and fill the caches for the next turn
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+    for task in done:
+        row, field = tasks[task]
+        _settle(row, field, *((None, task.exception()) if task.exception() else (task.result(),)))
+    for task in pending:
+        tasks[task][0]["partial"] = True
+    if pending:
+        print(f"DEBUG: Train enrichment budget of {budget:g}s hit, {len(pending)} lookups still running")
+    return rows
+
+
+def fill_from_cache(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill rows left partial by the latency budget from the caches their lookups have since warmed."""
+    for row in rows:
+        if not row.get("partial"):
+            continue
+        fares = row["fares"] or fare_cache.get((row["train_number"], row["source"], row["destination"]))
+        seats = row["availability"] or seat_cache.get((row["train_number"], row["source"], row["destination"],
+                                                       row["date"], TRAIN_CLASS, TRAIN_QUOTA))
+        schedule = row.get("schedule") or schedule_cache.get((row["train_number"], row["source"], row["destination"]))
+        row.update(fares=fares, availability=seats, schedule=schedule, partial=fares is None or seats is None)
+    return rows
+
+
+def format_train_row(row: Dict[str, Any]) -> str:
+    line = f"{row['train_name']} ({row['train_number']}) at {row['departure_time']}"
+    details = []
+    if row.get("fares"):
+        details.append(", ".join(f"{cls} ₹{fare:.0f}" for cls, fare in row["fares"].items()))
+    if row.get("availability") and row["availability"].get("status"):
+        details.append(f"{row['availability']['class']}: {row['availability']['status']}")
+    elif row.get("partial"):
+        details.append("fare/seats still loading")
+    return line + (f" — {'; '.join(details)}" if details else "")